@@ -1,9 +1,27 @@
+import array
+import collections
+import collections.abc
+import functools
+import itertools
+import os
+import re
+import tempfile
+import time
+import zlib
 import tkinter as tk
 from PIL import Image, ImageTk
 from tkinter import messagebox
 from tkinter import simpledialog
 from tkinter import filedialog
 
+from ioworker import IOWorker
+from journal import AutosaveJournal
+from levelcache import CompiledLevel, LevelCache, pack_level
+from levelpack import LevelPack
+from profiler import ProfileCapture, CPROFILE, SAMPLING, MODES as PROFILE_MODES
+from score_analytics import read_summary, summarize, write_summary, update_summary, format_time
+from spectator import SpectatorHub, WON, OVER
+
 
 GAME_LEVELS = {
     # dungeon layout: max moves allowed
@@ -101,25 +119,50 @@ def load_game(filename):
         (list<list<str>>): A 2D array of strings representing the
             dungeon.
     """
-    dungeon_layout = []
-
     with open(filename, 'r') as file:
-        for line in file:
-            line = line.strip()
-            dungeon_layout.append(list(line))
-
-    if len(dungeon_layout) != len(dungeon_layout[0]):
-        level = dungeon_layout[-2]
-        s = ''
-        for l in level:
-            s += l
-        level = int(s)
-        dungeon_layout = dungeon_layout[:-2]
-    else:
-        level = 0
+        return parse_game(file)
+
+
+def parse_game(lines):
+    """Create a 2D array of string representing the dungeon from the lines of a level.
 
+    Parameters:
+        lines (iterable<str>): The lines of a level file or saved game.
+
+    Returns:
+        (list<list<str>>, int): A 2D array of strings representing the
+            dungeon and the moves stored below it, 0 if there are none.
+    """
+    dungeon_layout, footer = split_game(lines)
+    level = int(footer[0]) if footer else 0
     return dungeon_layout, level
 
+
+def split_game(lines):
+    """Split the lines of a level or saved game into the dungeon and the lines below it.
+
+    The dungeon is square, so it ends after as many rows as its first row
+    is wide. A saved game stores the moves, the timer, the state hash and
+    the keys held below it.
+
+    Parameters:
+        lines (iterable<str>): The lines of a level file or saved game.
+
+    Returns:
+        (list<list<str>>, list<str>): The dungeon and the stripped lines below it.
+
+    Raises:
+        ValueError: If the dungeon is empty or not square.
+    """
+    # the spaces at either end of a row are open cells, only the line ending is dropped
+    rows = [line.rstrip("\r\n") for line in lines]
+    size = len(rows[0]) if rows else 0
+    if not size:
+        raise ValueError("the dungeon is empty")
+    if len(rows) < size or any(len(row) != size for row in rows[:size]):
+        raise ValueError(f"the dungeon is not {size} rows of {size} cells")
+    return [list(row) for row in rows[:size]], [row.strip() for row in rows[size:]]
+
 class Entity:
     """ """
 
@@ -178,7 +221,7 @@ class Key(Item):
         """ """
         player = game.get_player()
         player.add_item(self)
-        game.get_game_information().pop(player.get_position())
+        game.remove_entity(player.get_position())
 
 
 class MoveIncrease(Item):
@@ -195,7 +238,11 @@ class MoveIncrease(Item):
         """ """
         player = game.get_player()
         player.change_move_count(self._moves)
-        game.get_game_information().pop(player.get_position())
+        game.remove_entity(player.get_position())
+
+    def get_moves(self):
+        """ """
+        return self._moves
 
 
 class Door(Entity):
@@ -204,12 +251,8 @@ class Door(Entity):
 
     def on_hit(self, game):
         """ """
-        player = game.get_player()
-        for item in player.get_inventory():
-            if item.get_id() == KEY:
-                game.set_win(True)
-                return
-        messagebox.showinfo('Notice', "You don't have the key!")
+        if game.get_player().get_inventory()[KEY]:
+            game.set_win(True)
 
 
 class Player(Entity):
@@ -221,7 +264,8 @@ class Player(Entity):
         """ """
         super().__init__()
         self._move_count = move_count
-        self._inventory = []
+        # how many of every item the Player holds, by the ID of the item
+        self._inventory = collections.Counter()
         self._position = None
 
     def set_position(self, position):
@@ -246,26 +290,794 @@ class Player(Entity):
     def add_item(self, item):
         """Adds item (Item) to inventory
         """
-        self._inventory.append(item)
+        self._inventory[item.get_id()] += 1
 
     def get_inventory(self):
-        """ """
+        """Returns how many of every item the Player holds, by the ID of the item.
+
+        Returns:
+            (collections.Counter<str: int>): The counts, 0 for items not held.
+        """
         return self._inventory
 
 
+ENTITIES = {WALL: Wall, KEY: Key, DOOR: Door, MOVE_INCREASE: MoveIncrease}
+
+# the kinds of entity in an EntityStore, by their code; 0 is a cell without one
+ENTITY_KINDS = (SPACE, WALL, KEY, DOOR, MOVE_INCREASE)
+_KIND_CODES = {kind: code for code, kind in enumerate(ENTITY_KINDS)}
+# translate the characters of a level into kind codes and back, anything else is an empty cell
+_TO_KIND_CODES = bytes(_KIND_CODES.get(chr(char), 0) for char in range(256))
+_FROM_KIND_CODES = bytes(ord(ENTITY_KINDS[code]) if code < len(ENTITY_KINDS) else ord(SPACE) for code in range(256))
+# translate kind codes into the wall layout of distance fields
+_TO_WALLS = bytes(ord(WALL) if code == _KIND_CODES[WALL] else ord(SPACE) for code in range(256))
+_OCCUPIED = re.compile(rb"[^\x00]")
+# the entities without state of their own are shared by every cell and store
+_SHARED_ENTITIES = {WALL: Wall(), KEY: Key(), DOOR: Door()}
+
+
+class EntityStore(collections.abc.MutableMapping):
+    """The entities of a dungeon, mapped from their positions like a dict.
+
+    Every cell only keeps the kind code of its entity in a bytearray and the
+    moves of its banana in an array of ints, so an entity costs five bytes
+    and looking one up, adding or removing it indexes the arrays. The
+    entities handed out are shared by all the cells of their kind, as a
+    Wall, a Key or a Door has no state of its own and a MoveIncrease only
+    its moves. The number of entities of every kind and the moves of all the
+    bananas are kept up to date.
+    """
+
+    def __init__(self, size, kinds=None, moves=None):
+        """
+        Parameters:
+            size (int): The width of the dungeon.
+            kinds (bytearray): The kind code of every cell, row by row, see
+                ENTITY_KINDS. No entities if None.
+            moves (array<int>): The moves of the banana of every cell.
+        """
+        self._size = size
+        self._kinds = bytearray(size * size) if kinds is None else kinds
+        self._moves = array.array('i', [0]) * (size * size) if moves is None else moves
+        self._counts = [self._kinds.count(code) for code in range(len(ENTITY_KINDS))]
+        self._bonus = sum(self._moves)
+        self._shared = _SHARED_ENTITIES
+        # the shared bananas, by their moves
+        self._bananas = {}
+
+    @classmethod
+    def from_layout(cls, layout, moves=None):
+        """Creates the entities of a dungeon.
+
+        Parameters:
+            layout (list<list<str>>): The rows of the dungeon, as load_game returns them.
+            moves (int): The moves of every banana, those of a MoveIncrease() if None.
+
+        Returns:
+            (EntityStore): The entities of the walls, keys, doors and bananas of the layout.
+        """
+        cells = "".join("".join(row) for row in layout).encode("latin-1", "replace")
+        return cls.from_kinds(len(layout), cells.translate(_TO_KIND_CODES), moves)
+
+    @classmethod
+    def from_kinds(cls, size, kinds, moves=None, bananas=None):
+        """Creates the entities of the kind codes of a dungeon, e.g. those of a compiled level.
+
+        Parameters:
+            size (int): The width of the dungeon.
+            kinds (bytes-like): The kind code of every cell, row by row, which is copied.
+            moves (int): The moves of every banana, those of a MoveIncrease() if None.
+            bananas (list<tuple<int, int>>): The positions of the bananas if
+                they are known, so they are not searched.
+
+        Returns:
+            (EntityStore): The entities.
+        """
+        store = cls(size, bytearray(kinds))
+        bonus = MoveIncrease().get_moves() if moves is None else moves
+        for position in store.positions(MOVE_INCREASE) if bananas is None else bananas:
+            store[position] = MoveIncrease(bonus)
+        return store
+
+    def _cell(self, position):
+        """Returns the index of a position in the arrays, None if it is off the dungeon."""
+        row, col = position
+        if 0 <= row < self._size and 0 <= col < self._size:
+            return row * self._size + col
+        return None
+
+    def _banana(self, moves):
+        """Returns the shared banana giving moves."""
+        banana = self._bananas.get(moves)
+        if banana is None:
+            banana = self._bananas[moves] = MoveIncrease(moves)
+        return banana
+
+    def get(self, position, default=None):
+        """Returns the entity at position, default if there is none."""
+        row, col = position
+        size = self._size
+        if not (0 <= row < size and 0 <= col < size):
+            return default
+        cell = row * size + col
+        kind = ENTITY_KINDS[self._kinds[cell]]
+        if kind == SPACE:
+            return default
+        if kind == MOVE_INCREASE:
+            return self._banana(self._moves[cell])
+        return self._shared[kind]
+
+    def __getitem__(self, position):
+        entity = self.get(position)
+        if entity is None:
+            raise KeyError(position)
+        return entity
+
+    def __setitem__(self, position, entity):
+        cell = self._cell(position)
+        if cell is None:
+            raise KeyError(position)
+        code = _KIND_CODES.get(entity.get_id())
+        if not code:
+            raise ValueError(f"{entity} cannot be placed in the dungeon")
+        self._clear(cell)
+        self._kinds[cell] = code
+        self._counts[code] += 1
+        if isinstance(entity, MoveIncrease):
+            self._moves[cell] = entity.get_moves()
+            self._bonus += entity.get_moves()
+
+    def __delitem__(self, position):
+        cell = self._cell(position)
+        if cell is None or not self._kinds[cell]:
+            raise KeyError(position)
+        self._clear(cell)
+
+    def _clear(self, cell):
+        """Removes the entity of a cell, if it has one."""
+        code = self._kinds[cell]
+        if code:
+            self._kinds[cell] = 0
+            self._counts[code] -= 1
+            self._bonus -= self._moves[cell]
+            self._moves[cell] = 0
+
+    def __iter__(self):
+        size = self._size
+        for match in _OCCUPIED.finditer(self._kinds):
+            yield divmod(match.start(), size)
+
+    def __len__(self):
+        return len(self._kinds) - self._counts[0]
+
+    def copy(self):
+        """Returns an independent copy of the store, like dict.copy."""
+        store = EntityStore(0)
+        store._size = self._size
+        store._kinds = bytearray(self._kinds)
+        store._moves = array.array('i', self._moves)
+        store._counts = list(self._counts)
+        store._bonus = self._bonus
+        store._bananas = self._bananas
+        return store
+
+    def count(self, kind):
+        """Returns the number of entities of a kind, e.g. KEY."""
+        return self._counts[_KIND_CODES[kind]]
+
+    def positions(self, kind):
+        """Returns the positions of the entities of a kind, row by row."""
+        code = _KIND_CODES[kind]
+        kinds = self._kinds
+        positions = []
+        cell = kinds.find(code)
+        while cell >= 0:
+            positions.append(divmod(cell, self._size))
+            cell = kinds.find(code, cell + 1)
+        return positions
+
+    def get_bonus_moves(self):
+        """Returns the moves all the bananas left would add."""
+        return self._bonus
+
+    def get_kinds(self):
+        """Returns the kind code of every cell, row by row; it changes with the store, see ENTITY_KINDS."""
+        return self._kinds
+
+    def rows(self):
+        """Returns the rows of the dungeon in the characters of the level files, without the Player."""
+        text = self._kinds.translate(_FROM_KIND_CODES).decode("latin-1")
+        size = self._size
+        return [text[start:start + size] for start in range(0, size * size, size)]
+
+# what happened on a step of GameLogic.apply_moves
+STEPPED = "."
+BLOCKED = WALL
+PICKED_KEY = KEY
+PICKED_BONUS = MOVE_INCREASE
+LOCKED_DOOR = DOOR
+OPENED_DOOR = "!"
+
+# how GameLogic.apply_moves ended
+PLAYING = "playing"
+STOPPED = "stopped"
+GAME_WON = "won"
+GAME_LOST = "lost"
+
+# features of a game state besides the entities, see zobrist
+MOVES_FEATURE = "moves"
+KEY_HELD_FEATURE = "key held"
+WON_FEATURE = "won"
+
+_MASK_64 = (1 << 64) - 1
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def zobrist(feature, row=0, col=0):
+    """Returns the 64-bit Zobrist key of one feature of a game state.
+
+    A state hashes to the XOR of the keys of its features. The keys are
+    derived from the feature with splitmix64 instead of being drawn from a
+    table, so they are the same in every process and on every platform and
+    cover dungeons of any size.
+
+    Parameters:
+        feature (str): An entity ID, or MOVES_FEATURE, KEY_HELD_FEATURE or WON_FEATURE.
+        row (int): The row of an entity, or the moves left.
+        col (int): The column of an entity.
+
+    Returns:
+        (int): The key.
+    """
+    z = (zlib.crc32(feature.encode()) << 40 ^ (row & 0xFFFFF) << 20 ^ (col & 0xFFFFF)) & _MASK_64
+    z = (z + 0x9E3779B97F4A7C15) & _MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return z ^ (z >> 31)
+
+
+class DistanceField:
+    """Shortest walking distances from one cell to every cell of a dungeon.
+
+    Only walls block the Player, so a field depends on nothing but the wall
+    layout and its source. Fields are shared through distance_field.
+    """
+
+    def __init__(self, walls, size, source, limit=None):
+        """Run a breadth first search from source.
+
+        Parameters:
+            walls (str): size * size characters, WALL where a wall stands.
+            size (int): The width of the dungeon.
+            source (tuple): The position (row, column) the distances are
+                measured from, or a tuple of (position, distance) pairs to
+                measure from the nearest of several sources, each of them
+                starting at its own distance.
+            limit (int): Cells further away than limit are left unreached.
+        """
+        self._size = size
+        # walls start at -2 and open cells at -1, so only the latter are entered
+        self._distances = distances = [-2 if char == WALL else -1 for char in walls]
+        cells = size * size
+        last = size - 1
+
+        if isinstance(source[0], int):
+            source = ((source, 0),)
+        # the sources join the search once it gets as far as their own distance, the nearest is last
+        starts = sorted(((start, row * size + col) for (row, col), start in source), reverse=True)
+        frontier = []
+        distance = starts[-1][0] if starts else 0
+        while frontier or starts:
+            while starts and starts[-1][0] == distance:
+                start = starts.pop()[1]
+                if distances[start] == -1:
+                    distances[start] = distance
+                    frontier.append(start)
+            if limit is not None and distance >= limit:
+                break
+            distance += 1
+            next_frontier = []
+            append = next_frontier.append
+            for cell in frontier:
+                col = cell % size
+                neighbour = cell - size
+                if neighbour >= 0 and distances[neighbour] == -1:
+                    distances[neighbour] = distance
+                    append(neighbour)
+                neighbour = cell + size
+                if neighbour < cells and distances[neighbour] == -1:
+                    distances[neighbour] = distance
+                    append(neighbour)
+                if col and distances[cell - 1] == -1:
+                    distances[cell - 1] = distance
+                    append(cell - 1)
+                if col < last and distances[cell + 1] == -1:
+                    distances[cell + 1] = distance
+                    append(cell + 1)
+            frontier = next_frontier
+
+    @classmethod
+    def from_distances(cls, size, distances):
+        """Wraps distances searched before, e.g. those of a compiled level.
+
+        Parameters:
+            size (int): The width of the dungeon.
+            distances (sequence<int>): The distance of every cell, -1 for an
+                unreached cell and -2 for a wall. A read-only sequence cannot
+                be repaired by set_wall.
+
+        Returns:
+            (DistanceField): The field.
+        """
+        field = cls.__new__(cls)
+        field._size = size
+        field._distances = distances
+        return field
+
+    def distance(self, position):
+        """Returns the number of moves from the source to position.
+
+        Parameters:
+            position (tuple<int, int>): The destination.
+
+        Returns:
+            (int): The distance, or None if position cannot be reached.
+        """
+        distance = self._distances[position[0] * self._size + position[1]]
+        return distance if distance >= 0 else None
+
+    def set_wall(self, position, wall):
+        """Repairs the field after a wall was built or knocked down at position.
+
+        Only the cells whose distance changes are searched again: knocking
+        a wall down spreads the shorter distances from the opened cell, and
+        building one recomputes the cells that lost their only ways to the
+        source, starting from the unaffected cells around them. The field
+        must have a single source and must not be shared, see
+        distance_field.
+
+        Parameters:
+            position (tuple<int, int>): The cell, not the source.
+            wall (bool): True if a wall was built, False if one was knocked down.
+
+        Returns:
+            (int): The number of cells searched again.
+        """
+        size = self._size
+        cells = size * size
+        last = size - 1
+        distances = self._distances
+        cell = position[0] * size + position[1]
+
+        def neighbours(cell):
+            col = cell % size
+            if cell >= size:
+                yield cell - size
+            if cell + size < cells:
+                yield cell + size
+            if col:
+                yield cell - 1
+            if col < last:
+                yield cell + 1
+
+        if not wall:
+            if distances[cell] != -2:
+                return 0
+            reached = [distances[neighbour] for neighbour in neighbours(cell) if distances[neighbour] >= 0]
+            distances[cell] = min(reached) + 1 if reached else -1
+            if distances[cell] < 0:
+                return 1
+            frontier = [cell]
+            searched = 1
+            while frontier:
+                next_frontier = []
+                for current in frontier:
+                    distance = distances[current] + 1
+                    for neighbour in neighbours(current):
+                        if distances[neighbour] == -1 or distances[neighbour] > distance:
+                            distances[neighbour] = distance
+                            next_frontier.append(neighbour)
+                searched += len(frontier)
+                frontier = next_frontier
+            return searched
+
+        old = distances[cell]
+        distances[cell] = -2
+        if old < 0:
+            return 0
+
+        # the cells that lost every neighbour one step closer to the source, level by level
+        affected = set()
+        level = {neighbour for neighbour in neighbours(cell) if distances[neighbour] == old + 1}
+        while level:
+            next_level = set()
+            for current in level:
+                distance = distances[current]
+                if not any(distances[neighbour] == distance - 1 and neighbour not in affected
+                           for neighbour in neighbours(current)):
+                    affected.add(current)
+                    next_level.update(neighbour for neighbour in neighbours(current)
+                                      if distances[neighbour] == distance + 1)
+            level = next_level
+
+        for current in affected:
+            distances[current] = -1
+        buckets = {}
+        for current in affected:
+            reached = [distances[neighbour] for neighbour in neighbours(current)
+                       if distances[neighbour] >= 0 and neighbour not in affected]
+            if reached:
+                buckets.setdefault(min(reached) + 1, []).append(current)
+        distance = min(buckets, default=0)
+        while buckets:
+            for current in buckets.pop(distance, []):
+                if distances[current] != -1:
+                    continue
+                distances[current] = distance
+                for neighbour in neighbours(current):
+                    if distances[neighbour] == -1 and neighbour in affected:
+                        buckets.setdefault(distance + 1, []).append(neighbour)
+            distance += 1
+        return len(affected) + 1
+
+
+_DISTANCE_FIELDS = {}
+_DISTANCE_FIELDS_LIMIT = 256
+
+
+def distance_field(walls, size, source, distances=None):
+    """Returns the DistanceField of a source, computing it only once per level.
+
+    Parameters:
+        walls (str): size * size characters, WALL where a wall stands.
+        size (int): The width of the dungeon.
+        source (tuple): The source or sources of the field, see DistanceField.
+        distances (sequence<int>): The distances of the field if they are
+            known, e.g. from a compiled level, so they are not searched.
+
+    Returns:
+        (DistanceField): The cached field.
+    """
+    key = (walls, source)
+    field = _DISTANCE_FIELDS.get(key)
+    if field is None:
+        if len(_DISTANCE_FIELDS) >= _DISTANCE_FIELDS_LIMIT:
+            _DISTANCE_FIELDS.clear()
+        if distances is not None:
+            field = DistanceField.from_distances(size, distances)
+        else:
+            field = DistanceField(walls, size, source)
+        _DISTANCE_FIELDS[key] = field
+    return field
+
+
+def bordered_walls(walls, size):
+    """Returns the cells that cannot be entered, with a border of them around the dungeon.
+
+    Parameters:
+        walls (str): size * size characters, WALL where a wall stands.
+        size (int): The width of the dungeon.
+
+    Returns:
+        (bytearray): 1 for a wall or the border and 0 for an open cell, row
+            by row over (size + 2) ** 2 cells.
+    """
+    width = size + 2
+    to_blocked = bytes.maketrans(WALL.encode() + SPACE.encode(), b"\x01\x00")
+    blocked = bytearray(b"\x01" * width)
+    for row in range(size):
+        blocked += b"\x01" + walls[row * size:(row + 1) * size].encode().translate(to_blocked) + b"\x01"
+    blocked += b"\x01" * width
+    return blocked
+
+
+class Passability:
+    """The open cells of a wall layout, grouped into connected regions.
+
+    Two cells are connected if a walk between them exists, so a path query
+    between different regions is answered without searching.
+    """
+
+    def __init__(self, walls, size):
+        """Label the regions of a wall layout.
+
+        Parameters:
+            walls (str): size * size characters, WALL where a wall stands.
+            size (int): The width of the dungeon.
+        """
+        self._walls = walls
+        self._size = size
+        self._costs = None
+        # walls are region -1, unlabelled open cells 0
+        self._regions = regions = [-1 if char == WALL else 0 for char in walls]
+        region = 0
+        for cell, label in enumerate(regions):
+            if label:
+                continue
+            region += 1
+            regions[cell] = region
+            frontier = [cell]
+            while frontier:
+                cell = frontier.pop()
+                col = cell % size
+                for neighbour, inside in ((cell - size, cell >= size), (cell + size, cell < len(regions) - size),
+                                          (cell - 1, col > 0), (cell + 1, col < size - 1)):
+                    if inside and not regions[neighbour]:
+                        regions[neighbour] = region
+                        frontier.append(neighbour)
+
+    @classmethod
+    def from_regions(cls, walls, size, regions):
+        """Wraps regions labelled before, e.g. those of a compiled level.
+
+        Parameters:
+            walls (str): size * size characters, WALL where a wall stands.
+            size (int): The width of the dungeon.
+            regions (sequence<int>): The region of every cell, -1 for a wall.
+
+        Returns:
+            (Passability): The grid.
+        """
+        grid = cls.__new__(cls)
+        grid._walls = walls
+        grid._size = size
+        grid._regions = regions
+        grid._costs = None
+        return grid
+
+    def connected(self, start, goal):
+        """Checks if a walk between two open cells exists."""
+        regions = self._regions
+        label = regions[start[0] * self._size + start[1]]
+        return label > 0 and label == regions[goal[0] * self._size + goal[1]]
+
+    def _get_costs(self):
+        """Returns the costs find_path starts from: 0 for a wall or the border and -1 for an open cell."""
+        if self._costs is None:
+            self._costs = [0 if blocked else -1 for blocked in bordered_walls(self._walls, self._size)]
+        return self._costs
+
+    def find_path(self, start, goal):
+        """Returns a shortest walk between two cells, searched with A*.
+
+        The Manhattan distance to goal guides the search. A step changes it
+        by one either way, so the estimated length of a walk through a cell
+        is either the same as through the cell before or 2 more. The cells
+        to search then fit in two stacks instead of a heap: those on the
+        best estimate, searched deepest first, and those 2 above it. On
+        open ground only the cells close to the straight line are visited.
+
+        Parameters:
+            start (tuple<int, int>): Where the walk starts.
+            goal (tuple<int, int>): Where the walk ends.
+
+        Returns:
+            (list<tuple<int, int>>): The cells walked through after start,
+                ending at goal, or None if goal cannot be reached.
+        """
+        if not self.connected(start, goal):
+            return None
+        # the cells are numbered on the bordered grid, so no step leaves it
+        width = self._size + 2
+        goal_row, goal_col = goal[0] + 1, goal[1] + 1
+        start_cell = (start[0] + 1) * width + start[1] + 1
+        goal_cell = goal_row * width + goal_col
+        # a step up gets closer to goal from below its row, a step down from above it
+        below, above = (goal_row + 1) * width, goal_row * width
+
+        # the length of the shortest walk found to every cell, -1 before one
+        # is; walls and the border are 0 like start, so they are never entered
+        costs = self._get_costs()[:]
+        costs[start_cell] = 0
+        best, later = [start_cell], []
+        while True:
+            if not best:
+                # goal is connected, so it is found before both stacks run out
+                best, later = later, best
+            cell = best.pop()
+            if cell == goal_cell:
+                break
+            cost = costs[cell] + 1
+            col = cell % width
+            # the four steps written out, this loop is most of the time of a query
+            neighbour = cell - width
+            if not 0 <= costs[neighbour] <= cost:
+                costs[neighbour] = cost
+                (best if cell >= below else later).append(neighbour)
+            neighbour = cell + width
+            if not 0 <= costs[neighbour] <= cost:
+                costs[neighbour] = cost
+                (best if cell < above else later).append(neighbour)
+            neighbour = cell - 1
+            if not 0 <= costs[neighbour] <= cost:
+                costs[neighbour] = cost
+                (best if col > goal_col else later).append(neighbour)
+            neighbour = cell + 1
+            if not 0 <= costs[neighbour] <= cost:
+                costs[neighbour] = cost
+                (best if col < goal_col else later).append(neighbour)
+
+        # walk back from goal through the cells one move closer to start
+        path = []
+        cell = goal_cell
+        cost = costs[cell]
+        while cost:
+            row, col = divmod(cell, width)
+            path.append((row - 1, col - 1))
+            cost -= 1
+            for neighbour in (cell - width, cell + width, cell - 1, cell + 1):
+                if costs[neighbour] == cost:
+                    cell = neighbour
+                    break
+        return path[::-1]
+
+
+class FieldOfView:
+    """What the Player sees, and has seen, of a dungeon.
+
+    The cells in sight are found by recursive shadowcasting within a radius
+    around the Player, so an update costs O(radius ** 2) however large the
+    dungeon is. Walls block the sight but are seen themselves.
+    """
+
+    # (xx, xy, yx, yy) turning the first octant into each of the eight
+    OCTANTS = ((1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+               (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1))
+
+    def __init__(self, walls, size, radius=6):
+        """
+        Parameters:
+            walls (str): size * size characters, WALL where a wall stands.
+            size (int): The width of the dungeon.
+            radius (int): How far the Player sees.
+        """
+        self._walls = walls
+        self._size = size
+        self._radius = radius
+        self._explored = bytearray(size * size)
+        self._visible = set()
+
+    def get_radius(self):
+        """ """
+        return self._radius
+
+    def is_visible(self, position):
+        """Checks if a cell is in sight of the Player."""
+        return position[0] * self._size + position[1] in self._visible
+
+    def is_explored(self, position):
+        """Checks if a cell has ever been in sight of the Player."""
+        return bool(self._explored[position[0] * self._size + position[1]])
+
+    def update(self, position):
+        """Recomputes what is in sight of the Player.
+
+        Parameters:
+            position (tuple<int, int>): Where the Player stands.
+
+        Returns:
+            (set<tuple<int, int>>): The cells that came into sight or went
+                out of it since the last update.
+        """
+        row, col = position
+        visible = {row * self._size + col}
+        for octant in self.OCTANTS:
+            self._cast(visible, row, col, 1, 1.0, 0.0, octant)
+
+        changed = visible.symmetric_difference(self._visible)
+        for cell in visible:
+            self._explored[cell] = 1
+        self._visible = visible
+        return {divmod(cell, self._size) for cell in changed}
+
+    def _cast(self, visible, row, col, depth, start, end, octant):
+        """Lights one octant from depth on, between two slopes.
+
+        A wall splits the light: the part of the octant beyond it is lit by
+        a recursive cast between the slopes left on either side of it.
+        """
+        if start < end:
+            return
+        xx, xy, yx, yy = octant
+        size, walls, radius = self._size, self._walls, self._radius
+        next_start = start
+        for distance in range(depth, radius + 1):
+            blocked = False
+            dy = -distance
+            for dx in range(-distance, 1):
+                left_slope = (dx - 0.5) / (dy + 0.5)
+                right_slope = (dx + 0.5) / (dy - 0.5)
+                if start < right_slope:
+                    continue
+                if end > left_slope:
+                    break
+
+                x = row + dx * xx + dy * xy
+                y = col + dx * yx + dy * yy
+                inside = 0 <= x < size and 0 <= y < size
+                if inside and dx * dx + dy * dy <= radius * radius:
+                    visible.add(x * size + y)
+                opaque = not inside or walls[x * size + y] == WALL
+                if blocked:
+                    if opaque:
+                        next_start = right_slope
+                    else:
+                        blocked = False
+                        start = next_start
+                elif opaque and distance < radius:
+                    blocked = True
+                    self._cast(visible, row, col, distance + 1, start, left_slope, octant)
+                    next_start = right_slope
+            if blocked:
+                break
+
+
+_PASSABILITIES = {}
+_PASSABILITIES_LIMIT = 16
+
+
+def passability(walls, size, regions=None):
+    """Returns the Passability of a wall layout, computing it only once per level.
+
+    Parameters:
+        walls (str): size * size characters, WALL where a wall stands.
+        size (int): The width of the dungeon.
+        regions (sequence<int>): The regions of the layout if they are
+            known, e.g. from a compiled level, so they are not labelled.
+
+    Returns:
+        (Passability): The cached grid.
+    """
+    grid = _PASSABILITIES.get(walls)
+    if grid is None:
+        if len(_PASSABILITIES) >= _PASSABILITIES_LIMIT:
+            _PASSABILITIES.clear()
+        if regions is not None:
+            grid = Passability.from_regions(walls, size, regions)
+        else:
+            grid = Passability(walls, size)
+        _PASSABILITIES[walls] = grid
+    return grid
+
+
 class GameLogic:
     """ """
 
-    def __init__(self, dungeon_name="game2.txt"):
-        """ """
-        self._dungeon, self.level = load_game(dungeon_name)
+    def __init__(self, dungeon_name="game2.txt", dungeon=None, budget=None):
+        """Construct the logic of a level.
+
+        Parameters:
+            dungeon_name (str): The name of the level file.
+            dungeon (tuple<list<list<str>>, int> | CompiledLevel): An
+                already parsed (layout, level) pair as returned by
+                load_game, or a level compiled by LEVEL_CACHE. When given,
+                dungeon_name is only used as the name of the level and no
+                file is read. Otherwise the file is loaded through
+                LEVEL_CACHE, so it is only parsed the first time its text
+                is seen.
+            budget (int): The level to use instead of the moves stored
+                below the dungeon or those of GAME_LEVELS, e.g. the budget
+                of a level pack.
+        """
+        if dungeon is None:
+            dungeon = load_compiled(dungeon_name)
+        compiled = None
+        if isinstance(dungeon, CompiledLevel):
+            compiled = dungeon
+            dungeon = compiled_layout(compiled), compiled.budget
+        self._dungeon, self.level = dungeon
+        if budget is not None:
+            self.level = budget
+        self._dungeon_name = dungeon_name
         self._dungeon_size = len(self._dungeon)
-        if dungeon_name in GAME_LEVELS:
+        if budget is None and dungeon_name in GAME_LEVELS:
             self._player = Player(GAME_LEVELS[dungeon_name])
         else:
             self._player = Player(self.level)
-        self._game_information = self.init_game_information()
+        self._game_information = self.init_game_information(compiled)
         self._win = False
+        self.init_distances(compiled)
+        self.rehash()
 
     def get_positions(self, entity):
         """ """
@@ -277,34 +1089,250 @@ class GameLogic:
 
         return positions
 
-    def init_game_information(self):
-        """ """
-        player_pos = self.get_positions(PLAYER)[0]
-
-        key_position = self.get_positions(KEY)
+    def init_game_information(self, compiled=None):
+        """Creates the entities of the dungeon: every wall, key, door and banana.
 
-        door_position = self.get_positions(DOOR)
-        wall_positions = self.get_positions(WALL)
-        move_increase_positions = self.get_positions(MOVE_INCREASE)
+        A Player who finds no key in the dungeon starts with one. A saved
+        game does not rely on this, from_text gives back the keys it holds.
 
-        self._player.set_position(player_pos)
+        Parameters:
+            compiled (CompiledLevel): The compiled level, whose kind codes
+                are copied instead of reading the layout.
 
-        information = {}
-        if len(key_position):
-            information[key_position[0]] = Key()
+        Raises:
+            ValueError: If the dungeon has no Player.
+        """
+        if compiled is not None:
+            self._player.set_position(compiled.player)
+            information = EntityStore.from_kinds(compiled.size, compiled.kinds, bananas=compiled.bananas)
         else:
+            cells = "".join("".join(line) for line in self._dungeon)
+            player_cell = cells.find(PLAYER)
+            if player_cell < 0:
+                raise ValueError("the dungeon has no player")
+            self._player.set_position(divmod(player_cell, self._dungeon_size))
+            information = EntityStore.from_layout(self._dungeon)
+        if not information.count(KEY):
             self._player.add_item(Key())
+        return information
 
-        if len(door_position):
-            information[door_position[0]]= Door()
+    def init_distances(self, compiled=None):
+        """Looks up the distance fields of the way out through the keys and doors of the level.
 
-        for wall in wall_positions:
-            information[wall] = Wall()
+        The door field measures the way to the nearest door. The keys start
+        the key field at their distance to the nearest door, so it measures
+        the whole way out through the best key.
 
-        for move_increase in move_increase_positions:
-            information[move_increase] = MoveIncrease()
+        Parameters:
+            compiled (CompiledLevel): The compiled level, whose fields and
+                regions are shared instead of searched when they are not
+                cached yet.
+        """
+        information = self._game_information
+        self._walls = walls = information.get_kinds().translate(_TO_WALLS).decode("latin-1")
+        size = self._dungeon_size
+        door_distances = key_distances = None
+        if compiled is not None:
+            self._key_positions, self._door_positions = list(compiled.keys), list(compiled.doors)
+            door_distances, key_distances = compiled.door_distances, compiled.key_distances
+            passability(walls, size, compiled.regions)
+        else:
+            self._key_positions = information.positions(KEY)
+            self._door_positions = information.positions(DOOR)
+        self._key_field = self._door_field = None
+        self._blocked = None
+        if self._door_positions:
+            doors = self._door_positions
+            # a single door shares its field with the hints
+            source = doors[0] if len(doors) == 1 else tuple((door, 0) for door in doors)
+            self._door_field = door_field = distance_field(walls, size, source, door_distances)
+            keys = tuple((key, door_field.distance(key)) for key in self._key_positions
+                         if door_field.distance(key) is not None)
+            if keys:
+                self._key_field = distance_field(walls, size, keys, key_distances)
+
+    def get_walls(self):
+        """Returns the wall layout as dungeon_size ** 2 characters, row by row."""
+        return self._walls
+
+    def get_blocked(self):
+        """Returns the cells the Player cannot enter, with a border of them around the dungeon.
 
-        return information
+        Returns:
+            (bytearray): 1 for a wall or the border and 0 for an open cell,
+                row by row over (dungeon_size + 2) ** 2 cells.
+        """
+        if self._blocked is None:
+            self._blocked = bordered_walls(self._walls, self._dungeon_size)
+        return self._blocked
+
+    def rehash(self):
+        """Recomputes the hash of the Player and the items from scratch.
+
+        Moves and pickups keep it up to date, so this is only needed after
+        the entities were replaced.
+        """
+        board_hash = zobrist(PLAYER, *self._player.get_position())
+        for kind in (KEY, MOVE_INCREASE):
+            for row, col in self._game_information.positions(kind):
+                board_hash ^= zobrist(kind, row, col)
+        self._hash = board_hash
+
+    def get_hash(self):
+        """Returns the 64-bit Zobrist hash of the state of the game.
+
+        Equal states of a level have equal hashes. The positions of the
+        Player and the items are hashed incrementally as they change, and
+        the moves left, the key and the win are mixed in here, so this is
+        O(1) and can key the visited states of a solver or detect two
+        copies of a game drifting apart.
+
+        Returns:
+            (int): The hash.
+        """
+        state_hash = self._hash ^ zobrist(MOVES_FEATURE, self._player.moves_remaining())
+        if self.has_key():
+            state_hash ^= zobrist(KEY_HELD_FEATURE)
+        if self._win:
+            state_hash ^= zobrist(WON_FEATURE)
+        return state_hash
+
+    def path_to(self, position):
+        """Returns the moves of the shortest walk from the Player to a cell.
+
+        Only walls block the walk; the entities on the way are not avoided.
+
+        Parameters:
+            position (tuple<int, int>): The destination.
+
+        Returns:
+            (list<str>): The keys of DIRECTIONS to play in order, or None if
+                position cannot be reached.
+        """
+        row, col = position
+        if not (0 <= row < self._dungeon_size and 0 <= col < self._dungeon_size):
+            return None
+        path = passability(self._walls, self._dungeon_size).find_path(self._player.get_position(), position)
+        if path is None:
+            return None
+
+        steps = {delta: direction for direction, delta in DIRECTIONS.items()}
+        directions = []
+        x, y = self._player.get_position()
+        for next_x, next_y in path:
+            directions.append(steps[next_x - x, next_y - y])
+            x, y = next_x, next_y
+        return directions
+
+    def get_key_position(self):
+        """Returns where the first key of the level lies, or None if it starts in the inventory."""
+        return self._key_positions[0] if self._key_positions else None
+
+    def get_door_position(self):
+        """Returns where the first door of the level is, or None if it has none."""
+        return self._door_positions[0] if self._door_positions else None
+
+    def way_out(self):
+        """Returns the key and the door on the shortest way out for the Player.
+
+        Returns:
+            (tuple<tuple<int, int>, tuple<int, int>>): The key to pick up,
+                None if the Player holds one, and the door to open; None if
+                no door can be reached.
+        """
+        if self.has_key():
+            key = None
+            position = self._player.get_position()
+        else:
+            if self._key_field is None:
+                return None
+            door_field = self._door_field
+            key = self._descend(self._key_field, self._player.get_position(),
+                                lambda cell, distance: (isinstance(self.get_entity(cell), Key)
+                                                        and distance == door_field.distance(cell)))
+            if key is None:
+                return None
+            position = key
+        if self._door_field is None:
+            return None
+        door = self._descend(self._door_field, position, lambda cell, distance: distance == 0)
+        return None if door is None else (key, door)
+
+    def _descend(self, field, position, found):
+        """Walks down a distance field from position to the first cell found.
+
+        Parameters:
+            field (DistanceField): The field to walk down.
+            position (tuple<int, int>): The cell to start from.
+            found (callable): Called with a cell and its distance, True at the end of the walk.
+
+        Returns:
+            (tuple<int, int>): The cell found, or None if position cannot be reached.
+        """
+        distance = field.distance(position)
+        if distance is None:
+            return None
+        size = self._dungeon_size
+        while not found(position, distance):
+            for dx, dy in DIRECTIONS.values():
+                cell = position[0] + dx, position[1] + dy
+                if 0 <= cell[0] < size and 0 <= cell[1] < size and field.distance(cell) == distance - 1:
+                    position, distance = cell, distance - 1
+                    break
+            else:
+                return None
+        return position
+
+    def get_bonus_moves(self):
+        """Returns the moves the bananas left on the board would add."""
+        return self._game_information.get_bonus_moves()
+
+    def count_bonus_moves(self):
+        """Returns the moves all the bananas left on the board would add."""
+        return sum(entity.get_moves() for entity in self._game_information.values()
+                   if isinstance(entity, MoveIncrease))
+
+    def has_key(self):
+        """ """
+        return self._player.get_inventory()[KEY] > 0
+
+    def moves_needed(self):
+        """Returns the length of the shortest way to a key and then a door.
+
+        Returns:
+            (int): The number of moves, or None if no door can be reached.
+        """
+        position = self._player.get_position()
+        if self.has_key():
+            field = self._door_field
+        else:
+            field = self._key_field
+        return None if field is None else field.distance(position)
+
+    def moves_to_spare(self):
+        """Returns how many moves are left over on the shortest way out.
+
+        A negative number is the shortfall the remaining bananas have to
+        make up for.
+
+        Returns:
+            (int): The spare moves, or None if the door cannot be reached.
+        """
+        needed = self.moves_needed()
+        if needed is None:
+            return None
+        return self._player.moves_remaining() - needed
+
+    def is_unwinnable(self):
+        """Checks if the game is lost even though moves are left.
+
+        Bananas are counted as if they were on the way, so a game is only
+        declared lost when no route can make it.
+        """
+        if self._win:
+            return False
+        spare = self.moves_to_spare()
+        return spare is None or spare + self.get_bonus_moves() < 0
 
     def get_player(self):
         """ """
@@ -323,15 +1351,196 @@ class GameLogic:
         """ """
         return self._game_information
 
+    def set_game_information(self, information):
+        """Replaces every entity on the board, e.g. to undo a move.
+
+        Parameters:
+            information (EntityStore): The new entities.
+        """
+        self._game_information = information
+        self.rehash()
+
+    def restore(self, position, information, moves):
+        """Puts the game back to an earlier state, e.g. to undo moves.
+
+        The keys picked up since, which are back on the board, are taken
+        out of the inventory again.
+
+        Parameters:
+            position (tuple<int, int>): The position of the Player.
+            information (EntityStore): The entities, a copy of
+                get_game_information at the time.
+            moves (int): The moves the Player had left.
+        """
+        returned = information.count(KEY) - self._game_information.count(KEY)
+        self._player.set_position(position)
+        self.set_game_information(information)
+        if returned > 0:
+            self._player.get_inventory()[KEY] -= returned
+        self._player.change_move_count(moves - self._player.moves_remaining())
+
+    def remove_entity(self, position):
+        """Takes the entity at position off the board.
+
+        Parameters:
+            position (tuple<int, int>): The position of the entity.
+
+        Returns:
+            (Entity): The removed entity.
+        """
+        entity = self._game_information.pop(position)
+        if isinstance(entity, (Key, MoveIncrease)):
+            self._hash ^= zobrist(entity.get_id(), *position)
+        return entity
+
     def get_dungeon_size(self):
         """ """
         return self._dungeon_size
 
+    def get_dungeon_name(self):
+        """ """
+        return self._dungeon_name
+
     def move_player(self, direction):
         """ """
         new_pos = self.new_position(direction)
+        self._hash ^= zobrist(PLAYER, *self._player.get_position()) ^ zobrist(PLAYER, *new_pos)
         self.get_player().set_position(new_pos)
 
+    def play_move(self, direction):
+        """Moves the Player one step and lets the entity it lands on react.
+
+        This is the whole effect of one keypress, without any view attached,
+        so it can be driven by the GUI as well as by headless hosts.
+
+        Parameters:
+            direction (str): A key of DIRECTIONS.
+
+        Returns:
+            (bool): True if the Player moved, False if the move was blocked.
+        """
+        if self.collision_check(direction):
+            return False
+
+        self.move_player(direction)
+        self._player.change_move_count(-1)
+        entity = self.get_entity(self._player.get_position())
+        if entity is not None:
+            entity.on_hit(self)
+        return True
+
+    def apply_moves(self, moves, stop_on=()):
+        """Plays a sequence of moves in one call.
+
+        This has the effect of calling play_move for every direction, but
+        the walk is done on flat cell indices with the walls and distance
+        fields of the level, so replays, bots and tests applying long
+        sequences pay a small fraction of the cost of a method call per
+        step. Play stops once the game is won or lost, or after a step
+        whose event is in stop_on.
+
+        Parameters:
+            moves (str): The directions, e.g. "DDSSAW", in either case.
+            stop_on (collection<str>): The events to stop after, e.g. {PICKED_KEY}.
+
+        Returns:
+            (tuple<str, str>): How play ended (PLAYING, STOPPED, GAME_WON or
+                GAME_LOST) and the event of every step played: STEPPED,
+                BLOCKED, PICKED_KEY, PICKED_BONUS, LOCKED_DOOR or OPENED_DOOR.
+
+        Raises:
+            ValueError: If moves has a character that is not a direction.
+        """
+        moves = moves.upper()
+        invalid = set(moves).difference(DIRECTIONS)
+        if invalid:
+            raise ValueError(f"{''.join(sorted(invalid))!r} are not directions")
+        if self._win:
+            return GAME_WON, ""
+        if self.check_game_over():
+            return GAME_LOST, ""
+
+        size = self._dungeon_size
+        width = size + 2
+        # the Player is tracked on the dungeon and on the bordered grid of
+        # get_blocked, which makes the border checks a single lookup
+        blocked = self.get_blocked()
+        steps = {"W": (-size, -width), "S": (size, width), "A": (-1, -1), "D": (1, 1)}
+        information = self._game_information
+        # the kind code of every cell, walls are never entered
+        kinds = information.get_kinds()
+        door_distances = self._door_field._distances
+        key_distances = self._key_field._distances if self._key_field is not None else None
+
+        player = self._player
+        start = player.get_position()
+        row, col = start
+        position = row * size + col
+        bordered = (row + 1) * width + col + 1
+        moves_left = player.moves_remaining()
+        has_key = self.has_key()
+        bonus = information.get_bonus_moves()
+        # a step costs a move and changes the way out by one cell, so it
+        # takes at least safe_steps steps before the game can be lost
+        safe_steps = 0
+
+        events = []
+        append = events.append
+        outcome = PLAYING
+        for direction in moves:
+            step, bordered_step = steps[direction]
+            if blocked[bordered + bordered_step]:
+                event = BLOCKED
+            else:
+                position += step
+                bordered += bordered_step
+                moves_left -= 1
+                if not kinds[position]:
+                    event = STEPPED
+                else:
+                    # the items change the game, so they are handled by the entities themselves
+                    player.set_position(divmod(position, size))
+                    player.change_move_count(moves_left - player.moves_remaining())
+                    entity = information[player.get_position()]
+                    entity.on_hit(self)
+                    if self._win:
+                        append(OPENED_DOOR)
+                        outcome = GAME_WON
+                        break
+                    if isinstance(entity, Door):
+                        event = LOCKED_DOOR
+                    else:
+                        event = PICKED_KEY if isinstance(entity, Key) else PICKED_BONUS
+                        moves_left = player.moves_remaining()
+                        has_key = self.has_key()
+                        bonus = information.get_bonus_moves()
+
+                if safe_steps:
+                    safe_steps -= 1
+                else:
+                    # the same test as check_game_over, on the flat distance fields
+                    if has_key:
+                        needed = door_distances[position]
+                    else:
+                        needed = key_distances[position]
+                    spare = moves_left - needed + bonus
+                    if moves_left <= 0 or needed < 0 or spare < 0:
+                        append(event)
+                        outcome = GAME_LOST
+                        break
+                    safe_steps = min(moves_left - 1, spare // 2)
+
+            append(event)
+            if event in stop_on:
+                outcome = STOPPED
+                break
+
+        end = divmod(position, size)
+        self._hash ^= zobrist(PLAYER, *start) ^ zobrist(PLAYER, *end)
+        player.set_position(end)
+        player.change_move_count(moves_left - player.moves_remaining())
+        return outcome, "".join(events)
+
     def collision_check(self, direction):
         """
         Check to see if a player can travel in a given direction
@@ -356,7 +1565,7 @@ class GameLogic:
 
     def check_game_over(self):
         """ """
-        return self.get_player().moves_remaining() <= 0
+        return self.get_player().moves_remaining() <= 0 or self.is_unwinnable()
 
     def set_win(self, win):
         """ """
@@ -366,17 +1575,501 @@ class GameLogic:
         """ """
         return self._win
 
+    def to_state(self):
+        """Serialise the current state of the game.
 
-TILES = {"WALL":'#', "PLAYER":'O', "DOOR": 'D', "KEY":'K', "BANANA":'M', "Null": 0}
-# the following parameters stand for the level of game
-TASK_ONE = 1
-TASK_TWO = 2
-MASTERS = 3
+        The entities are stored row by row in the same characters as the
+        level files, so a state can be restored with from_state in another
+        process. The Player is stored apart as it may stand on a door, and
+        so are the keys it holds, as a level may have several.
 
+        Returns:
+            (dict): A picklable and JSON friendly description of the game.
+        """
+        return {
+            "name": self._dungeon_name,
+            "board": self._game_information.rows(),
+            "player": self._player.get_position(),
+            "moves": self._player.moves_remaining(),
+            "keys": self._player.get_inventory()[KEY],
+            "win": self._win,
+            "hash": "%016x" % self.get_hash(),
+        }
+
+    def to_text(self, timer):
+        """Write the current state of the game as a saved game.
+
+        The dungeon is followed by the moves left, the timer, the state
+        hash and the keys held, see from_text.
 
-class AbstractGrid(tk.Canvas):
-    '''
-    the class is a abstract class to draw a grid map
+        Parameters:
+            timer (int): The seconds played so far.
+
+        Returns:
+            (str): The text of the saved game.
+        """
+        rows = [list(row) for row in self._game_information.rows()]
+        row, col = self._player.get_position()
+        rows[row][col] = PLAYER
+        return "%s\n%d\n%d\n%016x\n%d" % ("\n".join("".join(row) for row in rows),
+                                           self._player.moves_remaining(), timer, self.get_hash(),
+                                           self._player.get_inventory()[KEY])
+
+    @classmethod
+    def from_pack(cls, pack, level):
+        """Load a level from a level pack with a single read.
+
+        Parameters:
+            pack (LevelPack): An opened level pack.
+            level (str): The ID or content hash of the level.
+
+        Returns:
+            (GameLogic): The loaded level, named by its ID in the pack.
+        """
+        entry = pack.find(level)
+        return cls(entry.name, LEVEL_CACHE.load(pack.read(entry)), entry.budget)
+
+    @classmethod
+    def from_text(cls, name, text):
+        """Load a saved game from its text, compiled in memory.
+
+        The text of a save changes with its timer and hash, so it is not
+        kept in LEVEL_CACHE, which would gain a file for every save loaded.
+        The keys held when the game was saved are given back.
+
+        Parameters:
+            name (str): The name of the level.
+            text (str): The text of a level file or saved game.
+
+        Returns:
+            (GameLogic): The loaded level.
+
+        Raises:
+            ValueError: If the level is malformed.
+        """
+        game = cls(name, CompiledLevel(compile_level(text), PARSER_VERSION))
+        footer = split_game(text.splitlines())[1]
+        # saves made before the keys were stored have no keys line
+        if len(footer) > 3:
+            game.get_player().get_inventory()[KEY] = int(footer[3])
+        return game
+
+    @classmethod
+    def from_state(cls, state):
+        """Restore a game serialised by to_state.
+
+        Parameters:
+            state (dict): The state returned by to_state.
+
+        Returns:
+            (GameLogic): The restored game.
+
+        Raises:
+            ValueError: If the restored game does not match the hash of the state.
+        """
+        layout = [list(row) for row in state["board"]]
+        row, col = state["player"]
+        under, layout[row][col] = layout[row][col], PLAYER
+
+        game = cls(state["name"], (layout, state["moves"]))
+        if under != SPACE:
+            game.get_game_information()[(row, col)] = ENTITIES[under]()
+            game.init_distances()
+            game.rehash()
+        player = game.get_player()
+        player.change_move_count(state["moves"] - player.moves_remaining())
+        if "keys" in state:
+            player.get_inventory()[KEY] = state["keys"]
+        game.set_win(state["win"])
+        if "hash" in state and int(state["hash"], 16) != game.get_hash():
+            raise ValueError("the state does not match its hash")
+        return game
+
+
+# the version of compile_level, which keys the compiled levels; bump it whenever a level would compile differently
+PARSER_VERSION = 1
+# next to the game, so every working directory shares the compiled levels
+LEVEL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.level_cache')
+
+
+def compile_level(text):
+    """Parses the text of a level and lays out the tables loading it needs, see levelcache.
+
+    Parameters:
+        text (str): The text of a level file or saved game.
+
+    Returns:
+        (bytes): The compiled level: its kind codes, special tiles, moves,
+            regions and distance fields.
+
+    Raises:
+        ValueError: If the level is malformed.
+    """
+    game = GameLogic("", parse_game(text.splitlines()))
+    information = game.get_game_information()
+    size = game.get_dungeon_size()
+    door_field, key_field = game._door_field, game._key_field
+    return pack_level(PARSER_VERSION, size, game.level, game.get_player().get_position(),
+                      information.get_kinds(), information.positions(KEY), information.positions(DOOR),
+                      information.positions(MOVE_INCREASE), passability(game.get_walls(), size)._regions,
+                      door_field._distances if door_field is not None else None,
+                      key_field._distances if key_field is not None else None)
+
+
+LEVEL_CACHE = LevelCache(LEVEL_CACHE_DIR, compile_level, PARSER_VERSION)
+
+
+def load_compiled(filename):
+    """Reads a level file and returns its compiled level, parsing it only if its text was never compiled.
+
+    Parameters:
+        filename (str): The name of the level file.
+
+    Returns:
+        (CompiledLevel): The compiled level.
+
+    Raises:
+        ValueError: If the level is malformed.
+        OSError: If the file cannot be read.
+    """
+    with open(filename, 'r') as file:
+        return LEVEL_CACHE.load(file.read())
+
+
+def compiled_layout(compiled):
+    """Returns the layout of a compiled level, as load_game returns it."""
+    text = bytes(compiled.kinds).translate(_FROM_KIND_CODES).decode("latin-1")
+    size = compiled.size
+    layout = [list(text[start:start + size]) for start in range(0, size * size, size)]
+    row, col = compiled.player
+    layout[row][col] = PLAYER
+    return layout
+
+
+class HintEngine:
+    """Suggests the next move of the shortest way out of a running game.
+
+    A route walks to the key and then to the door, with a detour to at most
+    one banana before each of them when the moves left would not do. The
+    route is planned once and every state along it (position, moves left,
+    bananas left and key) is indexed, so while the game follows the route,
+    or is undone back onto it, a hint is a dictionary lookup. A game that
+    leaves the route is planned again from the cached distance fields of
+    the key and the door; the player is only searched from when a detour is
+    needed, and then no further than its moves left.
+    """
+
+    # detour candidates rated exactly by walking them, the others are rated by distances
+    WALKED_CANDIDATES = 8
+
+    def __init__(self, game):
+        """
+        Parameters:
+            game (GameLogic): The game to give hints for.
+        """
+        self._game = game
+        self._route = []
+        self._steps = {}
+
+    def get_game(self):
+        """ """
+        return self._game
+
+    def _state(self):
+        """Returns what decides whether the planned route still holds."""
+        player = self._game.get_player()
+        return (player.get_position(), player.moves_remaining(),
+                self._game.get_bonus_moves(), self._game.has_key())
+
+    def hint(self):
+        """Returns the direction of the next move on the shortest way out.
+
+        Returns:
+            (str): A key of DIRECTIONS, or None if the door cannot be reached.
+        """
+        index = self._steps.get(self._state())
+        if index is None:
+            self.plan()
+            index = self._steps.get(self._state())
+        if index is None or index + 1 >= len(self._route):
+            return None
+
+        (x, y), (next_x, next_y) = self._route[index], self._route[index + 1]
+        for direction, delta in DIRECTIONS.items():
+            if delta == (next_x - x, next_y - y):
+                return direction
+
+    def plan(self):
+        """Plans the route from the current state of the game.
+
+        The direct route is taken if the moves left suffice. Otherwise the
+        feasible route with the fewest moves is taken, or, if there is none,
+        the one falling short by the fewest moves.
+        """
+        game = self._game
+        self._route = []
+        self._steps = {}
+
+        way = game.way_out()
+        if way is None:
+            return
+        key, door = way
+        walls, size = game.get_walls(), game.get_dungeon_size()
+        position = game.get_player().get_position()
+        moves = game.get_player().moves_remaining()
+        targets = [door] if key is None else [key, door]
+        fields = {target: distance_field(walls, size, target) for target in targets}
+        bananas = {banana: game.get_entity(banana).get_moves()
+                   for banana in game.get_game_information().positions(MOVE_INCREASE)}
+
+        best_rating, best = self._walk([position, *targets], fields, bananas, key)
+        if best_rating is not None and best_rating[0] and bananas:
+            if position not in fields:
+                fields[position] = DistanceField(walls, size, position, limit=moves)
+
+            def distance(start, end):
+                # walking distances are symmetric, so either end's field will do
+                field = fields.get(end)
+                return field.distance(start) if field is not None else fields[start].distance(end)
+
+            # every leg to a target is walked directly or through one banana,
+            # which only helps if its detour costs less than it gives
+            legs = []
+            for start, target in zip([position, *targets], targets):
+                direct = distance(start, target)
+                if direct is None:
+                    return
+                options = [(None, direct, 0, 0)]
+                for banana, bonus in bananas.items():
+                    there = distance(start, banana)
+                    if there is not None and there + distance(banana, target) - direct < bonus:
+                        options.append((banana, there, distance(banana, target), bonus))
+                legs.append(options)
+
+            candidates = []
+            for choice in itertools.product(*legs):
+                if len(choice) > 1 and choice[0][0] is not None and choice[0][0] == choice[1][0]:
+                    continue
+                left = moves
+                length = 0
+                feasible = True
+                for (banana, there, on, bonus), target in zip(choice, targets):
+                    if banana is not None:
+                        left -= there
+                        feasible = feasible and left >= 0
+                        left += bonus
+                    left -= on if banana is not None else there
+                    feasible = feasible and left >= (1 if target == key else 0)
+                    length += there + (on if banana is not None else 0)
+                candidates.append(((0, length) if feasible else (1, -left), choice))
+
+            # the walks may pick up more bananas on the way, so the best few
+            # candidates are walked to rate them exactly
+            candidates.sort(key=lambda candidate: candidate[0])
+            for _, choice in candidates[:self.WALKED_CANDIDATES]:
+                waypoints = [position]
+                for (banana, _, _, _), target in zip(choice, targets):
+                    waypoints += [target] if banana is None else [banana, target]
+                rating, states = self._walk(waypoints, fields, bananas, key)
+                if rating is not None and rating < best_rating:
+                    best_rating, best = rating, states
+        if best_rating is None:
+            return
+
+        self._route = [state[0] for state in best]
+        for index, state in enumerate(best):
+            self._steps.setdefault(state, index)
+
+    def _walk(self, waypoints, fields, bananas, key):
+        """Walks a route through waypoints and rates it.
+
+        Between two waypoints the walk follows a shortest path, preferring
+        cells with bananas, and the moves left are tracked cell by cell.
+
+        Parameters:
+            waypoints (list<tuple<int, int>>): The current position, then the
+                cells to visit in order, the door last.
+            fields (dict<tuple<int, int>: DistanceField>): The fields of the
+                key, the door and the position, by source.
+            bananas (dict<tuple<int, int>: int>): The moves of the bananas on the board.
+            key (tuple<int, int>): Where the key lies, None if it is held.
+
+        Returns:
+            (tuple<tuple<int, int>, list<tuple>>): The rating, (0, moves) if
+                the moves left last or (1, shortfall) otherwise, and the
+                states (position, moves left, bonus left, has key) walked
+                through; (None, None) if a waypoint cannot be reached.
+        """
+        eaten = set()
+        position, left, bonus, has_key = state = self._state()
+        states = [state]
+        feasible = True
+        for start, end in zip(waypoints, waypoints[1:]):
+            if end in fields:
+                cells = self._descend(fields[end], start, bananas, eaten)
+            elif start in fields:
+                cells = self._descend(fields[start], end, bananas, eaten)[::-1][1:] + [end]
+            else:
+                cells = None
+            if cells is None:
+                return None, None
+
+            for cell in cells:
+                left -= 1
+                if cell in bananas and cell not in eaten:
+                    # the banana makes up for a move that leaves none
+                    feasible = feasible and left >= 0
+                    eaten.add(cell)
+                    left += bananas[cell]
+                    bonus -= bananas[cell]
+                else:
+                    if cell == key:
+                        has_key = True
+                    feasible = feasible and left >= (0 if cell == waypoints[-1] else 1)
+                states.append((cell, left, bonus, has_key))
+
+        length = len(states) - 1
+        return ((0, length) if feasible else (1, -left)), states
+
+    def _descend(self, field, start, bananas, eaten):
+        """Returns the cells of a shortest walk from start to the source of a field.
+
+        Parameters:
+            field (DistanceField): The field to walk down.
+            start (tuple<int, int>): Where the walk starts, not included.
+            bananas (dict<tuple<int, int>: int>): Cells preferred when there is a choice.
+            eaten (set<tuple<int, int>>): Bananas that are no longer preferred.
+
+        Returns:
+            (list<tuple<int, int>>): The cells walked, ending at the source,
+                or None if start cannot be reached.
+        """
+        distance = field.distance(start)
+        if distance is None:
+            return None
+        size = self._game.get_dungeon_size()
+        cells = []
+        x, y = start
+        while distance:
+            step = None
+            for dx, dy in DIRECTIONS.values():
+                cell = (x + dx, y + dy)
+                if 0 <= cell[0] < size and 0 <= cell[1] < size and field.distance(cell) == distance - 1:
+                    if step is None or (cell in bananas and cell not in eaten):
+                        step = cell
+            x, y = step
+            distance -= 1
+            cells.append(step)
+        return cells
+
+
+class Campaign:
+    """The levels of a campaign, played one after the other.
+
+    Loading a level parses it and computes its distance fields, so the next
+    level is meant to be loaded by prefetch on a background thread while
+    the current one is played; advancing is then a swap.
+    """
+
+    def __init__(self, levels, pack=None):
+        """
+        Parameters:
+            levels (list<str>): The level files, or the level IDs of pack, in order.
+            pack (LevelPack): The pack the levels are read from, None for level files.
+        """
+        self._levels = list(levels)
+        self._pack = pack
+        self._index = 0
+        self._prefetched = None
+
+    def __len__(self):
+        return len(self._levels)
+
+    def get_index(self):
+        """Returns the index of the level being played."""
+        return self._index
+
+    def has_next(self):
+        """ """
+        return self._index + 1 < len(self._levels)
+
+    def load(self, index):
+        """Loads a level of the campaign.
+
+        Parameters:
+            index (int): The index of the level.
+
+        Returns:
+            (GameLogic): The level, ready to be played.
+        """
+        if self._pack is not None:
+            return GameLogic.from_pack(self._pack, self._levels[index])
+        return GameLogic(self._levels[index])
+
+    def prefetch(self):
+        """Loads the next level and the grids of its route finding.
+
+        Only reads the campaign, so it may run on a background thread.
+
+        Returns:
+            (tuple<int, GameLogic>): The index and the loaded next level.
+        """
+        index = self._index + 1
+        game = self.load(index)
+        passability(game.get_walls(), game.get_dungeon_size())
+        return index, game
+
+    def set_prefetched(self, prefetched):
+        """Keeps a level returned by prefetch until it is advanced to.
+
+        Parameters:
+            prefetched (tuple<int, GameLogic>): The result of prefetch.
+        """
+        self._prefetched = prefetched
+
+    def advance(self):
+        """Moves on to the next level.
+
+        Returns:
+            (GameLogic): The next level, loaded now if it was not prefetched.
+        """
+        self._index += 1
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is not None and prefetched[0] == self._index:
+            return prefetched[1]
+        return self.load(self._index)
+
+
+HIGH_SCORES_FILE = 'high_scores.txt'
+# the statistics of HIGH_SCORES_FILE, see score_analytics
+HIGH_SCORES_SUMMARY_FILE = 'high_scores_summary.json'
+AUTOSAVE_DIR = 'autosave'
+# where the profiles captured from the menu are saved, the seconds captured by default and the functions shown
+PROFILE_DIR = 'profiles'
+PROFILE_SECONDS = 10
+PROFILE_FUNCTIONS = 12
+
+# milliseconds between two moves of a walk to a clicked tile
+WALK_INTERVAL = 60
+
+# milliseconds between two frames of the animated map, and of the glide of the player from a tile to the next
+FRAME_INTERVAL = 16
+GLIDE_TIME = 80
+
+# how far the player sees with the fog of war, and how bright the explored tiles out of sight are drawn
+FOG_RADIUS = 6
+REMEMBERED_SHADE = 0.45
+
+TILES = {"WALL":'#', "PLAYER":'O', "DOOR": 'D', "KEY":'K', "BANANA":'M', "Null": 0}
+# the following parameters stand for the level of game
+TASK_ONE = 1
+TASK_TWO = 2
+MASTERS = 3
+
+
+class AbstractGrid(tk.Canvas):
+    '''
+    the class is a abstract class to draw a grid map
     '''
     def __init__(self, master, rows, cols, width, height, *args, **kwargs):
         '''
@@ -402,19 +2095,26 @@ class DungeonMap(AbstractGrid):
     '''
     a Concrete class to describe the board of the game
     '''
-    def __init__(self, master, board, size=5, width=600, *args, **kwargs):
+    def __init__(self, master, board, size=5, width=600, tile_size=50, on_click=None, fog=None, *args, **kwargs):
         '''
 
         :param master: parent frame
         :param board: the matrix of the game
         :param size: the size of the board
         :param width: the width of the canvas
+        :param tile_size: the width of a tile in pixels, one of SPRITE_SIZES
+        :param on_click: called with the (row, column) of a clicked tile
+        :param fog: the FieldOfView of the player with the fog of war, None to show the whole board
         :param args:
         :param kwargs:
         '''
         super().__init__(master, size, size, width, 800, *args, **kwargs)
 
         self.board_matrix = board
+        self.tile_size = tile_size
+        self.on_click = on_click
+        self.fog = fog
+        self.highlighted = None
         self.board_grid = self.load_board_grid()
         self.redraw_board_grid(self.board_matrix)
 
@@ -429,29 +2129,108 @@ class DungeonMap(AbstractGrid):
             board_row = []
             for x, tile in enumerate(row):
                 placement = tk.Label(self.master, text='  ', bg='green')
-                placement.grid(column=x, row=y, ipadx=20, ipady=20, padx=0, pady=0)
+                placement.grid(column=x, row=y, ipadx=self.tile_padding(), ipady=self.tile_padding(), padx=0, pady=0)
+                self.bind_click(placement, (y, x))
                 board_row.append(placement)
             labels.append(board_row)
 
         return labels
 
+    def bind_click(self, placement, position):
+        '''
+        to report clicks on a tile to on_click
+        :param placement: the label of the tile
+        :param position: the (row, column) of the tile
+        :return:
+        '''
+        if self.on_click is not None:
+            placement.bind('<Button-1>', lambda event: self.on_click(position))
+
+    def tile_padding(self):
+        '''
+        the inner padding giving the text tiles their size, 20 for the default tile size of 50
+        :return: the padding in pixels
+        '''
+        return max(0, (self.tile_size - 10) // 2)
+
+    def set_tile_size(self, tile_size):
+        '''
+        to zoom the map, only the padding of the existing tiles changes
+        :param tile_size: the width of a tile in pixels, one of SPRITE_SIZES
+        :return:
+        '''
+        self.tile_size = tile_size
+        for row in self.board_grid:
+            for placement in row:
+                placement.grid_configure(ipadx=self.tile_padding(), ipady=self.tile_padding())
+
     def redraw_board_grid(self, board):
         '''
         to update the disappearing of the board of game
         :param board: the matrix of board of game
         :return:
         '''
-
         self.board_matrix = board
+        self.clear_highlight()
 
         for y, row in enumerate(self.board_matrix):
             for x, tile in enumerate(row):
-                text, background = self._text_and_background(tile)
-                placement = self.board_grid[y][x]
-                if tile != 0:
-                    placement.config(text=text, bg=background, borderwidth=0.5, relief="solid")
-                else:
-                    placement.config(text=text, bg=background, borderwidth=0)
+                self.draw_tile(y, x)
+
+    def redraw_cells(self, board, cells):
+        '''
+        to update only some tiles, e.g. the ones a move changed or the fog of war revealed or hid
+        :param board: the matrix of board of game
+        :param cells: the (row, column) of the tiles to update
+        :return:
+        '''
+        self.board_matrix = board
+        self.clear_highlight()
+
+        for y, x in cells:
+            self.draw_tile(y, x)
+
+    def draw_tile(self, y, x):
+        '''
+        to show the tile of the board at a position, hidden or darkened by the fog of war
+        :param y: the row of the tile
+        :param x: the column of the tile
+        :return:
+        '''
+        placement = self.board_grid[y][x]
+        if self.fog is not None and not self.fog.is_explored((y, x)):
+            placement.config(text='   ', bg='Black', borderwidth=0)
+            return
+
+        tile = self.board_matrix[y][x]
+        text, background = self._text_and_background(tile)
+        if self.fog is not None and not self.fog.is_visible((y, x)):
+            background = 'DimGray'
+        if tile != 0:
+            placement.config(text=text, bg=background, borderwidth=0.5, relief="solid")
+        else:
+            placement.config(text=text, bg=background, borderwidth=0)
+
+    def highlight(self, position):
+        '''
+        to mark a tile, e.g. the hinted move, until the board is redrawn
+        :param position: the (row, column) of the tile
+        :return:
+        '''
+        row, col = position
+        self.highlighted = position
+        self.board_grid[row][col].config(bg='Cyan', borderwidth=0.5, relief="solid")
+
+    def clear_highlight(self):
+        '''
+        to remove the mark of the highlighted tile
+        :return:
+        '''
+        if self.highlighted is not None:
+            row, col = self.highlighted
+            self.highlighted = None
+            self.board_grid[row][col].config(bg='green', relief='flat')
+            self.draw_tile(row, col)
 
     def _text_and_background(self, tile):
         '''
@@ -661,6 +2440,15 @@ class StatusBar(tk.Frame):
         text = "Moves Left\n %s moves remaining" % left_step
         self.left_move.config(text=text)
 
+    def reset(self, timer=0):
+        '''
+        to show the status of a new game on the same widgets
+        :param timer: the start time of the timer
+        :return:
+        '''
+        self.timer = timer
+        self.timer_label.config(text='Time elapsed:\n%s m %s s' % (self.timer // 60, self.timer % 60))
+
     def quit(self):
         '''
         to quit the game
@@ -713,6 +2501,7 @@ class LifeBar(StatusBar):
         super().__init__(master)
         self.life_frame = None
         self.left_life = 3
+        self.left_hints = 3
         self.gameapp = game
         self.player_positions = []
         self.info_status = []
@@ -743,6 +2532,16 @@ class LifeBar(StatusBar):
         button = tk.Button(text_frame, text='Use', command=self.use_life)
         button.pack(side=tk.BOTTOM)
 
+        hint_frame = tk.Frame(self.life_frame)
+        hint_frame.pack(side=tk.RIGHT)
+
+        text = "Hints remaining: %s" % self.left_hints
+        self.hint_label = tk.Label(hint_frame, text=text)
+        self.hint_label.pack(side=tk.TOP)
+
+        button = tk.Button(hint_frame, text='Hint', command=self.use_hint)
+        button.pack(side=tk.BOTTOM)
+
     def update_life(self):
         '''
         to update the data of the life bar
@@ -751,6 +2550,19 @@ class LifeBar(StatusBar):
         text = "Lives remaining: %s" % self.left_life
         self.life_label.config(text=text)
 
+    def reset(self, timer=0):
+        '''
+        rewrite to parent function. a new game gets all its lives and hints back and nothing to undo
+        :param timer: the start time of the timer
+        :return:
+        '''
+        super().reset(timer)
+        self.left_life = 3
+        self.left_hints = 3
+        self.player_positions, self.info_status, self.moves_status, self.timer_status = [], [], [], []
+        self.update_life()
+        self.hint_label.config(text="Hints remaining: %s" % self.left_hints)
+
     def restore_status(self, player_position, infos, moves, timer):
         '''
         several lists to store the information the after player handled
@@ -775,23 +2587,36 @@ class LifeBar(StatusBar):
             text = "Lives remaining: %s" % self.left_life
             self.life_label.config(text=text)
             if self.player_positions:
-                self.gameapp.game.get_player().set_position(self.player_positions.pop())
-                self.gameapp.game._game_information = self.info_status.pop()
-
-                for i in self.gameapp.game.get_player().get_inventory():
-                    if i in self.gameapp.game.get_game_information().values():
-                        self.gameapp.game.get_player().get_inventory().pop()
-
-                self.gameapp.game.get_player().change_move_count(- self.gameapp.game.get_player().moves_remaining() +
-                                                                 self.moves_status.pop())
+                self.gameapp.game.restore(self.player_positions.pop(), self.info_status.pop(),
+                                          self.moves_status.pop())
+                # the timer goes back first, so the broadcast and the checkpoint carry it
+                self.gameapp.statusbar.timer = self.timer_status.pop()
                 self.gameapp.update_board()
+                self.gameapp.look()
                 self.gameapp.map.redraw_board_grid(self.gameapp.board)
-
-                self.gameapp.statusbar.timer = self.timer_status.pop()
+                self.gameapp.broadcast()
+                self.gameapp.autosave()
         else:
             messagebox.showinfo('Error', 'Your do not have any life or you did not do any operations after switching to'
                                          ' MASTER mode.')
 
+    def use_hint(self):
+        '''
+        to highlight the tile of the next move on the shortest way to the nest
+        :return:
+        '''
+        if not self.left_hints:
+            messagebox.showinfo('Error', 'You do not have any hint left.')
+            return
+
+        position = self.gameapp.hint()
+        if position is None:
+            messagebox.showinfo('Hint', 'There is no way to the nest from here.')
+            return
+        self.left_hints -= 1
+        self.hint_label.config(text="Hints remaining: %s" % self.left_hints)
+        self.gameapp.map.highlight(position)
+
 
 class MenuBar(tk.Menu):
     '''
@@ -807,6 +2632,10 @@ class MenuBar(tk.Menu):
         self.gameApp = game_app
         self.game_frame = None
         self.task_frame = None
+        self.view_frame = None
+        self.profile_frame = None
+        self.fog = None
+        self.animated = None
 
         self.initialize_menu()
 
@@ -819,7 +2648,17 @@ class MenuBar(tk.Menu):
         self.game_frame.add_command(label ="Save Game", command=self._save_game)
         self.game_frame.add_command(label ="Load Game", command=self._load_game)
         self.game_frame.add_command(label="New Game", command=self._new_game)
+        self.game_frame.add_command(label="Select Level", command=self._select_level)
+        self.game_frame.add_command(label="Campaign", command=self._campaign)
+        self.game_frame.add_command(label="Level Editor", command=self._level_editor)
         self.game_frame.add_command(label="High Scores", command=self._high_score)
+        self.game_frame.add_command(label="Broadcast", command=self._broadcast)
+        self.profile_frame = tk.Menu(self.game_frame, tearoff=0)
+        # sampling needs interval timers, which some platforms lack
+        if SAMPLING in PROFILE_MODES:
+            self.profile_frame.add_command(label="Sampling", command=lambda: self._profile(SAMPLING))
+        self.profile_frame.add_command(label="cProfile", command=lambda: self._profile(CPROFILE))
+        self.game_frame.add_cascade(label="Profile", menu=self.profile_frame)
         self.game_frame.add_separator()
         self.game_frame.add_command(label='Quit', command=self._quit)
 
@@ -832,31 +2671,127 @@ class MenuBar(tk.Menu):
 
         self.add_cascade(label="Task", menu=self.task_frame)
 
+        self.view_frame = tk.Menu(self, tearoff=0)
+        self.view_frame.add_command(label="Zoom In", command=lambda: self.gameApp.zoom(1))
+        self.view_frame.add_command(label="Zoom Out", command=lambda: self.gameApp.zoom(-1))
+        self.view_frame.add_command(label="Fit to Window", command=self.gameApp.fit_to_window)
+        self.view_frame.add_separator()
+        self.fog = tk.BooleanVar(self, value=False)
+        self.view_frame.add_checkbutton(label="Fog of War", variable=self.fog,
+                                        command=lambda: self.gameApp.set_fog(self.fog.get()))
+        self.animated = tk.BooleanVar(self, value=False)
+        self.view_frame.add_checkbutton(label="Animated Movement", variable=self.animated,
+                                        command=lambda: self.gameApp.set_animated(self.animated.get()))
+
+        self.add_cascade(label="View", menu=self.view_frame)
+
     def _high_score(self):
         '''
-        to read the rank file and show the information of the rank
+        to read the summary of the rank file and show the information of the rank
         :return:
         '''
+        self.gameApp.io.call(self._load_high_scores, self._show_high_score,
+                             lambda e: messagebox.showinfo('High Scores', 'Sorry, the high scores could not be '
+                                                                          'read: %s' % e))
+
+    @staticmethod
+    def _load_high_scores():
+        '''
+        to read the summary of the rank file, it is built from the rank file the first time. it runs on the io worker
+        :return: the ScoreSummary
+        '''
         try:
-            file_path = 'high_scores.txt'
-            with open(file_path, 'r') as load_file:
-                content = load_file.readlines()
+            return read_summary(HIGH_SCORES_SUMMARY_FILE)
+        except (OSError, ValueError, KeyError):
+            summary = summarize([HIGH_SCORES_FILE])
+            write_summary(summary, HIGH_SCORES_SUMMARY_FILE)
+            return summary
 
-            rank = {}
-            for i in content:
-                rank[i.split(':')[0]] = i.split(':')[1]
+    def _show_high_score(self, summary):
+        '''
+        to show the top 3 and the best time of every level once the summary has been read
+        :param summary: the ScoreSummary of the rank file
+        :return:
+        '''
+        rank_message = ''
+        for name, seconds, level in summary.best(3):
+            rank_message += '%s: %s m %s s\n' % (name, seconds // 60, seconds % 60)
 
-            rank = sorted(rank.items(), key=lambda item: int(item[1]))
-            rank_message = ''
+        levels = [(level, stats) for level, stats in sorted(summary.levels.items()) if level]
+        if levels:
+            rank_message += '\n'
+        for level, stats in levels:
+            rank_message += '%s: %s wins, best %s, median %s\n' % (level, stats.count, format_time(stats.best),
+                                                                   format_time(stats.percentile(50)))
 
-            for key, value in enumerate(rank):
-                temp = int(value[1])
-                if key < 3:
-                    rank_message += '%s: %s m %s s\n'%(value[0],  temp // 60, temp % 60)
+        messagebox.showinfo('High Scores', rank_message or 'Nobody has won yet')
 
-            messagebox.showinfo('High Scores', rank_message)
-        except Exception as e:
-            messagebox.showinfo('Top 3', 'Load failed. It will go to new default game')
+    def _broadcast(self):
+        '''
+        to start or stop streaming the game to spectators on a local socket
+        :return:
+        '''
+        if self.gameApp.spectators is None:
+            hub = SpectatorHub(os.path.join(tempfile.gettempdir(), 'keycave-spectate.sock'))
+            try:
+                hub.start()
+            except OSError as e:
+                messagebox.showinfo('Broadcast', 'Sorry, the broadcast could not be started: %s' % e)
+                return
+            self.gameApp.spectators = hub
+            self.gameApp.broadcast()
+            messagebox.showinfo('Broadcast', 'Spectators can watch with:\npython spectator.py %s' % hub.get_path())
+        else:
+            self.gameApp.spectators.close()
+            self.gameApp.spectators = None
+            messagebox.showinfo('Broadcast', 'The broadcast was stopped')
+
+    def _profile(self, mode):
+        '''
+        to profile the next seconds of play, the sampling profiler slows the game far less than cProfile
+        :param mode: SAMPLING or CPROFILE
+        :return:
+        '''
+        if self.gameApp.profiler is not None:
+            messagebox.showinfo('Profile', 'A profile is already being captured')
+            return
+        seconds = simpledialog.askinteger('Profile', 'Seconds of play to profile:', initialvalue=PROFILE_SECONDS,
+                                          minvalue=1, maxvalue=3600, parent=self.master)
+        if not seconds:
+            return
+        capture = ProfileCapture(mode)
+        capture.start()
+        self.gameApp.profiler = capture
+        self.gameApp.master.after(seconds * 1000, self._finish_profile)
+
+    def _finish_profile(self):
+        '''
+        to stop the profiler, save its report on the io worker and show the functions the most time went into
+        :return:
+        '''
+        capture = self.gameApp.profiler
+        capture.stop()
+        self.gameApp.profiler = None
+        game_directory = os.path.dirname(os.path.abspath(__file__))
+        self.gameApp.io.call(lambda: (capture.save(PROFILE_DIR),
+                                      capture.hot_functions(PROFILE_FUNCTIONS, game_directory)),
+                             lambda result: self._show_profile(capture, *result),
+                             lambda e: messagebox.showinfo('Profile', 'Sorry, the profile could not be saved: %s' % e))
+
+    @staticmethod
+    def _show_profile(capture, path, functions):
+        '''
+        to show where the time of a profile went
+        :param capture: the stopped ProfileCapture
+        :param path: the file the profile was saved to
+        :param functions: the (label, own seconds, total seconds) of the hottest functions of the game
+        :return:
+        '''
+        lines = ['%s: %.0f ms in it, %.0f ms with its calls' % (name, 1000 * own, 1000 * total)
+                 for name, own, total in functions]
+        messagebox.showinfo('Profile', '%.1f s profiled with %s, saved to %s\n\n%s'
+                            % (capture.get_seconds(), capture.get_mode(), path,
+                               '\n'.join(lines) or 'No time was spent in the game'))
 
     def _save_game(self):
         '''
@@ -867,54 +2802,48 @@ class MenuBar(tk.Menu):
             messagebox.showinfo('Error', 'The Game Was End, You Cannot Save It!')
             return
 
-        map_to_matrix = ''
-        for row in self.gameApp.board:
-            for i in row:
-                if i != 0:
-                    map_to_matrix += i
-                else:
-                    map_to_matrix += ' '
-            map_to_matrix += '\n'
-
-        file_content = "%s\n%s\n%s" % (map_to_matrix[:-1], self.gameApp.game.get_player().moves_remaining(),
-                                       self.gameApp.statusbar.timer)
+        file_content = self.gameApp.game.to_text(self.gameApp.statusbar.timer)
 
         file_path = filedialog.asksaveasfilename(title=u'Save Game', defaultextension='.txt',
                                                  initialfile='untitled_game',
                                                  filetypes=[('text file', '.txt'), ('all file', '.*')])
 
-        if file_content is not None:
-            try:
-                with open(file=file_path, mode='w', encoding='utf-8') as file:
-                    file.write(file_content)
-                file.close()
-                messagebox.showinfo('Save Game', 'Done')
-            except:
-                pass
+        if file_path:
+            self.gameApp.io.replace(file_path, file_content, lambda _: messagebox.showinfo('Save Game', 'Done'),
+                                    lambda e: messagebox.showinfo('Save Game', 'Sorry, save failed: %s' % e))
 
     def _load_game(self):
         '''
         to read the saved file to go back to the state of saved game
         :return:
         '''
-        try:
-            file_path = filedialog.askopenfilename(title=u'Load File',
-                                                   filetypes=[('text file', '.txt'), ('all file', '.*')])
-            with open(file_path, 'r') as load_file:
-                content = load_file.readlines()
-
-            file_path = file_path.split('/')[-1]
-
-            if file_path in GAME_LEVELS.keys():
-                self.gameApp.statusbar.timer = 0
-            else:
-                timer = int(content[-1])
-                self.gameApp.statusbar.timer = timer
-            self.gameApp.game = GameLogic(file_path)
-            self.gameApp.redraw()
+        file_path = filedialog.askopenfilename(title=u'Load File',
+                                               filetypes=[('text file', '.txt'), ('all file', '.*')])
+        if file_path:
+            self.gameApp.io.read(file_path, lambda content: self._start_loaded_game(file_path, content),
+                                 lambda e: messagebox.showinfo('Load Game', 'Sorry, load failed: %s' % e))
 
-        except Exception as e:
-            messagebox.showinfo('Load Game', 'Sorry, load Failed. There are some unknown errors')
+    def _start_loaded_game(self, file_path, content):
+        '''
+        to go back to the state of a saved game once its file has been read
+        :param file_path: the path of the saved file
+        :param content: the text of the saved file
+        :return:
+        '''
+        name = os.path.basename(file_path)
+        lines = content.splitlines()
+        try:
+            game = GameLogic.from_text(name, content)
+            footer = split_game(lines)[1]
+            timer = 0 if name in GAME_LEVELS else int(footer[1])
+            # saves made before the state hash was added have no hash line
+            saved_hash = int(footer[2], 16) if len(footer) > 2 and name not in GAME_LEVELS else None
+        except (IndexError, ValueError) as e:
+            messagebox.showinfo('Load Game', 'Sorry, %s is not a saved game: %s' % (name, e))
+            return
+        if saved_hash is not None and saved_hash != game.get_hash():
+            messagebox.showinfo('Load Game', '%s does not match the game that was saved, it may have been edited' % name)
+        self.gameApp.start_game(game, timer)
 
     def _new_game(self):
         '''
@@ -923,6 +2852,50 @@ class MenuBar(tk.Menu):
         '''
         self.gameApp.new_game()
 
+    def _select_level(self):
+        '''
+        to choose a level of a level pack. the listing only reads the index of the pack
+        :return:
+        '''
+        file_path = filedialog.askopenfilename(title=u'Select Level',
+                                               filetypes=[('level pack', '.kcpack'), ('all file', '.*')])
+        if not file_path:
+            return
+        try:
+            pack = LevelPack(file_path)
+        except (OSError, ValueError) as e:
+            messagebox.showinfo('Select Level', 'Sorry, the level pack could not be opened: %s' % e)
+            return
+        LevelSelect(self.master, pack, self.gameApp.play_level)
+
+    def _campaign(self):
+        '''
+        to play the levels one after the other, the ones of the selected level pack if there is one
+        :return:
+        '''
+        pack = self.gameApp.level_pack
+        if pack is not None:
+            self.gameApp.start_campaign([entry.name for entry in pack.entries()], pack)
+        else:
+            self.gameApp.start_campaign(list(GAME_LEVELS))
+
+    def _level_editor(self):
+        '''
+        to edit the board as it is now in a window of its own, the edited level can be played from there
+        :return:
+        '''
+        # the editor is built on this module, so it is only imported once it is needed
+        from level_editor import LevelDraft, LevelEditor
+
+        state = self.gameApp.game.to_state()
+        layout = [list(row) for row in state["board"]]
+        row, col = state["player"]
+        if layout[row][col] == SPACE:
+            layout[row][col] = PLAYER
+        window = tk.Toplevel(self.master)
+        window.title('Level Editor - %s' % state["name"])
+        LevelEditor(window, LevelDraft(layout, state["moves"]), play=self.gameApp.start_game)
+
     def _task_one(self):
         '''
         to switch to task one mode
@@ -958,21 +2931,56 @@ class MenuBar(tk.Menu):
         self.gameApp.master.destroy()
 
 
-class AdvancedDungeoMap(DungeonMap):
+class LevelSelect(tk.Toplevel):
     '''
-    a advanced map class to show the map of the game. it would use the images to show the game
+    a dialog listing the levels of a level pack
     '''
-    def __init__(self, master, board, size=5, width=600, *args, **kwargs):
+    def __init__(self, master, pack, play, *args, **kwargs):
         '''
 
-        :param master: the class would draw on the master
+        :param master: the window the dialog belongs to
+        :param pack: the opened LevelPack
+        :param play: called with the pack and the name of the chosen level
+        '''
+        super().__init__(master, *args, **kwargs)
+        self.title('Select Level')
+        self.pack_file = pack
+        self.play = play
+        self.entries = pack.entries()
+
+        self.listbox = tk.Listbox(self, width=50, height=20)
+        for entry in self.entries:
+            self.listbox.insert(tk.END, '%s  (%sx%s, %s moves)' % (entry.name, entry.rows, entry.cols, entry.budget))
+        self.listbox.pack(side=tk.TOP)
+        self.listbox.bind('<Double-Button-1>', lambda e: self._play())
+
+        button = tk.Button(self, text='Play', command=self._play)
+        button.pack(side=tk.BOTTOM)
+
+    def _play(self):
+        '''
+        to start the selected level and close the dialog
+        :return:
+        '''
+        selection = self.listbox.curselection()
+        if selection:
+            self.play(self.pack_file, self.entries[selection[0]].name)
+            self.destroy()
+
+
+class AdvancedDungeoMap(DungeonMap):
+    '''
+    a advanced map class to show the map of the game. it would use the images to show the game
+    '''
+    def __init__(self, master, board, size=5, width=600, *args, **kwargs):
+        '''
+
+        :param master: the class would draw on the master
         :param board: the board matrix of the game
         :param size: the size of the map board
         :param width: the width of the map board
         '''
         super().__init__(master, board, size, width, *args, **kwargs)
-        self.board_grid = self.load_board_grid()
-        self.redraw_board_grid(self.board_matrix)
 
     def load_board_grid(self):
         '''
@@ -987,49 +2995,385 @@ class AdvancedDungeoMap(DungeonMap):
                 placement = tk.Label(self.master, bg='green')
 
                 placement.grid(column=x, row=y, sticky='nsew')
+                self.bind_click(placement, (y, x))
                 board_row.append(placement)
             labels.append(board_row)
 
         return labels
 
-    def redraw_board_grid(self, board):
+    def draw_tile(self, y, x):
         '''
-        rewrite to parent function. it would update the map board
-        :param board: the board matric of the game
+        rewrite to parent function. it shows the image of a tile, black or darkened by the fog of war
+        :param y: the row of the tile
+        :param x: the column of the tile
         :return:
         '''
-        self.board_matrix = board
-        for y, row in enumerate(self.board_matrix):
-            for x, tile in enumerate(row):
-                placement = self.board_grid[y][x]
-                image = self.load_image(tile)
-                placement.config(image=image)
-                placement.image=image
+        placement = self.board_grid[y][x]
+        image = self.tile_image(y, x, self.board_matrix[y][x])
+        placement.config(image=image)
+        placement.image = image
+
+    def tile_image(self, y, x, tile):
+        '''
+        to find the image of a tile, black or darkened by the fog of war
+        :param y: the row of the tile
+        :param x: the column of the tile
+        :param tile: the sign on the matrix board shown on the tile
+        :return: the image
+        '''
+        if self.fog is not None and not self.fog.is_explored((y, x)):
+            return get_image(FOG_SPRITE, self.tile_size)
+        if self.fog is not None and not self.fog.is_visible((y, x)):
+            return self.load_image(tile, REMEMBERED_SHADE)
+        return self.load_image(tile)
+
+    def set_tile_size(self, tile_size):
+        '''
+        rewrite to parent function. zooming swaps the tiles to the cached images of the new size
+        :param tile_size: the width of a tile in pixels, one of SPRITE_SIZES
+        :return:
+        '''
+        self.tile_size = tile_size
+        self.redraw_board_grid(self.board_matrix)
 
-    def load_image(self, tile):
+    def load_image(self, tile, shade=1.0):
         '''
         to return a corresponding image for a tile
         :param tile: the sign on the matrix board
+        :param shade: the brightness of the image, 1 for the original
         :return: the image of the corresponding tile
         '''
         if tile == TILES["Null"]:
-            image = get_image('empty')
+            image = get_image('empty', self.tile_size, shade)
         elif tile == TILES["WALL"]:
-            image = get_image('wall')
+            image = get_image('wall', self.tile_size, shade)
         elif tile == TILES["KEY"]:
-            image = get_image('key')
+            image = get_image('key', self.tile_size, shade)
         elif tile == TILES["DOOR"]:
-            image = get_image('door')
+            image = get_image('door', self.tile_size, shade)
         elif tile == TILES["BANANA"]:
-            image = get_image('moveIncrease')
+            image = get_image('moveIncrease', self.tile_size, shade)
         elif tile == TILES["PLAYER"]:
-            image = get_image('player')
+            image = get_image('player', self.tile_size, shade)
         else:
-            image = get_image('empty')
+            image = get_image('empty', self.tile_size, shade)
 
         return image
 
 
+class RenderLoop:
+    '''
+    a fixed timestep loop of render frames on the Tk timers, kept apart from the logic ticks of the game. the frames
+    are due on a fixed timetable; a late frame skips the frames it missed instead of running them late, and every
+    frame draws the animation as it is at the time it runs, so under load the frame rate drops but the animation
+    never lags. the loop only runs while there is something to animate
+    '''
+    def __init__(self, widget, render, interval=FRAME_INTERVAL, clock=None):
+        '''
+
+        :param widget: the widget whose timers run the frames
+        :param render: called with the time of a frame in seconds, it returns True while more frames are needed
+        :param interval: the milliseconds between two frames
+        :param clock: returns the time in seconds, time.perf_counter if None
+        '''
+        self.widget = widget
+        self.render = render
+        self.interval = interval / 1000
+        self.clock = clock or time.perf_counter
+        self.timer = None
+        self.next_frame = 0.0
+        # the frames drawn and skipped so far
+        self.frames = 0
+        self.skipped = 0
+
+    def start(self):
+        '''
+        to draw frames until render needs no more, the first one right away
+        :return:
+        '''
+        if self.timer is None:
+            self.next_frame = self.clock()
+            self.timer = self.widget.after(0, self.frame)
+
+    def stop(self):
+        '''
+        to stop drawing frames
+        :return:
+        '''
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+
+    def frame(self):
+        '''
+        to draw a frame and schedule the next one on the timetable
+        :return:
+        '''
+        now = self.clock()
+        missed = int((now - self.next_frame) / self.interval)
+        if missed > 0:
+            self.skipped += missed
+            self.next_frame += missed * self.interval
+        self.frames += 1
+        if not self.render(now):
+            self.timer = None
+            return
+        self.next_frame += self.interval
+        self.timer = self.widget.after(max(1, int((self.next_frame - self.clock()) * 1000)), self.frame)
+
+
+class AnimatedDungeonMap(AdvancedDungeoMap):
+    '''
+    a map drawing the board on a single canvas, with the player as an item of its own that glides from a tile to
+    the next. the tiles are image items reconfigured only when their image changes, and a frame of a glide only
+    moves the player item
+    '''
+    def __init__(self, master, board, *args, clock=None, **kwargs):
+        '''
+
+        :param master: the frame the canvas is put on
+        :param board: the board matrix of the game
+        :param clock: returns the time in seconds the glides are timed by, time.perf_counter if None
+        '''
+        self.clock = clock
+        self.player_item = None
+        self.highlight_item = None
+        # the image shown on every tile, the tile and the pixels of the player, and the glide being drawn
+        self.shown = []
+        self.player_cell = None
+        self.player_xy = (0, 0)
+        self.glide = None
+        self.loop = None
+        super().__init__(master, board, *args, **kwargs)
+
+    def load_board_grid(self):
+        '''
+        rewrite to parent function. it creates an image item for every tile and one for the player on the canvas
+        :return: the image items of the tiles, row by row
+        '''
+        size = len(self.board_matrix)
+        extent = size * self.tile_size
+        self.config(width=extent, height=extent, bg='black', highlightthickness=0)
+        self.grid(column=0, row=0)
+        if self.loop is None:
+            self.loop = RenderLoop(self, self.render_glide, clock=self.clock)
+            if self.on_click is not None:
+                self.bind('<Button-1>', self.click)
+
+        items = [[self.create_image(x * self.tile_size, y * self.tile_size, anchor=tk.NW) for x in range(size)]
+                 for y in range(size)]
+        self.shown = [[None] * size for _ in range(size)]
+        # created last, so the player is drawn above the tiles
+        self.player_item = self.create_image(0, 0, anchor=tk.NW, image=get_image('player', self.tile_size))
+        self.player_cell = None
+        self.highlight_item = None
+        return items
+
+    def click(self, event):
+        '''
+        to report a click on the canvas as a click on its tile
+        :param event: the click event
+        :return:
+        '''
+        row, col = event.y // self.tile_size, event.x // self.tile_size
+        if 0 <= row < len(self.board_matrix) and 0 <= col < len(self.board_matrix):
+            self.on_click((row, col))
+
+    def draw_tile(self, y, x):
+        '''
+        rewrite to parent function. the tile under the player shows the floor, the player is drawn above it
+        :param y: the row of the tile
+        :param x: the column of the tile
+        :return:
+        '''
+        tile = self.board_matrix[y][x]
+        image = self.tile_image(y, x, TILES["Null"] if tile == TILES["PLAYER"] else tile)
+        if image is not self.shown[y][x]:
+            self.shown[y][x] = image
+            self.itemconfigure(self.board_grid[y][x], image=image)
+
+    def redraw_board_grid(self, board):
+        '''
+        rewrite to parent function. the player is put on its tile without gliding, e.g. after an undo
+        :param board: the matrix of board of game
+        :return:
+        '''
+        super().redraw_board_grid(board)
+        for y, row in enumerate(board):
+            for x, tile in enumerate(row):
+                if tile == TILES["PLAYER"]:
+                    self.place_player((y, x), glide=False)
+
+    def redraw_cells(self, board, cells):
+        '''
+        rewrite to parent function. a player moved to one of the cells glides there
+        :param board: the matrix of board of game
+        :param cells: the (row, column) of the tiles to update
+        :return:
+        '''
+        super().redraw_cells(board, cells)
+        for y, x in cells:
+            if board[y][x] == TILES["PLAYER"]:
+                self.place_player((y, x))
+
+    def place_player(self, position, glide=True):
+        '''
+        to move the player item to a tile
+        :param position: the (row, column) of the tile
+        :param glide: True to glide there from where the player is shown, over the next frames
+        :return:
+        '''
+        row, col = position
+        target = (col * self.tile_size, row * self.tile_size)
+        if glide and self.player_cell is not None and position != self.player_cell:
+            self.glide = (self.player_xy, target, self.loop.clock())
+            self.loop.start()
+        elif position != self.player_cell or self.glide is not None:
+            self.glide = None
+            self.loop.stop()
+            self.move_player_item(target)
+        self.player_cell = position
+
+    def render_glide(self, now):
+        '''
+        to draw a frame of the glide of the player, where it is at a time
+        :param now: the time of the frame in seconds
+        :return: True while the glide goes on
+        '''
+        if self.glide is None:
+            return False
+        (start_x, start_y), (end_x, end_y), started = self.glide
+        progress = min(1.0, (now - started) * 1000 / GLIDE_TIME)
+        self.move_player_item((start_x + (end_x - start_x) * progress, start_y + (end_y - start_y) * progress))
+        if progress >= 1.0:
+            self.glide = None
+            return False
+        return True
+
+    def move_player_item(self, xy):
+        '''
+        to put the player item at a point of the canvas
+        :param xy: the (x, y) of its top left corner in pixels
+        :return:
+        '''
+        self.player_xy = xy
+        self.coords(self.player_item, *xy)
+
+    def highlight(self, position):
+        '''
+        rewrite to parent function. the tile gets a frame until the board is redrawn
+        :param position: the (row, column) of the tile
+        :return:
+        '''
+        self.clear_highlight()
+        row, col = position
+        self.highlighted = position
+        self.highlight_item = self.create_rectangle(col * self.tile_size + 1, row * self.tile_size + 1,
+                                                    (col + 1) * self.tile_size - 1, (row + 1) * self.tile_size - 1,
+                                                    outline='Cyan', width=2)
+
+    def clear_highlight(self):
+        '''
+        rewrite to parent function. it removes the frame of the highlighted tile
+        :return:
+        '''
+        self.highlighted = None
+        if self.highlight_item is not None:
+            self.delete(self.highlight_item)
+            self.highlight_item = None
+
+    def set_tile_size(self, tile_size):
+        '''
+        rewrite to parent function. the items are created again at the new size
+        :param tile_size: the width of a tile in pixels, one of SPRITE_SIZES
+        :return:
+        '''
+        self.tile_size = tile_size
+        self.glide = None
+        self.loop.stop()
+        self.delete('all')
+        self.board_grid = self.load_board_grid()
+        self.redraw_board_grid(self.board_matrix)
+
+    def destroy(self):
+        '''
+        rewrite to parent function. it stops the frames first
+        :return:
+        '''
+        if self.loop is not None:
+            self.loop.stop()
+        super().destroy()
+
+
+class CanvasBoardRenderer:
+    '''
+    draws the boards of many headless games on one canvas. every tile is an image item showing a sprite of
+    the shared SPRITES, and only the tiles whose sprite changed are touched when a board is redrawn
+    '''
+    def __init__(self, canvas, tile_size=20):
+        '''
+
+        :param canvas: the canvas the boards are drawn on
+        :param tile_size: the width of a tile in pixels, one of SPRITE_SIZES
+        '''
+        self.canvas = canvas
+        self.tile_size = tile_size
+        # the game, the image items and the sprite names shown of every board, row by row
+        self.boards = []
+
+    def add_board(self, game, x, y):
+        '''
+        to draw the board of a game
+        :param game: the GameLogic shown on the board
+        :param x: the left edge of the board on the canvas
+        :param y: the top edge of the board on the canvas
+        :return: the index of the board
+        '''
+        size = game.get_dungeon_size()
+        items = []
+        names = []
+        for row in range(size):
+            for col in range(size):
+                name = self.sprite_name(game, (row, col))
+                items.append(self.canvas.create_image(x + col * self.tile_size, y + row * self.tile_size,
+                                                      image=SPRITES.get(name, self.tile_size), anchor=tk.NW))
+                names.append(name)
+        self.boards.append((game, items, names))
+        return len(self.boards) - 1
+
+    def draw_cells(self, board, cells):
+        '''
+        to update some tiles of a board, e.g. the ones a move changed
+        :param board: the index of the board
+        :param cells: the (row, column) of the tiles to update
+        :return: the number of tiles whose sprite changed
+        '''
+        game, items, names = self.boards[board]
+        size = game.get_dungeon_size()
+        changed = 0
+        for row, col in cells:
+            index = row * size + col
+            name = self.sprite_name(game, (row, col))
+            if names[index] != name:
+                names[index] = name
+                self.canvas.itemconfigure(items[index], image=SPRITES.get(name, self.tile_size))
+                changed += 1
+        return changed
+
+    @staticmethod
+    def sprite_name(game, position):
+        '''
+        to find the sprite of a tile of a game, the player is drawn over the entity it stands on
+        :param game: the GameLogic
+        :param position: the (row, column) of the tile
+        :return: one of BOARD_SPRITES
+        '''
+        if position == game.get_player().get_position():
+            return 'player'
+        entity = game.get_entity(position)
+        return 'empty' if entity is None else ENTITY_SPRITES.get(entity.get_id(), 'empty')
+
+
 class GameApp:
     '''
     a class to dispath the game running
@@ -1056,16 +3400,97 @@ class GameApp:
         self.game = GameLogic('game2.txt')
         self.board = self.transfer_board()
 
+        # file reads and writes run on this worker, never on the Tk loop
+        self.io = IOWorker(master, lambda e: messagebox.showinfo('Error', str(e)))
+        self.io.start()
+
+        # the running game is journaled so that it can be resumed after a crash
+        self.journal = AutosaveJournal(AUTOSAVE_DIR, self.io)
+        resumed_timer = self.resume()
+
+        # the level pack the current level was selected from
+        self.level_pack = None
+
+        # the campaign the current level belongs to, see start_campaign
+        self.campaign = None
+
+        # spectators watching the game, see MenuBar._broadcast
+        self.spectators = None
+
+        # the profile being captured, see MenuBar._profile
+        self.profiler = None
+        self.broadcast_timer = 0
+
+        # hints of the MASTERS mode, planned for self.game
+        self.hints = None
+
+        # the moves left of a walk to a clicked tile, see walk_to
+        self.walk_path = []
+        self.walking = False
+
+        # the fog of war and what the player has seen of self.fov_game
+        self.fog = False
+        self.fov = None
+        self.fov_game = None
+
+        # whether the player glides between the tiles, only the sprite maps of TASK TWO and MASTERS are animated
+        self.animated = False
+        # the time in seconds the glides of the animated map are timed by
+        self.clock = time.perf_counter
+
         # state of game
         self.stop = False
         self.task = TASK_TWO
+        self.tile_size = 50
+        try:
+            SPRITES.prepare()
+        except OSError:
+            messagebox.showinfo('Error', 'You may miss some images')
 
         # running game
         self.draw()
+        self.statusbar.timer = resumed_timer
+        self.autosave()
         self.gaming()
         self.update_status_bar()
         self.check_reset()
 
+    def resume(self):
+        '''
+        to offer to continue the game left by the last run, from its checkpoint and the moves journaled since
+        :return: the time elapsed in the resumed game, 0 if a new game is played
+        '''
+        recovered = self.journal.recover()
+        if recovered is None:
+            return 0
+        if not messagebox.askyesno('Resume', 'Would you like to resume the game you were playing last time?'):
+            self.journal.discard()
+            return 0
+
+        state, timer, moves = recovered
+        try:
+            game = GameLogic.from_state(state)
+            for direction, state_hash in moves:
+                game.play_move(direction)
+                if game.get_hash() != state_hash:
+                    raise ValueError("the replay diverged from the recorded game")
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            messagebox.showinfo('Resume', 'Sorry, the last game could not be resumed: %s' % e)
+            self.journal.discard()
+            return 0
+
+        self.game = game
+        self.board = self.transfer_board()
+        return timer
+
+    def autosave(self):
+        '''
+        to write a checkpoint of the running game, later moves are journaled on top of it
+        :return:
+        '''
+        if not self.stop:
+            self.journal.checkpoint(self.game.to_state(), self.statusbar.timer)
+
     def transfer_board(self):
         '''
         to transfer the information of GameLogic class to a two-dimension matrix
@@ -1131,9 +3556,14 @@ class GameApp:
         # self.board_frame.config(bg='green')
 
         if self.task == TASK_ONE:
-            self.map = DungeonMap(self.board_frame, self.board)
+            self.map = DungeonMap(self.board_frame, self.board, tile_size=self.tile_size, on_click=self.walk_to,
+                                  fog=self.field_of_view())
+        elif self.animated:
+            self.map = AnimatedDungeonMap(self.board_frame, self.board, tile_size=self.tile_size,
+                                          on_click=self.walk_to, fog=self.field_of_view(), clock=self.clock)
         elif self.task == TASK_TWO or self.task == MASTERS:
-            self.map = AdvancedDungeoMap(self.board_frame, self.board)
+            self.map = AdvancedDungeoMap(self.board_frame, self.board, tile_size=self.tile_size,
+                                         on_click=self.walk_to, fog=self.field_of_view())
         self.board_frame.pack(side=tk.LEFT)
 
     def draw_pad(self):
@@ -1178,41 +3608,144 @@ class GameApp:
         if not self.stop:
             direction = self.pad.pad_command()
             if direction in DIRECTIONS:
-                if not self.game.collision_check(direction):
-                    # for MASTERs mode to store information before the operation
-                    if self.task == MASTERS:
-                        self.statusbar.restore_status(self.game.get_player().get_position(),
-                                                      self.game.get_game_information().copy(),
-                                                      self.game.get_player().moves_remaining(),
-                                                      self.statusbar.timer)
-
-                    # control the game based on the
-                    self.game.move_player(direction)
-                    self.game.get_player().change_move_count(-1)
-                    entity = self.game.get_entity(self.game.get_player().get_position())
-
-
-                    self.pad.set_command_false()
-                    self.update_board()
-                    self.map.redraw_board_grid(self.board)
-                    if entity is not None:
-                        entity.on_hit(self.game)
-                    if self.game.won():
-                        self.win()
-
+                # a keypress takes over from a walk to a clicked tile
+                self.walk_path = []
+                self.step(direction)
                 self.pad.set_command_false()
             self.master.after(100, self.gaming)
 
             if self.game.check_game_over():
                 self.game_over()
 
+    def step(self, direction):
+        '''
+        to play one move of the player and update the window
+        :param direction: one of DIRECTIONS
+        :return: True if the player moved
+        '''
+        if self.game.collision_check(direction):
+            return False
+
+        # for MASTERs mode to store information before the operation
+        if self.task == MASTERS:
+            self.statusbar.restore_status(self.game.get_player().get_position(),
+                                          self.game.get_game_information().copy(),
+                                          self.game.get_player().moves_remaining(),
+                                          self.statusbar.timer)
+
+        # control the game based on the
+        old_position = self.game.get_player().get_position()
+        self.game.play_move(direction)
+        entity = self.game.get_entity(self.game.get_player().get_position())
+
+        self.update_board()
+        changed = {old_position, self.game.get_player().get_position()}
+        self.map.redraw_cells(self.board, changed | self.look())
+        self.broadcast(list(changed))
+        self.journal.record(direction, self.statusbar.timer, self.game.get_hash())
+        if self.journal.checkpoint_due():
+            self.autosave()
+        if self.game.won():
+            self.win()
+        elif isinstance(entity, Door):
+            messagebox.showinfo('Notice', "You don't have the key!")
+        return True
+
+    def field_of_view(self):
+        '''
+        to get what the player sees of the running game
+        :return: the FieldOfView, None if the fog of war is off
+        '''
+        if not self.fog:
+            return None
+        if self.fov is None or self.fov_game is not self.game:
+            self.fov = FieldOfView(self.game.get_walls(), self.game.get_dungeon_size(), FOG_RADIUS)
+            self.fov_game = self.game
+            self.fov.update(self.game.get_player().get_position())
+        return self.fov
+
+    def look(self):
+        '''
+        to update the sight of the player after it moved
+        :return: the (row, column) of the tiles revealed or hidden by the fog of war
+        '''
+        fov = self.field_of_view()
+        if fov is None:
+            return set()
+        return fov.update(self.game.get_player().get_position())
+
+    def set_fog(self, fog):
+        '''
+        to turn the fog of war on or off
+        :param fog: True to only show the tiles the player has seen
+        :return:
+        '''
+        self.fog = fog
+        self.map.fog = self.field_of_view()
+        self.map.redraw_board_grid(self.board)
+
+    def set_animated(self, animated):
+        '''
+        to turn the animated map on or off
+        :param animated: True to let the player glide between the tiles
+        :return:
+        '''
+        if animated != self.animated:
+            self.animated = animated
+            self.redraw()
+
+    def walk_to(self, position):
+        '''
+        to walk the player to a clicked tile along the shortest path, one move per frame
+        :param position: the (row, column) of the clicked tile
+        :return:
+        '''
+        if self.stop:
+            return
+        path = self.game.path_to(position)
+        if path is None:
+            return
+        self.walk_path = path
+        if not self.walking:
+            self.walking = True
+            self.master.after(WALK_INTERVAL, self.walk)
+
+    def walk(self):
+        '''
+        to play the next move of the walk to a clicked tile. the walk stops in front of a door without the key and
+        before a move that would use up the last move
+        :return:
+        '''
+        if self.stop or not self.walk_path or self.game.check_game_over():
+            self.walk_path = []
+            self.walking = False
+            return
+
+        direction = self.walk_path.pop(0)
+        entity = self.game.get_entity_in_direction(direction)
+        opens_door = isinstance(entity, Door) and self.game.has_key()
+        if isinstance(entity, Door) and not opens_door:
+            self.walk_path = []
+            messagebox.showinfo('Notice', "You don't have the key!")
+        elif self.game.get_player().moves_remaining() <= 1 and not opens_door \
+                and not isinstance(entity, MoveIncrease):
+            self.walk_path = []
+            messagebox.showinfo('Notice', "You don't have enough moves to walk any further!")
+        else:
+            self.step(direction)
+        self.master.after(WALK_INTERVAL, self.walk)
+
     def game_over(self):
         '''
         run after game over. show some information and open a new game
         :return:
         '''
         self.stop_game()
-        player_again = messagebox.askokcancel("You Lost!", "You lost the game.\n Would you like to play again")
+        if self.game.get_player().moves_remaining() > 0:
+            message = "You can no longer reach the nest in time."
+        else:
+            message = "You lost the game."
+        player_again = messagebox.askokcancel("You Lost!", message + "\n Would you like to play again")
         if player_again:
             self.new_game()
 
@@ -1223,6 +3756,8 @@ class GameApp:
         '''
         self.stop = True
         self.statusbar.state = False
+        self.broadcast([])
+        self.journal.discard()
 
     def win(self):
         '''
@@ -1230,6 +3765,10 @@ class GameApp:
         :return:
         '''
         self.stop_game()
+        if self.campaign is not None:
+            self.record()
+            self.finish_campaign_level()
+            return
         player_again = messagebox.askokcancel("You Won!", "You have finished the level with a score of 6."
                                                           "\n Would you like to play again")
         self.record()
@@ -1241,37 +3780,162 @@ class GameApp:
         to record the score and name of the winners. it would be record into a file
         :return:
         '''
-        try:
-            record_file = 'high_scores.txt'
+        score_name = simpledialog.askstring("Input",
+                                            f"You won in {self.statusbar.timer // 60}m "
+                                            f"{self.statusbar.timer % 60}s！ Enter your name:",parent=self.master)
+
+        while score_name == None or score_name == '':
             score_name = simpledialog.askstring("Input",
                                                 f"You won in {self.statusbar.timer // 60}m "
-                                                f"{self.statusbar.timer % 60}s！ Enter your name:",parent=self.master)
+                                                f"{self.statusbar.timer % 60}s！ Enter your name:",
+                                                parent=self.master)
 
-            while score_name == None or score_name == '':
-                score_name = simpledialog.askstring("Input",
-                                                    f"You won in {self.statusbar.timer // 60}m "
-                                                    f"{self.statusbar.timer % 60}s！ Enter your name:",
-                                                    parent=self.master)
+        # colons separate the fields of a record
+        level = self.game.get_dungeon_name().replace(':', '_')
+        clip = "%s:%s:%s\n" % (score_name, self.statusbar.timer, level)
 
-            clip = "%s:%s\n"%(score_name, self.statusbar.timer)
+        self.io.append(HIGH_SCORES_FILE, clip,
+                       errback=lambda e: messagebox.showinfo('Error', 'Sorry, record failed: %s' % e))
+        record = (score_name, self.statusbar.timer, level)
+        self.io.call(lambda: update_summary(HIGH_SCORES_SUMMARY_FILE, HIGH_SCORES_FILE, [record]),
+                     errback=lambda e: messagebox.showinfo('Error', 'Sorry, the high scores summary could not '
+                                                                    'be updated: %s' % e))
 
-            with open(record_file, 'a+') as file:
-                file.write(clip)
-        except Exception as e:
-            messagebox.showinfo('Error', 'Sorry, record Failed. There are some unknown errors')
+    def hint(self):
+        '''
+        to find the next move on the shortest way to the nest. the route is kept while the player follows it
+        :return: the position the player should move to, None if the nest cannot be reached
+        '''
+        if self.hints is None or self.hints.get_game() is not self.game:
+            self.hints = HintEngine(self.game)
+        direction = self.hints.hint()
+        return None if direction is None else self.game.new_position(direction)
 
-    def new_game(self):
+    def play_level(self, pack, level):
         '''
-        to open a new game
+        to open a level of a level pack. the level is loaded on the worker thread, as it may have to be compiled
+        :param pack: the opened LevelPack
+        :param level: the name or content hash of the level
         :return:
         '''
-        self.game = GameLogic()
-        self.stop = False
+        def loaded(game):
+            if self.level_pack is not None and self.level_pack is not pack:
+                self.level_pack.close()
+            self.level_pack = pack
+            self.start_game(game)
 
-        self.statusbar.timer = 0
-        self.redraw()
+        self.io.call(lambda: GameLogic.from_pack(pack, level), loaded,
+                     lambda e: messagebox.showinfo('Select Level', 'Sorry, the level could not be loaded: %s' % e))
 
-        self.gaming()
+    def start_campaign(self, levels, pack=None):
+        '''
+        to play levels one after the other. the next level is prefetched while one is played
+        :param levels: the level files, or the level IDs of pack, in order
+        :param pack: the opened LevelPack the levels are read from, None for level files
+        :return:
+        '''
+        campaign = Campaign(levels, pack)
+
+        def loaded(game):
+            self.start_game(game, campaign=campaign)
+            self.prefetch()
+
+        # the first level is loaded on the worker thread, as it may have to be compiled
+        self.io.call(lambda: campaign.load(0), loaded,
+                     lambda e: messagebox.showinfo('Campaign', 'Sorry, the campaign could not be started: %s' % e))
+
+    def prefetch(self):
+        '''
+        to load the next level of the campaign and render the sprites it needs on the worker thread,
+        so moving on to it does no parsing or image work
+        :return:
+        '''
+        campaign = self.campaign
+        if campaign is None or not campaign.has_next():
+            return
+        sprites = self.level_sprites()
+
+        def loaded(result):
+            prefetched, rendered = result
+            if campaign is self.campaign:
+                campaign.set_prefetched(prefetched)
+            SPRITES.add(rendered)
+
+        # a failed prefetch is not reported, the level is loaded again when it is reached
+        self.io.call(lambda: (campaign.prefetch(), SPRITES.render_missing(sprites)), loaded, lambda e: None)
+
+    def level_sprites(self):
+        '''
+        to list the sprites a level is drawn with at the current tile size and view
+        :return: the (image name, size, shade) of the sprites
+        '''
+        if self.task == TASK_ONE:
+            return []
+        sprites = [(image_name, self.tile_size, 1.0) for image_name in BOARD_SPRITES]
+        if self.fog:
+            sprites.append((FOG_SPRITE, self.tile_size, 1.0))
+            sprites.extend((image_name, self.tile_size, REMEMBERED_SHADE) for image_name in BOARD_SPRITES)
+        return sprites
+
+    def finish_campaign_level(self):
+        '''
+        to offer the next level of the campaign once a level is won
+        :return:
+        '''
+        campaign = self.campaign
+        if not campaign.has_next():
+            messagebox.showinfo("You Won!", "You have finished all %d levels of the campaign!" % len(campaign))
+            self.campaign = None
+            return
+        if not messagebox.askokcancel("You Won!", "You have finished level %d of %d."
+                                                  "\n Would you like to play the next level?"
+                                      % (campaign.get_index() + 1, len(campaign))):
+            self.campaign = None
+            return
+        def loaded(game):
+            self.start_game(game, campaign=campaign)
+            self.prefetch()
+
+        def failed(e):
+            messagebox.showinfo('Campaign', 'Sorry, the next level could not be loaded: %s' % e)
+            self.campaign = None
+
+        # a level that was not prefetched yet is loaded on the worker thread
+        self.io.call(campaign.advance, loaded, failed)
+
+    def start_game(self, game, timer=0, campaign=None):
+        '''
+        to replace the running game by another one
+        :param game: the GameLogic of the new game
+        :param timer: the start time of the timer
+        :param campaign: the Campaign the game is a level of, None to leave any campaign
+        :return:
+        '''
+        was_stopped = self.stop
+        self.campaign = campaign
+        self.game = game
+        self.stop = False
+        if self.map is not None and len(self.map.board_matrix) == game.get_dungeon_size():
+            # a level of the same size swaps into the widgets of the last one instead of rebuilding them
+            self.statusbar.reset(timer)
+            self.update_board()
+            self.map.fog = self.field_of_view()
+            self.map.redraw_board_grid(self.board)
+            self.broadcast()
+            self.autosave()
+        else:
+            self.statusbar.timer = timer
+            self.redraw()
+        if was_stopped:
+            self.gaming()
+
+    def new_game(self):
+        '''
+        to open a new game. the level is loaded on the worker thread, as it may have to be compiled
+        :return:
+        '''
+        self.io.call(GameLogic, self.start_game,
+                     lambda e: messagebox.showinfo('New Game', 'Sorry, the level could not be loaded: %s' % e))
 
     def update_status_bar(self):
         '''
@@ -1279,8 +3943,28 @@ class GameApp:
         :return:
         '''
         self.statusbar.update_step_frame(self.game.get_player().moves_remaining())
+        if self.statusbar.timer != self.broadcast_timer:
+            self.broadcast([])
         self.master.after(100, self.update_status_bar)
 
+    def broadcast(self, cells=None):
+        '''
+        to stream the game to the spectators. a move only sends the cells it changed
+        :param cells: the positions changed since the last broadcast, None to send the whole board
+        :return:
+        '''
+        if self.spectators is None:
+            return
+
+        self.broadcast_timer = self.statusbar.timer
+        moves = self.game.get_player().moves_remaining()
+        status = (WON if self.game.won() else 0) | (OVER if self.stop else 0)
+        if cells is None:
+            self.spectators.publish_keyframe(self.board, moves, self.broadcast_timer, status)
+        else:
+            changes = [(x, y, self.board[x][y]) for x, y in cells]
+            self.spectators.publish_delta(changes, moves, self.broadcast_timer, status)
+
     def check_reset(self):
         '''
         to check if open a new game
@@ -1291,6 +3975,49 @@ class GameApp:
             self.new_game()
         self.master.after(100, self.check_reset)
 
+    def set_tile_size(self, tile_size):
+        '''
+        to zoom the map to another of the prepared sprite sizes
+        :param tile_size: the width of a tile in pixels, one of SPRITE_SIZES
+        :return:
+        '''
+        if tile_size != self.tile_size:
+            self.tile_size = tile_size
+            self.map.set_tile_size(tile_size)
+
+    def zoom(self, step):
+        '''
+        to zoom in or out by one sprite size
+        :param step: 1 to zoom in, -1 to zoom out
+        :return:
+        '''
+        index = SPRITE_SIZES.index(self.tile_size) + step
+        if 0 <= index < len(SPRITE_SIZES):
+            self.set_tile_size(SPRITE_SIZES[index])
+
+    def fit_to_window(self):
+        '''
+        to zoom to the largest sprite size showing the whole map in the window
+        :return:
+        '''
+        width = self.master.winfo_width() - self.pad_frame.winfo_width()
+        height = self.master.winfo_height() - self.title_frame.winfo_height() - self.statusbar_frame.winfo_height()
+        self.set_tile_size(fit_sprite_size(min(width, height) // self.game.get_dungeon_size()))
+
+    def close(self):
+        '''
+        to finish pending writes and stop the background services after the window was closed
+        :return:
+        '''
+        if self.spectators is not None:
+            self.spectators.close()
+            self.spectators = None
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+        self.journal.close()
+        self.io.close()
+
     def redraw(self):
         '''
         to redraw the whole window
@@ -1305,24 +4032,155 @@ class GameApp:
         self.draw_board()
         self.draw_pad()
         self.draw_status_bar(tempTime)
+        self.broadcast()
+        self.autosave()
+
 
+# the tile sizes the map can be zoomed to, the sprites are scaled to all of them once per session
+SPRITE_SIZES = (10, 15, 20, 25, 30, 40, 50, 60, 75, 90)
+BOARD_SPRITES = ('empty', 'wall', 'key', 'door', 'moveIncrease', 'player')
+ENTITY_SPRITES = {WALL: 'wall', KEY: 'key', DOOR: 'door', MOVE_INCREASE: 'moveIncrease'}
+# the black tile covering the unexplored cells with the fog of war, it has no image file
+FOG_SPRITE = 'fog'
 
-def get_image(image_name, size=50):
+
+def open_sprite(image_name):
+    '''
+    to read an image file, without scaling it
+    :param image_name: the name of the image file
+    :return: a PIL image
+    '''
+    if image_name == FOG_SPRITE:
+        return Image.new('RGB', (1, 1), 'black')
+    try:
+        return Image.open("images/" + image_name + ".png")
+    except OSError:
+        return Image.open("images/" + image_name + ".gif")
+
+
+def shade_sprite(image, shade):
+    '''
+    to darken an image, keeping its transparency
+    :param image: a PIL image
+    :param shade: the brightness, between 0 for black and 1 for the original
+    :return: the darkened PIL image
+    '''
+    red, green, blue, alpha = image.convert('RGBA').split()
+    red, green, blue = (band.point(lambda value: int(value * shade)) for band in (red, green, blue))
+    return Image.merge('RGBA', (red, green, blue, alpha))
+
+
+def fit_sprite_size(size):
+    '''
+    to find the largest sprite size not larger than a size
+    :param size: the available size in pixels
+    :return: one of SPRITE_SIZES
+    '''
+    fitting = [sprite_size for sprite_size in SPRITE_SIZES if sprite_size <= size]
+    return fitting[-1] if fitting else SPRITE_SIZES[0]
+
+
+class SpriteCache:
+    '''
+    the scaled images used on the window. each image is scaled and converted once and then shared
+    '''
+    def __init__(self, sizes=SPRITE_SIZES):
+        '''
+
+        :param sizes: the sizes the board sprites are prepared at
+        '''
+        self.sizes = sizes
+        self.images = {}
+
+    def prepare(self):
+        '''
+        to scale the board sprites to every size at once, so zooming never resamples
+        :return:
+        '''
+        for image_name in BOARD_SPRITES:
+            if (image_name, self.sizes[0]) in self.images:
+                continue
+            source = open_sprite(image_name)
+            for size in self.sizes:
+                self.images[(image_name, size)] = ImageTk.PhotoImage(source.resize((size, size), Image.LANCZOS))
+
+    def get(self, image_name, size=50, shade=1.0):
+        '''
+        to get an image at a size, scaling it the first time
+        :param image_name: the name of the image file
+        :param size: the size showing on the window
+        :param shade: the brightness of the image, 1 for the original
+        :return: the cached image
+        '''
+        key = self.key(image_name, size, shade)
+        image = self.images.get(key)
+        if image is None:
+            image = self.images[key] = ImageTk.PhotoImage(self.render(image_name, size, shade))
+        return image
+
+    @staticmethod
+    def key(image_name, size=50, shade=1.0):
+        '''
+        to get the key of an image in the cache
+        :param image_name: the name of the image file
+        :param size: the size showing on the window
+        :param shade: the brightness of the image, 1 for the original
+        :return: the key
+        '''
+        return (image_name, size) if shade == 1.0 else (image_name, size, shade)
+
+    @staticmethod
+    def render(image_name, size=50, shade=1.0):
+        '''
+        to scale and shade an image. no Tk image is made, so it may run on a background thread
+        :param image_name: the name of the image file
+        :param size: the size showing on the window
+        :param shade: the brightness of the image, 1 for the original
+        :return: a PIL image
+        '''
+        source = open_sprite(image_name).resize((size, size), Image.LANCZOS)
+        if shade != 1.0:
+            source = shade_sprite(source, shade)
+        return source
+
+    def render_missing(self, sprites):
+        '''
+        to scale and shade the images that are not cached yet, e.g. on a background thread before they are needed
+        :param sprites: the (image name, size, shade) of the images
+        :return: the PIL images by key, to be passed to add on the Tk thread
+        '''
+        rendered = {}
+        for image_name, size, shade in sprites:
+            key = self.key(image_name, size, shade)
+            if key not in self.images and key not in rendered:
+                rendered[key] = self.render(image_name, size, shade)
+        return rendered
+
+    def add(self, rendered):
+        '''
+        to cache images rendered by render_missing. it must run on the Tk thread
+        :param rendered: the PIL images by key
+        :return:
+        '''
+        for key, source in rendered.items():
+            if key not in self.images:
+                self.images[key] = ImageTk.PhotoImage(source)
+
+
+SPRITES = SpriteCache()
+
+
+def get_image(image_name, size=50, shade=1.0):
     '''
     to reading the used image
     :param image_name: the name of the image file
     :param size: the size showing on the window
+    :param shade: the brightness of the image, 1 for the original
     :return: an image format could be used
     '''
     try:
-        try:
-            image = Image.open("images/" + image_name + ".png")
-        except:
-            image = Image.open("images/" + image_name + ".gif")
-        image = image.resize((size, size), Image.ANTIALIAS)
-        image = ImageTk.PhotoImage(image)
-        return image
-    except:
+        return SPRITES.get(image_name, size, shade)
+    except OSError:
         messagebox.showinfo('Error', 'You may miss some images')
 
 
@@ -1335,10 +4193,11 @@ def main():
     root.title('Key Cave Adventure Game')
     root.geometry("1000x800")
 
-    GameApp(root)
+    app = GameApp(root)
 
     root.update()
     root.mainloop()
+    app.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,308 @@
+"""Monte Carlo difficulty estimator for the move budgets of the levels.
+
+Plays many random (or greedy with random mistakes) games of a level on the
+headless logic and records, for every playout, the smallest starting budget
+that would have carried it to the door. Because the players never look at
+their budget, one batch of playouts gives the win rate for every budget at
+once: the difficulty curve. The recommended budget is the smallest one
+reaching a target win rate.
+
+Results are cached per level content hash in .difficulty_cache.json, so a
+re-run only plays the levels whose file changed.
+
+Run ``python difficulty.py game1.txt game2.txt --playouts 1000000``.
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import random
+
+from KeyCaveAdventureGame import (GameLogic, GAME_LEVELS, DIRECTIONS, KEY, DOOR, WALL, MoveIncrease,
+                                 distance_field)
+
+
+RANDOM = "random"
+GREEDY = "greedy"
+
+CACHE_FILE = ".difficulty_cache.json"
+
+# the playouts are split into this many seeded chunks whatever the number
+# of workers, so a seed gives the same curve on any machine
+CHUNKS = 64
+
+
+def content_hash(filename):
+    """Returns the SHA-1 of a level file's content."""
+    with open(filename, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def compile_level(game):
+    """Flattens a game into the plain tables the playouts run on.
+
+    Parameters:
+        game (GameLogic): A freshly loaded level.
+
+    Returns:
+        (dict): Picklable tables indexed by cell (row * size + col).
+    """
+    size = game.get_dungeon_size()
+    walls = game.get_walls()
+    information = game.get_game_information()
+
+    def cell_of(position):
+        return position[0] * size + position[1]
+
+    neighbours = []
+    for cell in range(size * size):
+        row, col = divmod(cell, size)
+        options = []
+        for dx, dy in DIRECTIONS.values():
+            x, y = row + dx, col + dy
+            if 0 <= x < size and 0 <= y < size and walls[x * size + y] != WALL:
+                options.append(x * size + y)
+        neighbours.append(tuple(options))
+
+    key = door = -1
+    bananas = {}
+    for position, entity in information.items():
+        if entity.get_id() == KEY and key < 0:
+            key = cell_of(position)
+        elif entity.get_id() == DOOR and door < 0:
+            door = cell_of(position)
+        elif isinstance(entity, MoveIncrease):
+            bananas[cell_of(position)] = entity.get_moves()
+
+    def distances(source):
+        if source < 0:
+            return [0] * (size * size)
+        field = distance_field(walls, size, divmod(source, size))
+        return [field.distance(divmod(cell, size)) or 0 for cell in range(size * size)]
+
+    return {
+        "neighbours": neighbours,
+        "start": cell_of(game.get_player().get_position()),
+        "has_key": game.has_key(),
+        "key": key,
+        "door": door,
+        "bananas": bananas,
+        "key_distances": distances(key),
+        "door_distances": distances(door),
+    }
+
+
+def run_playouts(level, count, seed, policy=RANDOM, epsilon=0.25, max_budget=100):
+    """Plays games and counts the smallest budget each of them needed.
+
+    After step t a game has budget - t + bonus_t moves left and is lost once
+    that reaches zero, unless the step reached the door. A playout that
+    wins at step T therefore needed max(t - bonus_t + 1) over t < T.
+    Playouts stop as soon as that exceeds max_budget.
+
+    Parameters:
+        level (dict): The tables returned by compile_level.
+        count (int): The number of playouts.
+        seed (int): The seed of the random generator.
+        policy (str): RANDOM, or GREEDY to walk towards the key and then the
+            door with a random step with probability epsilon.
+        epsilon (float): The mistake rate of the greedy policy.
+        max_budget (int): The largest budget of interest.
+
+    Returns:
+        (dict<int: int>): The number of wins per smallest budget.
+    """
+    rand = random.Random(seed).random
+    neighbours = level["neighbours"]
+    start, key, door = level["start"], level["key"], level["door"]
+    bananas = level["bananas"]
+    bits = {cell: 1 << index for index, cell in enumerate(bananas)}
+    key_distances, door_distances = level["key_distances"], level["door_distances"]
+    greedy = policy == GREEDY
+
+    wins = {}
+    for _ in range(count):
+        position = start
+        has_key = level["has_key"]
+        eaten = 0
+        bonus = 0
+        steps = 0
+        needed = 1
+
+        while needed <= max_budget:
+            options = neighbours[position]
+            if not options:
+                break
+            if greedy and rand() >= epsilon:
+                field = door_distances if has_key else key_distances
+                position = min(options, key=field.__getitem__)
+            else:
+                position = options[int(rand() * len(options))]
+            steps += 1
+
+            if position == door and has_key:
+                wins[needed] = wins.get(needed, 0) + 1
+                break
+            if position == key:
+                has_key = True
+            bit = bits.get(position)
+            if bit is not None and not eaten & bit:
+                eaten |= bit
+                bonus += bananas[position]
+            if steps - bonus + 1 > needed:
+                needed = steps - bonus + 1
+
+    return wins
+
+
+def difficulty_curve(wins, playouts, max_budget):
+    """Turns win counts into (budget, win probability) pairs.
+
+    Parameters:
+        wins (dict<int: int>): The wins per smallest budget.
+        playouts (int): The number of playouts played.
+        max_budget (int): The largest budget of the curve.
+
+    Returns:
+        (list<tuple<int, float>>): The win probability of every budget.
+    """
+    curve = []
+    total = 0
+    for budget in range(1, max_budget + 1):
+        total += wins.get(budget, 0)
+        curve.append((budget, total / playouts))
+    return curve
+
+
+def recommend_budget(curve, target):
+    """Returns the smallest budget reaching a target win rate, or None."""
+    for budget, probability in curve:
+        if probability >= target:
+            return budget
+    return None
+
+
+def estimate(filename, playouts, policy=RANDOM, epsilon=0.25, max_budget=None,
+             workers=None, cache=None, seed=0):
+    """Estimates the difficulty curve of a level.
+
+    Parameters:
+        filename (str): The level file.
+        playouts (int): The number of playouts, at least 1.
+        policy (str): RANDOM or GREEDY, see run_playouts.
+        epsilon (float): The mistake rate of the greedy policy.
+        max_budget (int): The largest budget of interest, by default three
+            times the shortest route.
+        workers (int): The number of worker processes, one per core by default.
+        cache (dict): Results of earlier runs by content hash, updated in place.
+        seed (int): The base seed of the playouts.
+
+    Returns:
+        (dict): The budget of the level, the shortest route, the number of
+            playouts and the difficulty curve.
+
+    Raises:
+        ValueError: If playouts is less than 1.
+    """
+    if playouts < 1:
+        raise ValueError("at least one playout is needed")
+    game = GameLogic(filename)
+    shortest = game.moves_needed()
+    if max_budget is None:
+        max_budget = 3 * shortest if shortest else 1
+
+    params = [policy, epsilon, max_budget, playouts, seed, CHUNKS]
+    digest = content_hash(filename)
+    if cache is not None and cache.get(digest, {}).get("params") == params:
+        wins = {int(budget): count for budget, count in cache[digest]["wins"].items()}
+    else:
+        wins = {}
+        if shortest is not None:
+            level = compile_level(game)
+            workers = workers or os.cpu_count() or 1
+            chunks = min(playouts, CHUNKS)
+            counts = [playouts // chunks + (i < playouts % chunks) for i in range(chunks)]
+            with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(run_playouts, level, count, seed * CHUNKS + i,
+                                       policy, epsilon, max_budget)
+                           for i, count in enumerate(counts)]
+                for future in futures:
+                    for budget, count in future.result().items():
+                        wins[budget] = wins.get(budget, 0) + count
+        if cache is not None:
+            cache[digest] = {"params": params, "wins": wins}
+
+    return {
+        "budget": GAME_LEVELS.get(filename, game.level),
+        "shortest": shortest,
+        "playouts": playouts,
+        "curve": difficulty_curve(wins, playouts, max_budget),
+    }
+
+
+def load_cache(path=CACHE_FILE):
+    """ """
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_FILE):
+    """Writes the cache atomically."""
+    with open(path + ".tmp", 'w') as file:
+        json.dump(cache, file)
+    os.replace(path + ".tmp", path)
+
+
+def positive_int(text):
+    """Parses a command line count that must be at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"{text} is not a positive number")
+    return value
+
+
+def main():
+    '''
+    to estimate the difficulty of levels and recommend their budgets
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("levels", nargs="*", default=list(GAME_LEVELS))
+    parser.add_argument("--playouts", type=positive_int, default=100000)
+    parser.add_argument("--policy", choices=[RANDOM, GREEDY], default=GREEDY)
+    parser.add_argument("--epsilon", type=float, default=0.25, help="mistake rate of the greedy policy")
+    parser.add_argument("--target", type=float, default=0.5, help="win rate to recommend a budget for")
+    parser.add_argument("--max-budget", type=int, default=None)
+    parser.add_argument("--workers", type=positive_int, default=None)
+    parser.add_argument("--curve", action="store_true", help="print the whole difficulty curve")
+    args = parser.parse_args()
+
+    cache = load_cache()
+    for filename in args.levels:
+        result = estimate(filename, args.playouts, args.policy, args.epsilon, args.max_budget,
+                          args.workers, cache)
+        curve = result["curve"]
+        budget = result["budget"]
+        if budget <= 0:
+            wins = f"{0:.1%}"
+        elif budget <= len(curve):
+            wins = f"{curve[budget - 1][1]:.1%}"
+        else:
+            # the curve stops short of the budget, and more moves never win less
+            wins = f"at least {curve[-1][1]:.1%}"
+        recommended = recommend_budget(curve, args.target)
+
+        print(f"{filename}: shortest route {result['shortest']}, budget {budget} "
+              f"wins {wins}, recommended for {args.target:.0%}: {recommended}")
+        if args.curve:
+            for moves, probability in curve:
+                print(f"  {moves:4d} {probability:8.4%}")
+    save_cache(cache)
+
+
+if __name__ == '__main__':
+    main()
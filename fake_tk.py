@@ -0,0 +1,415 @@
+"""Headless stand-in for tkinter, and a benchmark of the views built on it.
+
+install() replaces tkinter, its dialogs and PIL.ImageTk.PhotoImage by fakes
+that keep no window but record every call made on them: widget creations,
+config, grid, pack, bind, canvas items, Tk image constructions and so on.
+after callbacks are kept on a virtual clock that advance() runs, so a
+benchmark decides exactly which timers fire and nothing waits for real time.
+Dialogs answer with the values in ANSWERS.
+
+Run ``python fake_tk.py`` to play every level in every task with the hint
+route through GameApp and report, per task, the time and the widget
+operations and image constructions of a frame (a move plus the timers due in
+the next 100 ms) and of a level start. It must be run from the directory of
+the game, where its images and levels are.
+"""
+import argparse
+import collections
+import heapq
+import itertools
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import types
+
+
+# the answers of the dialogs, by the name of the dialog function
+ANSWERS = {
+    "askokcancel": False,
+    "askyesno": False,
+    "askstring": "bench",
+    "askinteger": 1,
+    "asksaveasfilename": "",
+    "askopenfilename": "",
+}
+
+# milliseconds of virtual time run after every move of the benchmark, the period of the game timers
+FRAME = 100
+
+
+class CallLog:
+    """Counts the calls made on the fake widgets and images."""
+
+    def __init__(self):
+        """ """
+        self.calls = collections.Counter()
+        self.dialogs = []
+
+    def record(self, kind, name):
+        """Counts a call.
+
+        Parameters:
+            kind (str): The class of the widget, e.g. "Label".
+            name (str): The method called, e.g. "config".
+        """
+        self.calls[(kind, name)] += 1
+
+    def reset(self):
+        """Forgets the calls counted so far."""
+        self.calls.clear()
+
+    def total(self, name=None):
+        """Returns the number of calls, or only of the calls of a method."""
+        return sum(count for (kind, called), count in self.calls.items() if name is None or called == name)
+
+    def by_method(self):
+        """Returns the number of calls by method, the most frequent first."""
+        methods = collections.Counter()
+        for (kind, name), count in self.calls.items():
+            methods[name] += count
+        return methods.most_common()
+
+
+LOG = CallLog()
+
+
+class Clock:
+    """The virtual time the after callbacks of all fake widgets are run on."""
+
+    def __init__(self):
+        """ """
+        self.now = 0
+        self._timers = []
+        self._cancelled = set()
+        self._ids = itertools.count(1)
+
+    def schedule(self, delay, callback, args):
+        """Queues a callback, returns its id for after_cancel."""
+        timer_id = next(self._ids)
+        heapq.heappush(self._timers, (self.now + max(0, int(delay)), timer_id, callback, args))
+        return "after#%d" % timer_id
+
+    def cancel(self, timer_id):
+        """ """
+        if isinstance(timer_id, str) and timer_id.startswith("after#"):
+            self._cancelled.add(int(timer_id[len("after#"):]))
+
+    def advance(self, milliseconds):
+        """Runs every callback due within the next milliseconds, in time order.
+
+        Callbacks scheduled by the callbacks run too if they are due in time.
+
+        Returns:
+            (int): The number of callbacks run.
+        """
+        end = self.now + milliseconds
+        ran = 0
+        while self._timers and self._timers[0][0] <= end:
+            due, timer_id, callback, args = heapq.heappop(self._timers)
+            self.now = due
+            if timer_id in self._cancelled:
+                self._cancelled.discard(timer_id)
+                continue
+            callback(*args)
+            ran += 1
+        self.now = end
+        return ran
+
+    def pending(self):
+        """ """
+        return len(self._timers) - len(self._cancelled)
+
+    def seconds(self):
+        """Returns the virtual time in seconds, a stand-in for time.perf_counter."""
+        return self.now / 1000
+
+
+CLOCK = Clock()
+
+
+class Widget:
+    """A fake of every tkinter widget: it accepts any call and records it."""
+
+    _width = 1000
+    _height = 800
+
+    def __init__(self, master=None, *args, **kwargs):
+        """ """
+        self.master = master
+        self.options = dict(kwargs)
+        self.items = {}
+        self._item_ids = itertools.count(1)
+        LOG.record(type(self).__name__, "__init__")
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            LOG.record(type(self).__name__, name)
+        return call
+
+    def config(self, **kwargs):
+        """ """
+        LOG.record(type(self).__name__, "config")
+        self.options.update(kwargs)
+
+    configure = config
+
+    def cget(self, option):
+        """ """
+        return self.options.get(option)
+
+    def after(self, delay, callback=None, *args):
+        """ """
+        LOG.record(type(self).__name__, "after")
+        if callback is None:
+            return None
+        return CLOCK.schedule(delay, callback, args)
+
+    def after_idle(self, callback, *args):
+        """ """
+        return self.after(0, callback, *args)
+
+    def after_cancel(self, timer_id):
+        """ """
+        LOG.record(type(self).__name__, "after_cancel")
+        CLOCK.cancel(timer_id)
+
+    def winfo_width(self):
+        """ """
+        return self._width
+
+    def winfo_height(self):
+        """ """
+        return self._height
+
+    def _create(self, kind, *args, **kwargs):
+        """Records a canvas item and returns its id."""
+        LOG.record(type(self).__name__, "create_" + kind)
+        item = next(self._item_ids)
+        self.items[item] = dict(kwargs)
+        return item
+
+    def create_image(self, *args, **kwargs):
+        """ """
+        return self._create("image", *args, **kwargs)
+
+    def create_rectangle(self, *args, **kwargs):
+        """ """
+        return self._create("rectangle", *args, **kwargs)
+
+    def create_text(self, *args, **kwargs):
+        """ """
+        return self._create("text", *args, **kwargs)
+
+    def create_line(self, *args, **kwargs):
+        """ """
+        return self._create("line", *args, **kwargs)
+
+    def itemconfigure(self, item, **kwargs):
+        """ """
+        LOG.record(type(self).__name__, "itemconfigure")
+        self.items.setdefault(item, {}).update(kwargs)
+
+    itemconfig = itemconfigure
+
+    def curselection(self):
+        """ """
+        return ()
+
+
+class Variable:
+    """A fake of the tkinter variables."""
+
+    def __init__(self, master=None, value=None, name=None):
+        """ """
+        self._value = value
+
+    def get(self):
+        """ """
+        return self._value
+
+    def set(self, value):
+        """ """
+        self._value = value
+
+
+class PhotoImage:
+    """A fake Tk image, only its construction and size are kept."""
+
+    def __init__(self, image=None, *args, **kwargs):
+        """ """
+        LOG.record("PhotoImage", "__init__")
+        self._size = getattr(image, "size", (kwargs.get("width", 0), kwargs.get("height", 0)))
+
+    def width(self):
+        """ """
+        return self._size[0]
+
+    def height(self):
+        """ """
+        return self._size[1]
+
+
+def _dialog(name):
+    """Makes a fake dialog function answering from ANSWERS."""
+    def dialog(*args, **kwargs):
+        LOG.dialogs.append((name, args))
+        return ANSWERS.get(name)
+    dialog.__name__ = name
+    return dialog
+
+
+def install():
+    """Replaces tkinter and PIL.ImageTk.PhotoImage by the fakes.
+
+    It must be called before the game is imported.
+
+    Returns:
+        (module): The fake tkinter module.
+    """
+    tk = types.ModuleType("tkinter")
+    tk.Misc = tk.Wm = Widget
+    for name in ("Tk", "Toplevel", "Frame", "Label", "Button", "Canvas", "Menu", "Listbox", "Scrollbar",
+                 "Checkbutton", "Radiobutton", "Entry", "Text", "Scale", "Spinbox", "LabelFrame"):
+        setattr(tk, name, type(name, (Widget,), {}))
+    for name in ("StringVar", "IntVar", "DoubleVar", "BooleanVar"):
+        setattr(tk, name, type(name, (Variable,), {}))
+    tk.PhotoImage = PhotoImage
+    tk.TclError = type("TclError", (Exception,), {})
+    for name in ("TOP", "BOTTOM", "LEFT", "RIGHT", "BOTH", "X", "Y", "END", "NW", "N", "NE", "W", "E",
+                 "SW", "S", "SE", "CENTER", "NSEW", "HORIZONTAL", "VERTICAL", "DISABLED", "NORMAL"):
+        setattr(tk, name, name.lower())
+
+    dialogs = {
+        "messagebox": ("showinfo", "showwarning", "showerror", "askokcancel", "askyesno", "askquestion"),
+        "simpledialog": ("askstring", "askinteger", "askfloat"),
+        "filedialog": ("asksaveasfilename", "askopenfilename", "askdirectory"),
+    }
+    for module_name, functions in dialogs.items():
+        module = types.ModuleType("tkinter." + module_name)
+        for function in functions:
+            setattr(module, function, _dialog(function))
+        setattr(tk, module_name, module)
+        sys.modules["tkinter." + module_name] = module
+    sys.modules["tkinter"] = tk
+
+    from PIL import ImageTk
+    ImageTk.PhotoImage = PhotoImage
+    return tk
+
+
+class FrameStats:
+    """The cost of the frames of one kind."""
+
+    def __init__(self):
+        """ """
+        self.times = []
+        self.operations = []
+        self.images = []
+
+    def add(self, seconds, operations, images):
+        """ """
+        self.times.append(seconds)
+        self.operations.append(operations)
+        self.images.append(images)
+
+    def row(self, label):
+        """Formats the mean and 95th percentile time and the operations of the frames."""
+        times = sorted(self.times)
+        p95 = times[min(len(times) - 1, int(0.95 * len(times)))]
+        return "%-18s %6d %9.3f %9.3f %10.1f %8.2f" % (label, len(times), 1000 * statistics.mean(times),
+                                                       1000 * p95, statistics.mean(self.operations),
+                                                       statistics.mean(self.images))
+
+
+def benchmark(tasks=None, levels=None, fog=False, animated=False, max_moves=200):
+    '''
+    to play every level in every task along the hint route through GameApp and measure the frames
+    :param tasks: the tasks to play, all by default
+    :param levels: the level files to play, the levels of the game by default
+    :param fog: True to play with the fog of war
+    :param animated: True to play on the animated map, whose glides run on the virtual clock
+    :param max_moves: the most moves played of a level
+    :return: the FrameStats of the level starts and of the moves by task, and the most frequent operations
+    '''
+    tk = install()
+    import KeyCaveAdventureGame as game
+
+    workdir = tempfile.mkdtemp(prefix="keycave-bench-")
+    game.AUTOSAVE_DIR = os.path.join(workdir, "autosave")
+    game.HIGH_SCORES_FILE = os.path.join(workdir, "high_scores.txt")
+    game.HIGH_SCORES_SUMMARY_FILE = os.path.join(workdir, "high_scores_summary.json")
+
+    tasks = tasks or (game.TASK_ONE, game.TASK_TWO, game.MASTERS)
+    levels = levels or list(game.GAME_LEVELS)
+    app = game.GameApp(tk.Tk())
+    if fog:
+        app.set_fog(True)
+    if animated:
+        app.clock = CLOCK.seconds
+        app.set_animated(True)
+    CLOCK.advance(FRAME)
+
+    results = {}
+    operations = collections.Counter()
+    for task in tasks:
+        starts, moves = results[task] = (FrameStats(), FrameStats())
+        for level in levels:
+            LOG.reset()
+            start = time.perf_counter()
+            app.task = task
+            app.start_game(game.GameLogic(level))
+            CLOCK.advance(FRAME)
+            starts.add(time.perf_counter() - start, LOG.total(), LOG.calls[("PhotoImage", "__init__")])
+
+            hints = game.HintEngine(app.game)
+            for _ in range(max_moves):
+                if app.stop:
+                    break
+                direction = hints.hint()
+                if direction is None:
+                    break
+                LOG.reset()
+                start = time.perf_counter()
+                app.pad.command = direction
+                app.pad.isCommand = True
+                CLOCK.advance(FRAME)
+                moves.add(time.perf_counter() - start, LOG.total(), LOG.calls[("PhotoImage", "__init__")])
+                for method, count in LOG.by_method():
+                    operations[method] += count
+    app.close()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results, operations.most_common(8)
+
+
+def main():
+    '''
+    to run the view benchmark and print its report
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description="Benchmark of the Tk views on a headless fake of tkinter.")
+    parser.add_argument("levels", nargs="*", help="level files to play, the levels of the game by default")
+    parser.add_argument("--fog", action="store_true", help="play with the fog of war")
+    parser.add_argument("--animated", action="store_true", help="play on the animated map")
+    parser.add_argument("--max-moves", type=int, default=200, help="most moves played of a level")
+    args = parser.parse_args()
+
+    results, operations = benchmark(levels=args.levels, fog=args.fog, animated=args.animated,
+                                    max_moves=args.max_moves)
+    names = {1: "TASK ONE", 2: "TASK TWO", 3: "MASTERS"}
+    print("%-18s %6s %9s %9s %10s %8s" % ("frame", "count", "mean ms", "p95 ms", "widget ops", "images"))
+    for task, (starts, moves) in results.items():
+        print(starts.row("%s start" % names.get(task, task)))
+        if moves.times:
+            print(moves.row("%s move" % names.get(task, task)))
+    print("\nmost frequent operations of the moves: " +
+          ", ".join("%s %d" % (method, count) for method, count in operations))
+
+
+if __name__ == '__main__':
+    main()
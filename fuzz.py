@@ -0,0 +1,696 @@
+"""Playout fuzzer for the headless logic and the level loader.
+
+Generates random levels, well-formed as well as mutated and malformed ones
+(several keys or doors, no key, no door, ragged rows, odd footers), and
+random move sequences, and plays every case twice: once a step at a time
+with play_move, checking the moves, inventory and win of every step, and
+once in chunks with apply_moves. The two games must agree on the events and
+states at every chunk, their hashes must survive to_state and from_state,
+undoing with restore must give back earlier states, and on small levels a
+game declared lost must really be lost. A level text must either load or be
+rejected with ValueError.
+
+Each failure is minimised to a small level and move sequence that still
+fails the same way and written to the output directory, where
+``load_game`` reads the level back.
+
+Run ``python fuzz.py --seconds 60 --workers 4``.
+"""
+import argparse
+import concurrent.futures
+import io
+import os
+import random
+import time
+import traceback
+
+from KeyCaveAdventureGame import (GameLogic, GAME_LEVELS, DIRECTIONS, PLAYER, KEY, DOOR, WALL, MOVE_INCREASE,
+                                  SPACE, Key, Door, MoveIncrease, parse_game, STEPPED, BLOCKED, PICKED_KEY,
+                                  PICKED_BONUS, LOCKED_DOOR, OPENED_DOOR, PLAYING, STOPPED, GAME_WON, GAME_LOST,
+                                  PARSER_VERSION, compile_level)
+from levelcache import CompiledLevel
+
+
+# the name of the fuzzed levels, which must not be one of GAME_LEVELS
+LEVEL_NAME = "fuzz"
+
+# the events apply_moves is asked to stop on, one set per chunk
+STOP_SETS = ((), (), (PICKED_KEY,), (PICKED_BONUS,), (LOCKED_DOOR, BLOCKED), (STEPPED,))
+
+# the chance of keeping the state before a step to undo to at the end, and the undos checked per case
+SNAPSHOT_RATE = 0.05
+UNDOS = 3
+
+# losses are checked by an exhaustive search on levels this wide or smaller, with at most this many states
+SEARCHED_SIZE = 6
+SEARCH_LIMIT = 10000
+
+# every level is played by this many cases, each at most MOVES long
+PLAYS_PER_LEVEL = 16
+MOVES = 1000
+
+# the longest chunk given to apply_moves at once, a few chunks are kept short to stop often
+CHUNK = 256
+
+# one case in this many is also played a step at a time with play_move, see run_case
+STEPWISE_EVERY = 16
+
+# seconds spent minimising one failure
+MINIMISE_TIME = 20
+
+
+class InvariantError(AssertionError):
+    """An invariant of the game that a case broke."""
+
+    def __init__(self, check, detail=""):
+        """
+        Parameters:
+            check (str): What was checked, the same for every failure of the check.
+            detail (str): What went wrong this time.
+        """
+        super().__init__(f"{check}: {detail}" if detail else check)
+        self.check = check
+
+
+def check(condition, name, detail=""):
+    """Raises InvariantError if condition is false."""
+    if not condition:
+        raise InvariantError(name, detail)
+
+
+def seed_levels():
+    """Returns the texts of the levels of the game found in the working directory."""
+    texts = []
+    for filename in GAME_LEVELS:
+        try:
+            with open(filename) as file:
+                texts.append(file.read())
+        except OSError:
+            pass
+    return texts
+
+
+def random_layout(rng):
+    """Returns the rows of a random square dungeon.
+
+    Most dungeons have a wall all around like the levels of the game, the
+    others only on their left and right edge, so the Player can walk into
+    the top and bottom edge of the board.
+    """
+    size = rng.randint(2, 12)
+    walls = rng.random() * 0.4
+    bordered = rng.random() < 0.7
+    rows = []
+    for row in range(size):
+        line = []
+        for col in range(size):
+            edge = col in (0, size - 1) or (bordered and row in (0, size - 1))
+            line.append(WALL if edge or rng.random() < walls else SPACE)
+        rows.append(line)
+
+    inner = [(row, col) for row in range(size) for col in range(1, size - 1)
+             if not bordered or 0 < row < size - 1]
+    rng.shuffle(inner)
+    tiles = [PLAYER] if rng.random() < 0.97 else []
+    tiles += [KEY] * rng.choice((0, 1, 1, 1, 1, 2, 3))
+    tiles += [DOOR] * rng.choice((0, 1, 1, 1, 1, 2))
+    tiles += [MOVE_INCREASE] * rng.randint(0, 6)
+    if rng.random() < 0.05:
+        tiles.append(PLAYER)
+    for (row, col), tile in zip(inner, tiles):
+        rows[row][col] = tile
+    return ["".join(row) for row in rows]
+
+
+def random_footer(rng, size):
+    """Returns the lines below a dungeon, mostly a move budget."""
+    budget = rng.choice((rng.randint(-1, 3), rng.randint(1, 4 * size), rng.randint(1, size * size),
+                         rng.randint(size * size, 20 * size * size), rng.randint(size * size, 20 * size * size)))
+    kind = rng.random()
+    if kind < 0.8:
+        return [str(budget)]
+    if kind < 0.85:
+        return []
+    if kind < 0.9:
+        return [str(budget), str(rng.randint(0, 9))]
+    if kind < 0.95:
+        return [" %d " % budget]
+    return [rng.choice(("", "x", "1.5", "--1", str(budget) + "a"))]
+
+
+def mutate(text, rng):
+    """Returns a level text with a few random changes, some of which break it."""
+    lines = text.splitlines()
+    for _ in range(rng.randint(1, 4)):
+        if not lines:
+            break
+        kind = rng.random()
+        index = rng.randrange(len(lines))
+        line = lines[index]
+        if kind < 0.6 and line:
+            col = rng.randrange(len(line))
+            lines[index] = line[:col] + rng.choice(WALL + PLAYER + KEY + DOOR + MOVE_INCREASE + SPACE + "x") + line[col + 1:]
+        elif kind < 0.7:
+            del lines[index]
+        elif kind < 0.8:
+            lines.insert(index, line)
+        elif kind < 0.9 and line:
+            lines[index] = line[:-1]
+        else:
+            lines[index] = line + rng.choice((WALL, SPACE))
+    newline = "\r\n" if rng.random() < 0.1 else "\n"
+    return newline.join(lines) + (newline if rng.random() < 0.8 else "")
+
+
+def random_level(rng, seeds):
+    """Returns the text of a random level, well-formed or not."""
+    if seeds and rng.random() < 0.2:
+        return mutate(rng.choice(seeds), rng)
+    rows = random_layout(rng)
+    text = "\n".join(rows + random_footer(rng, len(rows))) + "\n"
+    if rng.random() < 0.1:
+        text = mutate(text, rng)
+    return text
+
+
+def shortest_route(text):
+    """Returns the directions of the shortest way to a key and then a door of a level.
+
+    Returns:
+        (str): The directions, as far as the route goes, empty if the level is broken.
+    """
+    route = []
+    # the level may be broken, finding its failures is left to run_case
+    try:
+        game = GameLogic(LEVEL_NAME, parse_game(io.StringIO(text)))
+        for target in game.way_out() or ():
+            path = game.path_to(target) if target is not None else None
+            if path:
+                game.apply_moves("".join(path))
+                route += path
+    except Exception:
+        pass
+    return "".join(route)
+
+
+def random_walk(rng, runs):
+    """Returns random directions in runs of one to three steps, so walks get around instead of shuffling in place."""
+    return "".join(rng.choices([direction * length for direction in DIRECTIONS for length in (1, 2, 3)], k=runs))
+
+
+def random_moves(rng, route, walk):
+    """Returns random directions, sometimes along a route with a few random steps mixed in.
+
+    A random walk rarely wins, so a third of the sequences follow the
+    shortest way out first.
+
+    Parameters:
+        route (str): The shortest way out of the level.
+        walk (str): A long random walk, a piece of which is taken.
+    """
+    moves = list(route) if rng.random() < 0.35 else []
+    for _ in range(rng.randint(0, 3) if moves else 0):
+        moves.insert(rng.randint(0, len(moves)), rng.choice(list(DIRECTIONS)))
+    start = rng.randrange(len(walk))
+    return "".join(moves) + walk[start:start + rng.randint(0, MOVES)]
+
+
+def play_step(game, direction):
+    """Plays a move with play_move and checks what it did.
+
+    Returns:
+        (str): The event of the step, as apply_moves reports it.
+    """
+    player = game.get_player()
+    position = player.get_position()
+    moves = player.moves_remaining()
+    keys = player.get_inventory()[KEY]
+    target = game.new_position(direction)
+    entity = game.get_entity(target)
+    size = game.get_dungeon_size()
+
+    if not game.play_move(direction):
+        check(player.get_position() == position and player.moves_remaining() == moves,
+              "a blocked move changed the game")
+        check((entity is not None and not entity.can_collide())
+              or not (0 <= target[0] < size and 0 <= target[1] < size), "a move was blocked by nothing")
+        return BLOCKED
+
+    check(player.get_position() == target, "the Player moved to the wrong cell", f"{position} {direction}")
+    check(entity is None or entity.can_collide(), "the Player walked into a wall")
+    bonus = entity.get_moves() if isinstance(entity, MoveIncrease) else 0
+    check(player.moves_remaining() == moves - 1 + bonus, "a step cost the wrong number of moves",
+          f"{moves} -> {player.moves_remaining()}")
+    if isinstance(entity, (Key, MoveIncrease)):
+        check(game.get_entity(target) is None, "a picked item was left on the board")
+    check(player.get_inventory()[KEY] == keys + isinstance(entity, Key), "the keys held are wrong",
+          f"{keys} -> {player.get_inventory()[KEY]}")
+    won = isinstance(entity, Door) and game.has_key()
+    check(game.won() == won, "the game was won without opening the door with the key")
+
+    if isinstance(entity, Door):
+        return OPENED_DOOR if won else LOCKED_DOOR
+    if isinstance(entity, Key):
+        return PICKED_KEY
+    return PICKED_BONUS if bonus else STEPPED
+
+
+def check_state(game):
+    """Checks the bookkeeping of a game and that its state survives to_state and from_state."""
+    check(game.get_bonus_moves() == game.count_bonus_moves(), "the bonus moves are out of date")
+    state = game.to_state()
+    try:
+        restored = GameLogic.from_state(state)
+    except ValueError as e:
+        raise InvariantError("the state does not survive to_state and from_state", str(e))
+    check(restored.to_state() == state, "the state does not survive to_state and from_state")
+
+
+def compare(game, twin):
+    """Checks that the games played with play_move and apply_moves are in the same state."""
+    state = game.to_state()
+    check(state == twin.to_state(), "apply_moves and play_move disagree", f"{state} {twin.to_state()}")
+    check_state(game)
+    check(twin.get_bonus_moves() == twin.count_bonus_moves(), "the bonus moves are out of date")
+
+
+def can_win(game):
+    """Searches every way the game can go on for one that wins.
+
+    Returns:
+        (bool): True if the game can be won, None if the search gave up.
+    """
+    size = game.get_dungeon_size()
+    information = game.get_game_information()
+    bananas = {position: bit for bit, position in enumerate(information.positions(MOVE_INCREASE))}
+    keys = set(information.positions(KEY))
+    doors = set(information.positions(DOOR))
+    bonus = MoveIncrease().get_moves()
+    player = game.get_player()
+
+    start = (player.get_position(), game.has_key(), 0, player.moves_remaining())
+    seen = {start}
+    frontier = [start]
+    while frontier:
+        next_frontier = []
+        for position, has_key, eaten, moves in frontier:
+            for dx, dy in DIRECTIONS.values():
+                target = (position[0] + dx, position[1] + dy)
+                if not (0 <= target[0] < size and 0 <= target[1] < size):
+                    continue
+                entity = information.get(target)
+                if entity is not None and not entity.can_collide():
+                    continue
+                left = moves - 1
+                got_key = has_key or target in keys
+                ate = eaten
+                bit = bananas.get(target)
+                if bit is not None and not eaten & (1 << bit):
+                    ate |= 1 << bit
+                    left += bonus
+                if target in doors and got_key:
+                    return True
+                if left <= 0:
+                    continue
+                state = (target, got_key, ate, left)
+                if state not in seen:
+                    seen.add(state)
+                    next_frontier.append(state)
+        if len(seen) > SEARCH_LIMIT:
+            return None
+        frontier = next_frontier
+    return False
+
+
+def check_chunk(game, chunk, stop_on, outcome, events, before):
+    """Checks what apply_moves reported against the game it played.
+
+    Parameters:
+        game (GameLogic): The game after the chunk.
+        chunk (str): The directions given to apply_moves.
+        stop_on (tuple<str>): The events it was asked to stop on.
+        outcome (str): How it said play ended.
+        events (str): The events it reported.
+        before (tuple): The position, moves left and keys held of the game before the chunk.
+    """
+    position, moves, keys = before
+    player = game.get_player()
+    check(len(events) == len(chunk) if outcome == PLAYING else len(events) <= len(chunk),
+          "apply_moves stopped early or played too far", f"{outcome} {chunk!r} {events!r}")
+    if outcome == STOPPED:
+        check(events[-1:] in stop_on, "apply_moves stopped on an event it was not asked to stop on")
+    check(game.won() == (outcome == GAME_WON) and (outcome != GAME_WON or events[-1:] == OPENED_DOOR),
+          "apply_moves reported the wrong win")
+    over = not game.won() and game.check_game_over()
+    check(over == (outcome == GAME_LOST), "apply_moves reported the wrong game over", outcome)
+
+    walked = len(events) - events.count(BLOCKED)
+    bonus = MoveIncrease().get_moves()
+    check(player.moves_remaining() == moves - walked + bonus * events.count(PICKED_BONUS),
+          "apply_moves cost the wrong number of moves", f"{moves} -> {player.moves_remaining()} {events!r}")
+    check(player.get_inventory()[KEY] == keys + events.count(PICKED_KEY), "apply_moves picked the keys wrongly",
+          events)
+
+    row, col = position
+    for direction, event in zip(chunk, events):
+        if event != BLOCKED:
+            dx, dy = DIRECTIONS[direction]
+            row += dx
+            col += dy
+    check(player.get_position() == (row, col), "apply_moves moved the Player to the wrong cell",
+          f"{position} {chunk!r} {events!r}")
+
+
+def load_case(text, slot=0):
+    """Returns a game of a level in its starting state.
+
+    The game of the last cases played on the same level is reused: restore
+    puts it back to the start, which is much cheaper than loading it again
+    and checks restore on every case. The second game is loaded from the
+    compiled level of the text, so comparing the two checks the level cache.
+
+    Parameters:
+        text (str): The level file.
+        slot (int): Which of the games of the level, for cases needing two.
+
+    Raises:
+        ValueError: If the level is rejected.
+    """
+    loaded = _LOADED.get((text, slot))
+    if loaded is None:
+        if len(_LOADED) >= 4:
+            _LOADED.clear()
+        if slot:
+            game = GameLogic(LEVEL_NAME, CompiledLevel(compile_level(text), PARSER_VERSION))
+        else:
+            game = GameLogic(LEVEL_NAME, parse_game(io.StringIO(text)))
+        player = game.get_player()
+        _LOADED[(text, slot)] = (game, player.get_position(), game.get_game_information().copy(),
+                                 player.moves_remaining(), game.get_hash())
+        return game
+    game, position, information, moves, state_hash = loaded
+    game.restore(position, information.copy(), moves)
+    game.set_win(False)
+    check(game.get_hash() == state_hash, "restore did not undo the moves")
+    return game
+
+
+# the games of the levels played last by load_case, with their starting state
+_LOADED = {}
+
+
+def run_case(text, moves, seed, stepwise=True):
+    """Plays a case with apply_moves and checks the invariants.
+
+    Parameters:
+        text (str): The level file.
+        moves (str): The directions to play.
+        seed (int): The seed of the chunks, stop events and snapshots.
+        stepwise (bool): True to also play the case a step at a time with
+            play_move and compare the games after every chunk. This is
+            thorough but costs most of the time of a case.
+
+    Returns:
+        (int): The steps played, None if the level was rejected.
+
+    Raises:
+        InvariantError: If an invariant does not hold. Any other exception
+            is a failure too, except ValueError while loading.
+    """
+    try:
+        twin = load_case(text)
+    except ValueError:
+        return None
+    game = load_case(text, 1) if stepwise else None
+    rng = random.Random(seed)
+    if stepwise:
+        compare(game, twin)
+        state = twin.to_state()
+        try:
+            twin.apply_moves("WX")
+        except ValueError:
+            check(twin.to_state() == state, "a rejected move sequence changed the game")
+        else:
+            raise InvariantError("apply_moves took a character that is not a direction")
+
+    snapshots = []
+    steps = 0
+    index = 0
+    outcome = PLAYING
+    while outcome in (PLAYING, STOPPED) and (index < len(moves) or not steps):
+        chunk = moves[index:index + rng.choice((rng.randint(1, 8), rng.randint(1, CHUNK)))]
+        stop_on = rng.choice(STOP_SETS)
+        player = twin.get_player()
+        before = (player.get_position(), player.moves_remaining(), player.get_inventory()[KEY])
+        twin_outcome, twin_events = twin.apply_moves(chunk, stop_on)
+        check_chunk(twin, chunk, stop_on, twin_outcome, twin_events, before)
+        outcome = twin_outcome
+        steps += len(twin_events)
+        index += len(twin_events) if outcome == STOPPED else len(chunk)
+        if not stepwise:
+            if not chunk:
+                break
+            continue
+
+        events = []
+        if game.won():
+            outcome = GAME_WON
+        elif game.check_game_over():
+            outcome = GAME_LOST
+        else:
+            outcome = PLAYING
+            for direction in chunk:
+                if rng.random() < SNAPSHOT_RATE:
+                    snapshots.append((game.get_player().get_position(), game.get_game_information().copy(),
+                                      game.get_player().moves_remaining(), game.get_hash(), game.to_state()))
+                events.append(play_step(game, direction))
+                if game.won():
+                    outcome = GAME_WON
+                elif game.check_game_over():
+                    outcome = GAME_LOST
+                elif events[-1] in stop_on:
+                    outcome = STOPPED
+                if outcome != PLAYING:
+                    break
+
+        check(twin_events == "".join(events), "apply_moves and play_move report different events",
+              f"{twin_events!r} {''.join(events)!r}")
+        check(twin_outcome == outcome, "apply_moves and play_move end differently", f"{twin_outcome} {outcome}")
+        # the hashes tell the states apart, the states themselves are compared once the case is over
+        check(game.get_hash() == twin.get_hash(), "apply_moves and play_move disagree",
+              f"{game.to_state()} {twin.to_state()}")
+        if not chunk:
+            break
+
+    if not stepwise:
+        check(twin.get_bonus_moves() == twin.count_bonus_moves(), "the bonus moves are out of date")
+        state_hash = twin.get_hash()
+        twin.rehash()
+        check(twin.get_hash() == state_hash, "the hash was not kept up to date")
+        return steps
+    compare(game, twin)
+
+    player = game.get_player()
+    if outcome == GAME_LOST and player.moves_remaining() > 0 and game.get_dungeon_size() <= SEARCHED_SIZE:
+        check(can_win(game) is not True, "a game that can still be won was declared lost")
+
+    if outcome != GAME_WON:
+        # undo goes back in time like the lives of MASTERS, the latest state first
+        for index in sorted(rng.sample(range(len(snapshots)), min(UNDOS, len(snapshots))), reverse=True):
+            position, information, moves_left, state_hash, state = snapshots[index]
+            game.restore(position, information, moves_left)
+            check(game.get_hash() == state_hash and game.to_state() == state, "restore did not undo the moves")
+    return steps
+
+
+def signature(error):
+    """Returns what a failure is told apart by: the check, or the exception and where it was raised."""
+    if isinstance(error, InvariantError):
+        return error.check
+    frame = traceback.extract_tb(error.__traceback__)[-1]
+    return f"{type(error).__name__} in {frame.name}"
+
+
+def failure_of(text, moves, seed, stepwise=True):
+    """Returns the signature of the failure of a case, None if it passes."""
+    try:
+        run_case(text, moves, seed, stepwise)
+    except Exception as e:
+        return signature(e)
+    return None
+
+
+def shrink_moves(moves, fails):
+    """Removes the chunks of moves the failure does not need, halving the chunks until single moves."""
+    chunk = len(moves) // 2
+    while chunk:
+        index = 0
+        changed = False
+        while index < len(moves):
+            candidate = moves[:index] + moves[index + chunk:]
+            if fails(moves=candidate):
+                moves = candidate
+                changed = True
+            else:
+                index += chunk
+        if not changed:
+            chunk //= 2
+    return moves
+
+
+def shrink_level(text, fails):
+    """Removes the lines, rows, columns and tiles of a level the failure does not need."""
+    lines = text.splitlines()
+    changed = True
+    while changed:
+        changed = False
+        candidates = [lines[:index] + lines[index + 1:] for index in range(len(lines))]
+        size = len(lines[0]) if lines else 0
+        if size > 1 and len(lines) >= size:
+            for rows, cols in ((slice(1, None), slice(1, None)), (slice(None, -1), slice(None, -1))):
+                candidates.append([row[cols] for row in lines[:size][rows]] + lines[size:])
+        for candidate in candidates:
+            if fails(text="\n".join(candidate) + "\n"):
+                lines = candidate
+                changed = True
+                break
+        if changed:
+            continue
+        for row, line in enumerate(lines):
+            for col, char in enumerate(line):
+                for replacement in (SPACE, WALL):
+                    if char in (SPACE, replacement) or changed:
+                        continue
+                    candidate = lines[:row] + [line[:col] + replacement + line[col + 1:]] + lines[row + 1:]
+                    if fails(text="\n".join(candidate) + "\n"):
+                        lines = candidate
+                        changed = True
+    return "\n".join(lines) + "\n"
+
+
+def minimise(text, moves, seed, stepwise=True, seconds=MINIMISE_TIME):
+    """Shrinks a failing case to a small one failing the same way.
+
+    Parameters:
+        text (str): The level file of the case.
+        moves (str): The directions of the case.
+        seed (int): The seed of the case.
+        stepwise (bool): True if the case was also played with play_move.
+        seconds (float): How long to try, the case is returned as shrunk so far after that.
+
+    Returns:
+        (str, str): The smaller level file and directions.
+    """
+    wanted = failure_of(text, moves, seed, stepwise)
+    deadline = time.perf_counter() + seconds
+    case = {"text": text, "moves": moves}
+
+    def fails(**changes):
+        if time.perf_counter() > deadline:
+            return False
+        candidate = dict(case, **changes)
+        if failure_of(candidate["text"], candidate["moves"], seed, stepwise) != wanted:
+            return False
+        case.update(changes)
+        return True
+
+    while True:
+        before = dict(case)
+        case["moves"] = shrink_moves(case["moves"], fails)
+        case["text"] = shrink_level(case["text"], fails)
+        if case == before or time.perf_counter() > deadline:
+            return case["text"], case["moves"]
+
+
+def fuzz(seed, seconds=None, cases=None):
+    """Runs random cases until the time or the number of cases is up.
+
+    Parameters:
+        seed (int): The seed of the cases.
+        seconds (float): How long to run.
+        cases (int): How many cases to run.
+
+    Returns:
+        (dict): The number of cases, levels, rejected levels and steps played, the
+            seconds spent, and the first failing case of every signature as
+            (signature, level text, moves, case seed, stepwise, traceback).
+    """
+    rng = random.Random(seed)
+    seeds = seed_levels()
+    stats = {"cases": 0, "levels": 0, "rejected": 0, "steps": 0, "seconds": 0.0, "failures": {}}
+    start = time.perf_counter()
+    while (cases is None or stats["cases"] < cases) and \
+            (seconds is None or time.perf_counter() - start < seconds):
+        text = random_level(rng, seeds)
+        route = shortest_route(text)
+        walk = random_walk(rng, MOVES)
+        stats["levels"] += 1
+        for _ in range(PLAYS_PER_LEVEL):
+            moves = random_moves(rng, route, walk)
+            case_seed = rng.getrandbits(32)
+            stepwise = stats["cases"] % STEPWISE_EVERY == 0
+            stats["cases"] += 1
+            try:
+                steps = run_case(text, moves, case_seed, stepwise)
+            except Exception as e:
+                found = signature(e)
+                if found not in stats["failures"]:
+                    stats["failures"][found] = (found, text, moves, case_seed, stepwise, traceback.format_exc())
+                break
+            if steps is None:
+                stats["rejected"] += 1
+                break
+            stats["steps"] += steps
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    '''
+    to fuzz the game logic and write small reproducers of the failures
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30, help="how long every worker runs")
+    parser.add_argument("--cases", type=int, default=None, help="how many cases every worker runs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--out", default="fuzz_failures", help="directory the reproducers are written to")
+    args = parser.parse_args()
+    seconds = None if args.cases else args.seconds
+
+    if args.workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+            results = list(pool.map(fuzz, [args.seed * args.workers + i for i in range(args.workers)],
+                                    [seconds] * args.workers, [args.cases] * args.workers))
+    else:
+        results = [fuzz(args.seed, seconds, args.cases)]
+
+    failures = {}
+    for result in results:
+        for found, failure in result["failures"].items():
+            failures.setdefault(found, failure)
+    cases = sum(result["cases"] for result in results)
+    steps = sum(result["steps"] for result in results)
+    elapsed = max(result["seconds"] for result in results)
+    print(f"{cases} cases on {sum(result['levels'] for result in results)} levels "
+          f"({sum(result['rejected'] for result in results)} rejected), "
+          f"{steps} steps in {elapsed:.1f} s: {steps / max(elapsed, 1e-9):,.0f} steps per second")
+
+    if not failures:
+        print("no failures")
+        return
+    os.makedirs(args.out, exist_ok=True)
+    for number, (found, text, moves, case_seed, stepwise, trace) in enumerate(failures.values(), 1):
+        text, moves = minimise(text, moves, case_seed, stepwise)
+        base = os.path.join(args.out, f"failure-{number}")
+        with open(base + ".txt", "w") as file:
+            file.write(text)
+        with open(base + ".moves", "w") as file:
+            file.write(f"{moves}\n{case_seed}\n{'stepwise' if stepwise else 'apply_moves'}\n")
+        print(f"\nFAIL {found}\n{trace.rstrip().splitlines()[-1]}\nlevel {base}.txt:\n{text}moves {moves!r}, "
+              f"seed {case_seed}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""Background file I/O for the Tk game.
+
+The Tk main loop must never wait for the disk. An IOWorker owns a thread
+that executes read and write requests from a queue. Requests that arrive
+together are executed as one batch and every file written by the batch is
+fsynced once at its end, so a burst of small writes costs a single sync per
+file. Completion callbacks are queued back and run on the Tk main loop by
+polling with ``after``, never on the worker thread.
+"""
+import os
+import queue
+import threading
+
+
+APPEND = "append"
+REPLACE = "replace"
+READ = "read"
+CALL = "call"
+
+_STOP = object()
+
+
+class IOWorker:
+    """A thread executing file requests in batches for a Tk application."""
+
+    def __init__(self, master, on_error=None, poll_interval=50):
+        """
+        Parameters:
+            master (tk.Misc): Any widget of the Tk application; callbacks
+                are run from its event loop.
+            on_error (callable): Called with the exception of a failed
+                request that has no errback. Without it the exception is
+                raised on the Tk loop.
+            poll_interval (int): Milliseconds between two checks for
+                finished requests.
+        """
+        self._master = master
+        self._on_error = on_error
+        self._poll_interval = poll_interval
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="io-worker", daemon=True)
+        self._running = False
+
+    def start(self):
+        """Starts the worker thread and the delivery of completions."""
+        self._running = True
+        self._thread.start()
+        self._master.after(self._poll_interval, self._deliver)
+
+    def close(self):
+        """Finishes every queued request, then stops the worker thread.
+
+        Completions that have not been delivered yet are dropped, as the
+        Tk loop is usually gone by then.
+        """
+        if self._running:
+            self._running = False
+            self._requests.put(_STOP)
+            self._thread.join()
+
+    def append(self, path, data, callback=None, errback=None):
+        """Appends text to a file, creating it if needed.
+
+        Parameters:
+            path (str): The file.
+            data (str): The text to append.
+            callback (callable): Called with None once the text is on disk.
+            errback (callable): Called with the exception if the write failed.
+        """
+        self._requests.put((APPEND, path, data, callback, errback))
+
+    def replace(self, path, data, callback=None, errback=None):
+        """Replaces the content of a file atomically.
+
+        The text is written to a temporary file that is renamed over path
+        once it is on disk, so readers see either the old or the new file.
+
+        Parameters:
+            path (str): The file.
+            data (str|bytes): The new content.
+            callback (callable): Called with None once the file is replaced.
+            errback (callable): Called with the exception if the write failed.
+        """
+        self._requests.put((REPLACE, path, data, callback, errback))
+
+    def read(self, path, callback, errback=None):
+        """Reads the text of a file.
+
+        Parameters:
+            path (str): The file.
+            callback (callable): Called with the text of the file.
+            errback (callable): Called with the exception if the read failed.
+        """
+        self._requests.put((READ, path, None, callback, errback))
+
+    def call(self, function, callback=None, errback=None):
+        """Runs any blocking function on the worker thread.
+
+        Parameters:
+            function (callable): Called without arguments on the worker thread.
+            callback (callable): Called with the return value of function.
+            errback (callable): Called with the exception function raised.
+        """
+        self._requests.put((CALL, None, function, callback, errback))
+
+    def _run(self):
+        """Main loop of the worker thread."""
+        while True:
+            batch = [self._requests.get()]
+            while True:
+                try:
+                    batch.append(self._requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in batch
+            self._execute([request for request in batch if request is not _STOP])
+            if stop:
+                return
+
+    def _execute(self, batch):
+        """Executes a batch of requests, syncing each written file once.
+
+        Writes are committed before a read or call runs, so every request
+        sees the effect of the ones queued before it.
+        """
+        files = {}
+        renames = {}
+        failed = {}
+        outcomes = []
+
+        for kind, path, data, callback, errback in batch:
+            if kind in (READ, CALL) and files:
+                self._commit(files, renames, failed)
+            try:
+                if kind == READ:
+                    with open(path, 'r', encoding='utf-8') as file:
+                        result = file.read()
+                elif kind == CALL:
+                    result = data()
+                else:
+                    target = path + ".tmp" if kind == REPLACE else path
+                    file = files.get(target)
+                    if kind == REPLACE or file is None:
+                        if file is not None:
+                            file.close()
+                        mode = 'ab' if kind == APPEND else 'wb'
+                        file = files[target] = open(target, mode)
+                    file.write(data if isinstance(data, bytes) else data.encode('utf-8'))
+                    if kind == REPLACE:
+                        renames[target] = path
+                    result = None
+                outcomes.append((callback, errback, result, None, path))
+            except Exception as e:
+                outcomes.append((callback, errback, None, e, path))
+
+        self._commit(files, renames, failed)
+        for callback, errback, result, error, path in outcomes:
+            error = error or failed.get(path)
+            if error is not None:
+                self._results.put((errback or self._on_error, error, True))
+            elif callback is not None:
+                self._results.put((callback, result, False))
+
+    @staticmethod
+    def _commit(files, renames, failed):
+        """Syncs and closes the files written so far, then renames replacements.
+
+        Parameters:
+            files (dict<str: file>): The open files by path, emptied.
+            renames (dict<str: str>): The final path of temporary files, emptied.
+            failed (dict<str: OSError>): Updated with the errors by final path.
+        """
+        for target, file in files.items():
+            try:
+                file.flush()
+                os.fsync(file.fileno())
+                file.close()
+                if target in renames:
+                    os.replace(target, renames[target])
+            except OSError as e:
+                file.close()
+                failed[renames.get(target, target)] = e
+        files.clear()
+        renames.clear()
+
+    def _deliver(self):
+        """Runs the callbacks of finished requests on the Tk main loop."""
+        if self._running:
+            self._master.after(self._poll_interval, self._deliver)
+        while True:
+            try:
+                function, value, failed = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if function is not None:
+                function(value)
+            elif failed:
+                raise value
@@ -0,0 +1,205 @@
+"""Crash-safe autosave of the running game.
+
+Every move is appended to a journal as a thirteen byte record (direction,
+timer and the hash of the game after the move) with a single unbuffered
+write, so the cost per move is one system call. Every few moves or seconds
+a full checkpoint of the game state is
+written to a temporary file that is synced and renamed over the previous
+checkpoint, and a new journal generation is started. After a crash the game
+is the latest checkpoint with the moves of its journal generation and any
+later one replayed on top, and the hashes tell where a replay diverges from
+the game that was played.
+
+The journal does not depend on the game classes: checkpoints hold whatever
+GameLogic.to_state returns and are turned back into a game by the caller.
+"""
+import glob
+import json
+import os
+import struct
+import time
+
+
+FORMAT_VERSION = 2
+CHECKPOINT_FILE = "checkpoint.json"
+JOURNAL_PREFIX = "journal-"
+JOURNAL_FILE = JOURNAL_PREFIX + "%d.bin"
+
+_RECORD = struct.Struct("<cIQ")
+
+
+class AutosaveJournal:
+    """Journal and checkpoints of one running game in a directory."""
+
+    def __init__(self, directory, io=None, every_moves=20, every_seconds=30):
+        """
+        Parameters:
+            directory (str): Where the checkpoint and journals are kept.
+            io (IOWorker): Writes checkpoints in the background when given,
+                otherwise they are written synchronously.
+            every_moves (int): Moves between two checkpoints.
+            every_seconds (float): Seconds between two checkpoints.
+        """
+        self._directory = directory
+        self._io = io
+        self._every_moves = every_moves
+        self._every_seconds = every_seconds
+
+        self._generation = 0
+        self._fd = None
+        self._moves = 0
+        self._last_checkpoint = 0
+
+    def _path(self, name):
+        """ """
+        return os.path.join(self._directory, name)
+
+    def _generations(self):
+        """Returns the generations of the journals on disk, oldest first."""
+        generations = []
+        for path in glob.glob(self._path(JOURNAL_PREFIX + "*.bin")):
+            try:
+                generations.append(int(os.path.basename(path)[len(JOURNAL_PREFIX):-len(".bin")]))
+            except ValueError:
+                pass
+        return sorted(generations)
+
+    def recover(self):
+        """Reads the game left behind by a previous run.
+
+        Returns:
+            (tuple<dict, int, list<tuple<str, int>>>): The checkpointed
+                state, the timer of the last move and the direction and
+                resulting state hash of every move played since the
+                checkpoint, or None if there is nothing to resume.
+        """
+        try:
+            with open(self._path(CHECKPOINT_FILE), 'r') as file:
+                checkpoint = json.load(file)
+            if checkpoint.get("version") != FORMAT_VERSION:
+                return None
+            generation, state, timer = checkpoint["generation"], checkpoint["state"], checkpoint["timer"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None
+        if not (isinstance(generation, int) and isinstance(timer, int) and isinstance(state, dict)):
+            return None
+
+        moves = []
+        # the timer of the last move replaces the one of the checkpoint
+        for direction, timer, state_hash in self._journaled(generation):
+            moves.append((direction, state_hash))
+        self._generation = max([generation, *self._generations()])
+        return state, timer, moves
+
+    def _journaled(self, generation):
+        """Yields the (direction, timer, state hash) of the moves journaled since a checkpoint.
+
+        A record cut short by the crash is ignored. The moves end at a
+        record whose direction is not a character, as the ones after it
+        could not be replayed.
+
+        Parameters:
+            generation (int): The generation of the checkpoint.
+        """
+        for journal in self._generations():
+            if journal < generation:
+                continue
+            try:
+                with open(self._path(JOURNAL_FILE % journal), 'rb') as file:
+                    data = file.read()
+            except OSError:
+                continue
+            usable = len(data) - len(data) % _RECORD.size
+            for direction, timer, state_hash in _RECORD.iter_unpack(data[:usable]):
+                try:
+                    direction = direction.decode("ascii")
+                except UnicodeDecodeError:
+                    return
+                yield direction, timer, state_hash
+
+    def checkpoint(self, state, timer):
+        """Writes a full checkpoint and starts a new journal generation.
+
+        Parameters:
+            state (dict): The state returned by GameLogic.to_state.
+            timer (int): The seconds elapsed.
+        """
+        self._generation += 1
+        generation = self._generation
+        os.makedirs(self._directory, exist_ok=True)
+
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self._path(JOURNAL_FILE % generation),
+                           os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self._moves = 0
+        self._last_checkpoint = time.monotonic()
+
+        data = json.dumps({"version": FORMAT_VERSION, "generation": generation, "state": state, "timer": timer})
+        if self._io is None:
+            path = self._path(CHECKPOINT_FILE)
+            with open(path + ".tmp", 'w') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(path + ".tmp", path)
+            self._prune(generation)
+        else:
+            # the worker runs requests in order, so the old journals are only
+            # pruned once the new checkpoint is on disk
+            self._io.replace(self._path(CHECKPOINT_FILE), data)
+            self._io.call(lambda: self._prune(generation))
+
+    def _prune(self, generation):
+        """Deletes the journals made obsolete by a durable checkpoint."""
+        for journal in self._generations():
+            if journal < generation:
+                try:
+                    os.remove(self._path(JOURNAL_FILE % journal))
+                except OSError:
+                    pass
+
+    def record(self, direction, timer, state_hash):
+        """Appends a move to the journal.
+
+        Parameters:
+            direction (str): The direction the player moved in.
+            timer (int): The seconds elapsed.
+            state_hash (int): GameLogic.get_hash after the move.
+        """
+        if self._fd is not None:
+            os.write(self._fd, _RECORD.pack(direction.encode(), timer, state_hash))
+            self._moves += 1
+
+    def checkpoint_due(self):
+        """Checks if enough moves or time have passed since the last checkpoint."""
+        return self._fd is not None and self._moves > 0 and (
+            self._moves >= self._every_moves
+            or time.monotonic() - self._last_checkpoint >= self._every_seconds)
+
+    def discard(self):
+        """Forgets the game, e.g. once it is won or lost."""
+        self.close()
+        generation = self._generation
+        if self._io is None:
+            self._remove_files(generation)
+        else:
+            self._io.call(lambda: self._remove_files(generation))
+
+    def _remove_files(self, generation):
+        """Deletes the checkpoint and the journals up to a generation.
+
+        Journals of later generations belong to a game started since.
+        """
+        paths = [self._path(JOURNAL_FILE % journal) for journal in self._generations() if journal <= generation]
+        for path in [self._path(CHECKPOINT_FILE), *paths]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        """Stops journaling, keeping the files so the game can be resumed."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,460 @@
+"""Reinforcement learning environments for Key Cave Adventure.
+
+KeyCaveEnv follows the Gym API on top of GameLogic: reset returns an
+observation and an info dict, step returns the observation, the reward,
+whether the game ended (won or lost), whether it was cut short by
+max_steps, and an info dict. VectorKeyCave plays a whole batch of games on
+numpy arrays, without a GameLogic or any entity object per game, and
+SubprocVectorEnv spreads such a batch over worker processes to use every
+core.
+
+An observation is a dict of::
+
+    grid:    uint8 (size, size), one CELL_* code per cell
+    moves:   int32, the moves left
+    has_key: int8, 1 once the key is held
+
+Actions are indexes into ACTIONS. Rewards are shaped: every move costs a
+little, moving closer to the key (then the door) earns a little, and the
+game ends with a large reward or penalty.
+
+numpy is required. If gymnasium is installed KeyCaveEnv is a gymnasium.Env
+with matching observation and action spaces.
+"""
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+
+try:
+    import gymnasium
+    from gymnasium import spaces
+except ImportError:
+    gymnasium = None
+
+from KeyCaveAdventureGame import (GameLogic, GAME_LEVELS, DIRECTIONS, SPACE, WALL, KEY, DOOR, MOVE_INCREASE,
+                                 PLAYER, MoveIncrease, load_game, distance_field)
+
+
+ACTIONS = ("W", "A", "S", "D")
+
+CELL_EMPTY = 0
+CELL_WALL = 1
+CELL_KEY = 2
+CELL_DOOR = 3
+CELL_BANANA = 4
+CELL_PLAYER = 5
+CELL_CODES = {SPACE: CELL_EMPTY, WALL: CELL_WALL, KEY: CELL_KEY, DOOR: CELL_DOOR,
+              MOVE_INCREASE: CELL_BANANA, PLAYER: CELL_PLAYER}
+
+WIN_REWARD = 1.0
+LOSS_REWARD = -1.0
+STEP_REWARD = -0.01
+BUMP_REWARD = -0.05
+PROGRESS_REWARD = 0.02
+
+# the distance standing in for an unreachable goal
+_FAR = 1 << 20
+
+_DELTAS = np.array([DIRECTIONS[action] for action in ACTIONS], dtype=np.int64)
+
+
+def _shaped_reward(moved, needed_before, needed_after, won, lost):
+    """Returns the reward of one move, see the module docstring."""
+    reward = STEP_REWARD if moved else BUMP_REWARD
+    if needed_before is not None and needed_after is not None:
+        reward += PROGRESS_REWARD * (needed_before - needed_after)
+    if won:
+        reward += WIN_REWARD
+    elif lost:
+        reward += LOSS_REWARD
+    return reward
+
+
+class KeyCaveEnv(gymnasium.Env if gymnasium is not None else object):
+    """One game of a level, played through the Gym API."""
+
+    metadata = {"render_modes": ["ansi"]}
+
+    def __init__(self, level="game2.txt", max_steps=None, render_mode=None):
+        """
+        Parameters:
+            level (str): The level file, read once.
+            max_steps (int): Moves after which a game is truncated, None for no limit.
+            render_mode (str): "ansi" to render the board as text.
+        """
+        layout, budget = load_game(level)
+        self._level = level
+        self._layout = layout
+        self._budget = GAME_LEVELS.get(level, budget)
+        self._size = len(layout)
+        self._max_steps = max_steps
+        self.render_mode = render_mode
+
+        self._game = None
+        self._grid = None
+        self._steps = 0
+
+        if gymnasium is not None:
+            self.action_space = spaces.Discrete(len(ACTIONS))
+            self.observation_space = spaces.Dict({
+                "grid": spaces.Box(0, CELL_PLAYER, (self._size, self._size), np.uint8),
+                "moves": spaces.Box(0, np.iinfo(np.int32).max, (), np.int32),
+                "has_key": spaces.Box(0, 1, (), np.int8),
+            })
+
+    def get_game(self):
+        """ """
+        return self._game
+
+    def reset(self, seed=None, options=None):
+        """Starts a new game of the level.
+
+        Parameters:
+            seed (int): Seeds the random generator of the environment.
+            options (dict): Unused.
+
+        Returns:
+            (tuple<dict, dict>): The first observation and an empty info dict.
+        """
+        if gymnasium is not None:
+            super().reset(seed=seed)
+        self._game = GameLogic(self._level, ([row[:] for row in self._layout], self._budget))
+        self._grid = np.array([[CELL_CODES.get(char, CELL_EMPTY) for char in row] for row in self._layout],
+                              dtype=np.uint8)
+        self._steps = 0
+        return self._observation(), {}
+
+    def step(self, action):
+        """Plays one move.
+
+        Parameters:
+            action (int): An index into ACTIONS.
+
+        Returns:
+            (tuple<dict, float, bool, bool, dict>): The observation, the
+                reward, whether the game is won or lost, whether it was
+                truncated, and an info dict with "won".
+        """
+        game = self._game
+        old_position = game.get_player().get_position()
+        needed_before = game.moves_needed()
+
+        moved = game.play_move(ACTIONS[action])
+        self._steps += 1
+        if moved:
+            position = game.get_player().get_position()
+            self._grid[old_position] = CELL_DOOR if old_position == game.get_door_position() else CELL_EMPTY
+            self._grid[position] = CELL_PLAYER
+
+        won = game.won()
+        lost = not won and game.check_game_over()
+        reward = _shaped_reward(moved, needed_before, game.moves_needed(), won, lost)
+        truncated = not (won or lost) and self._max_steps is not None and self._steps >= self._max_steps
+        return self._observation(), reward, won or lost, truncated, {"won": won}
+
+    def _observation(self):
+        """ """
+        return {
+            "grid": self._grid.copy(),
+            "moves": np.array(self._game.get_player().moves_remaining(), dtype=np.int32),
+            "has_key": np.array(self._game.has_key(), dtype=np.int8),
+        }
+
+    def render(self):
+        """Returns the board as text in the "ansi" render mode."""
+        if self.render_mode != "ansi":
+            return None
+        chars = {code: char for char, code in CELL_CODES.items()}
+        rows = ["".join(chars[code] for code in row) for row in self._grid]
+        rows.append(f"moves: {self._game.get_player().moves_remaining()}")
+        return "\n".join(rows)
+
+
+class VectorKeyCave:
+    """A batch of games stepped together on numpy arrays.
+
+    Levels of different sizes are padded with walls to the largest one.
+    The distance fields of every distinct level are computed once, so a
+    step of the whole batch is a handful of array operations. A game that
+    ends restarts at once: the observation returned for it is the first of
+    its next game, and info["won"] tells how the last one ended.
+    """
+
+    def __init__(self, levels, max_steps=None, size=None):
+        """
+        Parameters:
+            levels (list<str>): The level file of every game of the batch;
+                a file may be listed many times.
+            max_steps (int): Moves after which a game is truncated, None for no limit.
+            size (int): The size the grids are padded to, the largest level by default.
+        """
+        names = list(dict.fromkeys(levels))
+        parsed = [load_game(name) for name in names]
+        size = max([size or 0] + [len(layout) for layout, _ in parsed])
+        bonus = MoveIncrease().get_moves()
+
+        count = len(names)
+        grids = np.full((count, size, size), CELL_WALL, dtype=np.uint8)
+        starts = np.zeros((count, 2), dtype=np.int64)
+        budgets = np.zeros(count, dtype=np.int32)
+        bonuses = np.zeros(count, dtype=np.int32)
+        keys_held = np.zeros(count, dtype=np.int8)
+        key_distances = np.full((count, size, size), _FAR, dtype=np.int32)
+        door_distances = np.full((count, size, size), _FAR, dtype=np.int32)
+        key_to_door = np.full(count, _FAR, dtype=np.int32)
+
+        for index, (name, (layout, budget)) in enumerate(zip(names, parsed)):
+            game = GameLogic(name, ([row[:] for row in layout], budget))
+            rows = len(layout)
+            grids[index, :rows, :rows] = [[CELL_CODES.get(char, CELL_EMPTY) for char in row] for row in layout]
+            starts[index] = game.get_player().get_position()
+            grids[index][tuple(starts[index])] = CELL_EMPTY
+            budgets[index] = game.get_player().moves_remaining()
+            bonuses[index] = game.get_bonus_moves()
+            keys_held[index] = game.has_key()
+
+            for position, distances in ((game.get_key_position(), key_distances),
+                                        (game.get_door_position(), door_distances)):
+                if position is None:
+                    continue
+                field = distance_field(game.get_walls(), rows, position)
+                for row in range(rows):
+                    for col in range(rows):
+                        distance = field.distance((row, col))
+                        if distance is not None:
+                            distances[index, row, col] = distance
+            if game.get_key_position() is not None:
+                key_to_door[index] = door_distances[index][game.get_key_position()]
+
+        self.num_envs = len(levels)
+        self._size = size
+        self._bonus = bonus
+        self._max_steps = max_steps
+        self._level = np.array([names.index(level) for level in levels], dtype=np.int64)
+        self._start_grids = grids
+        self._starts = starts
+        self._budgets = budgets
+        self._bonuses = bonuses
+        self._keys_held = keys_held
+        self._key_distances = key_distances
+        self._door_distances = door_distances
+        self._key_to_door = key_to_door
+        self._rows = np.arange(self.num_envs)
+
+        self._grid = grids[self._level].copy()
+        self._position = starts[self._level].copy()
+        self._moves = budgets[self._level].copy()
+        self._bonus_left = bonuses[self._level].copy()
+        self._has_key = keys_held[self._level].copy()
+        self._steps = np.zeros(self.num_envs, dtype=np.int64)
+
+    def reset(self, seed=None):
+        """Restarts every game.
+
+        Returns:
+            (tuple<dict, dict>): The observations and an empty info dict.
+        """
+        self._restart(np.ones(self.num_envs, dtype=bool))
+        return self._observation(), {}
+
+    def _restart(self, games):
+        """Puts the games of a boolean mask back to the start of their level."""
+        levels = self._level[games]
+        self._grid[games] = self._start_grids[levels]
+        self._position[games] = self._starts[levels]
+        self._moves[games] = self._budgets[levels]
+        self._bonus_left[games] = self._bonuses[levels]
+        self._has_key[games] = self._keys_held[levels]
+        self._steps[games] = 0
+
+    def _moves_needed(self):
+        """Returns the length of the shortest way out of every game, _FAR if there is none."""
+        rows, cols = self._position[:, 0], self._position[:, 1]
+        to_door = self._door_distances[self._level, rows, cols]
+        to_key = self._key_distances[self._level, rows, cols] + self._key_to_door[self._level]
+        return np.minimum(np.where(self._has_key == 1, to_door, to_key), _FAR)
+
+    def step(self, actions):
+        """Plays one move in every game.
+
+        Parameters:
+            actions (array<int>): One index into ACTIONS per game.
+
+        Returns:
+            (tuple<dict, array, array, array, dict>): The observations, the
+                rewards, which games were won or lost, which were truncated,
+                and an info dict with the boolean array "won".
+        """
+        needed_before = self._moves_needed()
+        target = self._position + _DELTAS[np.asarray(actions)]
+        inside = np.all((target >= 0) & (target < self._size), axis=1)
+        target = np.clip(target, 0, self._size - 1)
+        rows, cols = target[:, 0], target[:, 1]
+        tile = self._grid[self._rows, rows, cols]
+
+        moved = inside & (tile != CELL_WALL)
+        self._position[moved] = target[moved]
+        self._moves -= moved
+        self._steps += 1
+
+        keys = moved & (tile == CELL_KEY)
+        bananas = moved & (tile == CELL_BANANA)
+        self._has_key[keys] = 1
+        self._moves += bananas * self._bonus
+        self._bonus_left -= bananas * self._bonus
+        eaten = keys | bananas
+        self._grid[self._rows[eaten], rows[eaten], cols[eaten]] = CELL_EMPTY
+
+        needed_after = self._moves_needed()
+        won = moved & (tile == CELL_DOOR) & (self._has_key == 1)
+        lost = ~won & ((self._moves <= 0) | (self._moves + self._bonus_left < needed_after))
+        truncated = ~(won | lost)
+        if self._max_steps is not None:
+            truncated &= self._steps >= self._max_steps
+        else:
+            truncated[:] = False
+
+        reachable = (needed_before < _FAR) & (needed_after < _FAR)
+        rewards = np.where(moved, STEP_REWARD, BUMP_REWARD)
+        rewards += np.where(reachable, PROGRESS_REWARD * (needed_before - needed_after), 0.0)
+        rewards += np.where(won, WIN_REWARD, np.where(lost, LOSS_REWARD, 0.0))
+
+        finished = won | lost | truncated
+        if finished.any():
+            self._restart(finished)
+        return self._observation(), rewards, won | lost, truncated, {"won": won}
+
+    def _observation(self):
+        """ """
+        grid = self._grid.copy()
+        grid[self._rows, self._position[:, 0], self._position[:, 1]] = CELL_PLAYER
+        return {"grid": grid, "moves": self._moves.astype(np.int32), "has_key": self._has_key.copy()}
+
+    def close(self):
+        """ """
+
+
+def _vector_worker(connection, levels, max_steps, size):
+    """Runs a VectorKeyCave in a worker process, driven by its pipe."""
+    env = VectorKeyCave(levels, max_steps, size)
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == "step":
+                connection.send(env.step(argument))
+            elif command == "reset":
+                connection.send(env.reset(argument))
+            else:
+                break
+    finally:
+        connection.close()
+
+
+class SubprocVectorEnv:
+    """A batch of games split over worker processes, each stepping its share as a VectorKeyCave."""
+
+    def __init__(self, levels, workers=None, max_steps=None):
+        """
+        Parameters:
+            levels (list<str>): The level file of every game of the batch.
+            workers (int): The number of worker processes, one per core by default.
+            max_steps (int): Moves after which a game is truncated, None for no limit.
+        """
+        workers = max(1, min(workers or multiprocessing.cpu_count(), len(levels)))
+        bounds = [len(levels) * worker // workers for worker in range(workers + 1)]
+        # every worker pads to the same size so that the observations can be joined
+        size = max(len(load_game(level)[0]) for level in set(levels))
+        self.num_envs = len(levels)
+        self._slices = [slice(start, end) for start, end in zip(bounds, bounds[1:])]
+        self._connections = []
+        self._processes = []
+        for part in self._slices:
+            connection, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_vector_worker, args=(child, levels[part], max_steps, size),
+                                              daemon=True)
+            process.start()
+            child.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def reset(self, seed=None):
+        """Restarts every game, see VectorKeyCave.reset."""
+        for connection in self._connections:
+            connection.send(("reset", seed))
+        observations, infos = zip(*[connection.recv() for connection in self._connections])
+        return self._join(observations), {}
+
+    def step_async(self, actions):
+        """Sends the moves to the workers without waiting for them."""
+        actions = np.asarray(actions)
+        for connection, part in zip(self._connections, self._slices):
+            connection.send(("step", actions[part]))
+
+    def step_wait(self):
+        """Collects the results of step_async, see VectorKeyCave.step."""
+        results = [connection.recv() for connection in self._connections]
+        observations, rewards, terminated, truncated, infos = zip(*results)
+        return (self._join(observations), np.concatenate(rewards), np.concatenate(terminated),
+                np.concatenate(truncated), {"won": np.concatenate([info["won"] for info in infos])})
+
+    def step(self, actions):
+        """Plays one move in every game, see VectorKeyCave.step."""
+        self.step_async(actions)
+        return self.step_wait()
+
+    @staticmethod
+    def _join(observations):
+        """Concatenates the observations of the workers."""
+        return {name: np.concatenate([observation[name] for observation in observations])
+                for name in observations[0]}
+
+    def close(self):
+        """Stops the worker processes."""
+        for connection in self._connections:
+            try:
+                connection.send(("close", None))
+            except OSError:
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join(1)
+        self._connections = []
+        self._processes = []
+
+
+def main():
+    '''
+    to measure how many random moves per second the environments play
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("levels", nargs="*", default=list(GAME_LEVELS))
+    parser.add_argument("--games", type=int, default=4096, help="games stepped together")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=0, help="worker processes, 0 to step in this process")
+    args = parser.parse_args()
+
+    levels = [args.levels[game % len(args.levels)] for game in range(args.games)]
+    env = SubprocVectorEnv(levels, args.workers) if args.workers else VectorKeyCave(levels)
+    actions = np.random.default_rng(0).integers(0, len(ACTIONS), (args.steps, args.games))
+    try:
+        env.reset()
+        start = time.perf_counter()
+        for step in actions:
+            env.step(step)
+        elapsed = time.perf_counter() - start
+    finally:
+        env.close()
+    print(f"{args.games * args.steps / elapsed:,.0f} moves/s over {args.games} games")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+"""Level editor painting a dungeon and checking it after every stroke.
+
+LevelDraft keeps the layout being edited with the distance fields of the
+Player, the key and the door. An edit only repairs those fields where the
+distances change, see DistanceField.set_wall, and moving the Player, the key
+or the door only searches again from the one that moved. A banana never
+changes a field. After every edit the draft reports whether the key and the
+door can be reached, the shortest route and the smallest move budget the
+level can be won with, so a 100 x 100 level is checked in a few milliseconds.
+
+Run ``python level_editor.py game2.txt`` to edit a level or
+``python level_editor.py --size 100`` to start from an empty one. The editor
+is also opened from *File > Level Editor* in the game.
+"""
+import argparse
+import time
+import tkinter as tk
+from tkinter import filedialog, messagebox
+
+from KeyCaveAdventureGame import (PLAYER, KEY, DOOR, WALL, MOVE_INCREASE, SPACE, GAME_LEVELS, GameLogic,
+                                  MoveIncrease, DistanceField, CanvasBoardRenderer, SPRITES, load_game, fit_sprite_size)
+
+
+# the tiles of the palette, in the order they are shown
+TOOLS = ((WALL, 'Wall'), (KEY, 'Key'), (DOOR, 'Door'), (MOVE_INCREASE, 'Banana'), (PLAYER, 'Player'),
+         (SPACE, 'Erase'))
+
+# the tiles there is exactly one of, each with its distance field
+SOURCES = (PLAYER, KEY, DOOR)
+
+# the largest canvas of the editor in pixels
+CANVAS_SIZE = 800
+
+
+class LevelDraft:
+    """A dungeon being edited, with the distance fields checking it."""
+
+    def __init__(self, layout, budget=0):
+        """Construct a draft of a layout.
+
+        Parameters:
+            layout (list<list<str>>): The rows of the dungeon, as returned by load_game.
+            budget (int): The moves the level gives the Player.
+        """
+        self._size = len(layout)
+        self._cells = [char for row in layout for char in row]
+        self.budget = budget
+        # the position of the Player, the key and the door, the first one when a layout has several
+        self._sources = {}
+        self._bananas = set()
+        for cell, char in enumerate(self._cells):
+            position = divmod(cell, self._size)
+            if char in SOURCES:
+                if char in self._sources:
+                    self._cells[cell] = SPACE
+                else:
+                    self._sources[char] = position
+            elif char == MOVE_INCREASE:
+                self._bananas.add(position)
+        self._fields = {char: self._search(position) for char, position in self._sources.items()}
+        # the cells searched again by the last edit
+        self.searched = 0
+
+    @classmethod
+    def empty(cls, size, budget=0):
+        """Construct a draft of a dungeon with walls all around its edge.
+
+        Parameters:
+            size (int): The width of the dungeon.
+            budget (int): The moves the level gives the Player.
+        """
+        layout = [[WALL if row in (0, size - 1) or col in (0, size - 1) else SPACE for col in range(size)]
+                  for row in range(size)]
+        return cls(layout, budget)
+
+    def get_dungeon_size(self):
+        """ """
+        return self._size
+
+    def get_tile(self, position):
+        """Returns the character of a cell."""
+        return self._cells[position[0] * self._size + position[1]]
+
+    def get_layout(self):
+        """Returns the rows of the dungeon, as returned by load_game."""
+        size = self._size
+        return [self._cells[row * size:(row + 1) * size] for row in range(size)]
+
+    def to_text(self):
+        """Returns the content of the level file of the draft."""
+        return "".join("".join(row) + "\n" for row in self.get_layout()) + "%d\n" % self.budget
+
+    def _search(self, position):
+        """Runs a full search from a position."""
+        walls = "".join(WALL if char == WALL else SPACE for char in self._cells)
+        return DistanceField(walls, self._size, position)
+
+    def paint(self, position, tile):
+        """Puts a tile on a cell and repairs the distance fields.
+
+        The Player, the key and the door move to the cell from where they
+        were. Painting over any of them removes it.
+
+        Parameters:
+            position (tuple<int, int>): The cell.
+            tile (str): One of the characters of TOOLS, SPACE to erase.
+
+        Returns:
+            (list<tuple<int, int>>): The cells whose tile changed, empty if none did.
+        """
+        cell = position[0] * self._size + position[1]
+        old = self._cells[cell]
+        if old == tile:
+            return []
+        changed = [position]
+        self.searched = 0
+
+        if old in SOURCES:
+            del self._sources[old]
+            del self._fields[old]
+        elif old == MOVE_INCREASE:
+            self._bananas.discard(position)
+
+        if tile in SOURCES and tile in self._sources:
+            previous = self._sources[tile]
+            self._cells[previous[0] * self._size + previous[1]] = SPACE
+            changed.append(previous)
+        self._cells[cell] = tile
+
+        if (old == WALL) != (tile == WALL):
+            for field in self._fields.values():
+                self.searched += field.set_wall(position, tile == WALL)
+
+        if tile in SOURCES:
+            self._sources[tile] = position
+            self._fields[tile] = self._search(position)
+            self.searched += self._size * self._size
+        elif tile == MOVE_INCREASE:
+            self._bananas.add(position)
+        return changed
+
+    def check(self):
+        """Checks that the level can be won and finds its smallest budget.
+
+        The route goes from the Player to the key and then to the door,
+        eating at most one banana on the way to the key and one on the way
+        to the door. Bananas lying on the shortest ways are eaten anyway, so
+        the budget found is enough, though a route through more bananas may
+        need less.
+
+        Returns:
+            (str, int, int): A problem with the level, None if there is none,
+                the length of the shortest route and the smallest budget the
+                level can be won with, None when the level cannot be won.
+        """
+        for char, name in ((PLAYER, 'player'), (KEY, 'key'), (DOOR, 'door')):
+            if char not in self._sources:
+                return 'There is no %s' % name, None, None
+        player = self._sources[PLAYER]
+        key_field = self._fields[KEY]
+        door_field = self._fields[DOOR]
+        to_key = key_field.distance(player)
+        if to_key is None:
+            return 'The key cannot be reached', None, None
+        to_door = door_field.distance(self._sources[KEY])
+        if to_door is None:
+            return 'The door cannot be reached from the key', None, None
+
+        bonus = MoveIncrease().get_moves()
+        player_field = self._fields[PLAYER]
+        # a banana eaten on the way: the steps to it and then on to the next stop
+        bananas = []
+        for banana in self._bananas:
+            from_player = player_field.distance(banana)
+            from_key = key_field.distance(banana)
+            if from_player is not None and from_key is not None:
+                bananas.append((banana, from_player, from_key, door_field.distance(banana)))
+
+        # the moves needed from the key on over the budget spent to reach it, the best two bananas are
+        # kept in case the best one is also eaten on the way to the key
+        after_key = [(to_door, None)]
+        for banana, from_player, from_key, from_door in bananas:
+            after_key.append((max(from_key, from_key + from_door - bonus), banana))
+        after_key.sort(key=lambda option: option[0])
+        after_key = after_key[:2]
+
+        # without a banana the Player must still have a move left on the key
+        best = max(to_key + 1, to_key + after_key[0][0])
+        for banana, from_player, from_key, from_door in bananas:
+            needed, eaten = after_key[0]
+            if eaten == banana:
+                needed = after_key[1][0] if len(after_key) > 1 else to_door
+            spent = from_player + from_key - bonus
+            best = min(best, max(from_player, spent + 1, spent + needed))
+        return None, to_key + to_door, best
+
+
+class EditorRenderer(CanvasBoardRenderer):
+    '''
+    draws a LevelDraft with the sprites of the game
+    '''
+    @staticmethod
+    def sprite_name(draft, position):
+        '''
+        to find the sprite of a tile of a draft
+        :param draft: the LevelDraft
+        :param position: the (row, column) of the tile
+        :return: one of BOARD_SPRITES
+        '''
+        tile = draft.get_tile(position)
+        return 'player' if tile == PLAYER else {WALL: 'wall', KEY: 'key', DOOR: 'door',
+                                                MOVE_INCREASE: 'moveIncrease'}.get(tile, 'empty')
+
+
+class LevelEditor:
+    '''
+    a window painting a level on a canvas and checking it after every stroke
+    '''
+    def __init__(self, master, draft, filename=None, play=None):
+        '''
+
+        :param master: the window the editor is drawn on
+        :param draft: the LevelDraft edited
+        :param filename: the level file the draft is saved to, asked for when None
+        :param play: a function playing a GameLogic, the Play button is only shown when it is given
+        '''
+        self.master = master
+        self.draft = draft
+        self.filename = filename
+        self.play = play
+        # the cell painted last while the mouse is dragged
+        self.last_cell = None
+
+        palette = tk.Frame(master)
+        palette.pack(side=tk.TOP, fill=tk.X)
+        self.tool = tk.StringVar(master, value=WALL)
+        for tile, name in TOOLS:
+            tk.Radiobutton(palette, text=name, variable=self.tool, value=tile,
+                           indicatoron=0, width=7).pack(side=tk.LEFT)
+        tk.Label(palette, text='  Budget').pack(side=tk.LEFT)
+        self.budget = tk.IntVar(master, value=draft.budget)
+        tk.Spinbox(palette, from_=1, to=9999, width=5, textvariable=self.budget,
+                   command=self.show_check).pack(side=tk.LEFT)
+        tk.Button(palette, text='Use minimum', command=self.use_minimum).pack(side=tk.LEFT)
+        tk.Button(palette, text='Save', command=self.save).pack(side=tk.LEFT)
+        if play is not None:
+            tk.Button(palette, text='Play', command=self.play_draft).pack(side=tk.LEFT)
+
+        size = draft.get_dungeon_size()
+        tile_size = fit_sprite_size(CANVAS_SIZE / size)
+        self.canvas = tk.Canvas(master, width=size * tile_size, height=size * tile_size, bg='black',
+                                highlightthickness=0)
+        self.canvas.pack(side=tk.TOP)
+        self.renderer = EditorRenderer(self.canvas, tile_size)
+        self.board = self.renderer.add_board(draft, 0, 0)
+        self.canvas.bind('<Button-1>', lambda e: self.paint(e, self.tool.get()))
+        self.canvas.bind('<B1-Motion>', lambda e: self.paint(e, self.tool.get()))
+        self.canvas.bind('<Button-3>', lambda e: self.paint(e, SPACE))
+        self.canvas.bind('<B3-Motion>', lambda e: self.paint(e, SPACE))
+        self.canvas.bind('<ButtonRelease-1>', self.end_stroke)
+        self.canvas.bind('<ButtonRelease-3>', self.end_stroke)
+
+        self.status = tk.Label(master, anchor=tk.W)
+        self.status.pack(side=tk.TOP, fill=tk.X)
+        # the last result of LevelDraft.check and the milliseconds the last edit took
+        self.result = draft.check()
+        self.edit_time = 0.0
+        self.show_check()
+
+    def paint(self, event, tile):
+        '''
+        to put a tile on the cell under the mouse and check the level again
+        :param event: the mouse event
+        :param tile: the character of the tile, SPACE to erase
+        :return:
+        '''
+        size = self.draft.get_dungeon_size()
+        row = event.y // self.renderer.tile_size
+        col = event.x // self.renderer.tile_size
+        if not (0 <= row < size and 0 <= col < size) or (row, col) == self.last_cell:
+            return
+        self.last_cell = (row, col)
+        start = time.perf_counter()
+        changed = self.draft.paint((row, col), tile)
+        if not changed:
+            return
+        self.result = self.draft.check()
+        self.edit_time = 1000 * (time.perf_counter() - start)
+        self.renderer.draw_cells(self.board, changed)
+        self.show_check()
+
+    def end_stroke(self, event):
+        '''
+        to let the next click paint the cell painted last
+        :param event: the mouse event
+        :return:
+        '''
+        self.last_cell = None
+
+    def show_check(self):
+        '''
+        to show the result of the last check under the canvas
+        :return:
+        '''
+        problem, length, minimum = self.result
+        if problem is not None:
+            text, color = problem, 'red'
+        else:
+            budget = self.read_budget()
+            text = 'Shortest route %d moves, minimum budget %d' % (length, minimum)
+            if budget is not None and budget < minimum:
+                text, color = text + ', the budget of %d is too small' % budget, 'red'
+            else:
+                color = 'dark green'
+        self.status.config(text='%s (checked in %.1f ms)' % (text, self.edit_time), fg=color)
+
+    def read_budget(self):
+        '''
+        to read the budget typed in
+        :return: the budget, None when it is not a number
+        '''
+        try:
+            return self.budget.get()
+        except (tk.TclError, ValueError):
+            return None
+
+    def use_minimum(self):
+        '''
+        to set the budget to the smallest one the level can be won with
+        :return:
+        '''
+        minimum = self.result[2]
+        if minimum is not None:
+            self.budget.set(minimum)
+            self.show_check()
+
+    def save(self):
+        '''
+        to write the draft to its level file
+        :return:
+        '''
+        budget = self.read_budget()
+        if budget is None:
+            messagebox.showinfo('Save Level', 'The budget must be a number')
+            return
+        filename = self.filename or filedialog.asksaveasfilename(title=u'Save Level', defaultextension='.txt',
+                                                                 filetypes=[('level', '.txt'),
+                                                                            ('all file', '.*')])
+        if not filename:
+            return
+        self.draft.budget = budget
+        try:
+            with open(filename, 'w') as file:
+                file.write(self.draft.to_text())
+        except OSError as e:
+            messagebox.showinfo('Save Level', 'Sorry, the level could not be saved: %s' % e)
+            return
+        self.filename = filename
+
+    def play_draft(self):
+        '''
+        to play the draft as it is in the game
+        :return:
+        '''
+        budget = self.read_budget()
+        if self.result[0] is not None or budget is None:
+            messagebox.showinfo('Play Level', self.result[0] or 'The budget must be a number')
+            return
+        self.play(GameLogic(self.filename or 'edited level', (self.draft.get_layout(), budget), budget=budget))
+
+
+def main():
+    '''
+    to edit a level in a window
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description="Paint a level and check it after every edit.")
+    parser.add_argument("level", nargs="?", help="the level file to edit, a new one when missing")
+    parser.add_argument("--size", type=int, default=20, help="the width of a new level")
+    parser.add_argument("--budget", type=int, default=50, help="the move budget of a new level")
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.title('Level Editor - %s' % (args.level or 'new level'))
+    try:
+        SPRITES.prepare()
+    except OSError:
+        messagebox.showinfo('Error', 'You may miss some images')
+        root.destroy()
+        return
+    if args.level:
+        layout, budget = load_game(args.level)
+        # the levels of the game take their budget from GAME_LEVELS rather than from their file
+        draft = LevelDraft(layout, GAME_LEVELS.get(args.level, budget))
+    else:
+        draft = LevelDraft.empty(args.size, args.budget)
+    LevelEditor(root, draft, args.level)
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()
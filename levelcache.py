@@ -0,0 +1,284 @@
+"""Persistent cache of compiled levels, keyed by the hash of their text.
+
+Loading a level parses its text, builds its entities and searches its
+distance fields and regions. A compiled level keeps all of that in one
+binary file, so the next load of the same text, in this process or any
+other, maps the file and hands out views on its tables instead::
+
+    header:  <4s magic> <u16 format> <u16 parser> <u16 byte order> <u32 size>
+             <i32 budget> <u32 player> <u32 keys> <u32 doors> <u32 bananas>
+             <u32 fields>
+    tables:  <size * size kind codes> <u32 cells of the keys, doors and bananas>
+             <i32 region of every cell> <i32 door distances> <i32 key distances>
+
+Every table starts on a multiple of 4 bytes. The distance tables are only
+stored when the level has doors and reachable keys, see the fields bits.
+The numbers are in the byte order of the machine, a cache written on
+another one is compiled again.
+
+A file is named by the SHA-1 of the level text and the version of the
+parser that compiled it, so an edited level or a changed parser never meets
+a stale file. Files are written to a temporary name and renamed into place,
+so processes sharing the cache only ever map complete files. Every write
+prunes the directory: the files of other parser versions go, and so do the
+least recently loaded ones once the files outgrow SIZE_LIMIT.
+"""
+import array
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+
+MAGIC = b"KCLC"
+FORMAT_VERSION = 1
+EXTENSION = ".kclevel"
+
+# the bits of the fields of the header, set when the distance table is stored
+DOOR_FIELD = 1
+KEY_FIELD = 2
+
+# the compiled levels kept mapped in a process
+LOADED_LIMIT = 16
+# the bytes of compiled levels kept in the directory, about 200 levels of 150x150
+SIZE_LIMIT = 64 * 1024 * 1024
+
+_HEADER = struct.Struct("=4sHHHIiIIIII")
+_BYTE_ORDER = 0x0102
+
+
+def _padded(length):
+    """Returns length rounded up to a multiple of 4."""
+    return (length + 3) & ~3
+
+
+class CompiledLevel:
+    """The tables of a compiled level, viewed on the file they were mapped from."""
+
+    __slots__ = ("size", "budget", "player", "kinds", "keys", "doors", "bananas",
+                 "regions", "door_distances", "key_distances", "_buffer")
+
+    def __init__(self, buffer, parser_version):
+        """Reads the tables of a compiled level.
+
+        Parameters:
+            buffer (mmap | bytes): The compiled level, see pack_level.
+            parser_version (int): The version the level must be compiled by.
+
+        Raises:
+            ValueError: If the buffer is not a compiled level of this format
+                and parser version, or it is cut short.
+        """
+        if len(buffer) < _HEADER.size:
+            raise ValueError("not a compiled level")
+        (magic, format_version, parser, order, size, budget, player,
+         keys, doors, bananas, fields) = _HEADER.unpack_from(buffer)
+        if magic != MAGIC or order != _BYTE_ORDER:
+            raise ValueError("not a compiled level")
+        if format_version != FORMAT_VERSION or parser != parser_version:
+            raise ValueError("compiled by another version")
+        cells = size * size
+        distances = bin(fields & (DOOR_FIELD | KEY_FIELD)).count("1")
+        length = _HEADER.size + _padded(cells) + 4 * (keys + doors + bananas + cells + distances * cells)
+        if len(buffer) != length:
+            raise ValueError("compiled level of %d bytes instead of %d" % (len(buffer), length))
+
+        view = memoryview(buffer)
+        self._buffer = buffer
+        self.size = size
+        self.budget = budget
+        self.player = divmod(player, size)
+        offset = _HEADER.size
+        # the kind code of every cell, see ENTITY_KINDS of the game
+        self.kinds = view[offset:offset + cells]
+        offset += _padded(cells)
+        index = view[offset:offset + 4 * (keys + doors + bananas)].cast('I')
+        offset += 4 * (keys + doors + bananas)
+        self.keys = [divmod(cell, size) for cell in index[:keys]]
+        self.doors = [divmod(cell, size) for cell in index[keys:keys + doors]]
+        self.bananas = [divmod(cell, size) for cell in index[keys + doors:]]
+        self.regions = view[offset:offset + 4 * cells].cast('i')
+        offset += 4 * cells
+        self.door_distances = self.key_distances = None
+        if fields & DOOR_FIELD:
+            self.door_distances = view[offset:offset + 4 * cells].cast('i')
+            offset += 4 * cells
+        if fields & KEY_FIELD:
+            self.key_distances = view[offset:offset + 4 * cells].cast('i')
+
+
+def pack_level(parser_version, size, budget, player, kinds, keys, doors, bananas,
+               regions, door_distances=None, key_distances=None):
+    """Lays out the tables of a level as a compiled level.
+
+    Parameters:
+        parser_version (int): The version of the parser that compiled the level.
+        size (int): The width of the dungeon.
+        budget (int): The moves stored below the dungeon.
+        player (tuple<int, int>): Where the Player starts.
+        kinds (bytes-like): The kind code of every cell, row by row.
+        keys, doors, bananas (list<tuple<int, int>>): The positions of the special tiles.
+        regions (sequence<int>): The region of every cell.
+        door_distances, key_distances (sequence<int>): The distances of every
+            cell to the nearest door and on the way out through a key, None
+            if the level has no such field.
+
+    Returns:
+        (bytes): The compiled level.
+    """
+    fields = (DOOR_FIELD if door_distances is not None else 0) | (KEY_FIELD if key_distances is not None else 0)
+    cells = size * size
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, parser_version, _BYTE_ORDER, size, budget,
+                          player[0] * size + player[1], len(keys), len(doors), len(bananas), fields)
+    parts = [header, bytes(kinds), bytes(_padded(cells) - cells),
+             array.array('I', [row * size + col for row, col in (*keys, *doors, *bananas)]).tobytes(),
+             array.array('i', regions).tobytes()]
+    for distances in (door_distances, key_distances):
+        if distances is not None:
+            parts.append(array.array('i', distances).tobytes())
+    return b"".join(parts)
+
+
+class LevelCache:
+    """A directory of compiled levels, filled as levels are loaded.
+
+    It is safe to share between threads and processes.
+    """
+
+    def __init__(self, directory, compile_level, parser_version, size_limit=SIZE_LIMIT):
+        """
+        Parameters:
+            directory (str): Where the compiled levels are kept, created
+                when the first one is written.
+            compile_level (callable): Returns the compiled level of a level
+                text, see pack_level. It raises ValueError for a malformed level.
+            parser_version (int): The version of compile_level, bumped
+                whenever it would compile a text differently.
+            size_limit (int): The bytes of compiled levels kept in the
+                directory, see prune.
+        """
+        self._directory = directory
+        self._compile = compile_level
+        self._parser_version = parser_version
+        self._size_limit = size_limit
+        # the compiled levels mapped by this process, by the hash of their text
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def get_path(self, digest):
+        """Returns the file of the compiled level of a text hash."""
+        return os.path.join(self._directory, "%s-%d%s" % (digest, self._parser_version, EXTENSION))
+
+    def load(self, text):
+        """Returns the compiled level of a level text, compiling it only if it never was.
+
+        Parameters:
+            text (str): The text of a level file or saved game.
+
+        Returns:
+            (CompiledLevel): The compiled level, mapped from its file when it
+                could be read or written.
+
+        Raises:
+            ValueError: If the level is malformed.
+        """
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        compiled = self._loaded.get(digest)
+        if compiled is not None:
+            return compiled
+
+        path = self.get_path(digest)
+        try:
+            compiled = self._map(path)
+        except (OSError, ValueError):
+            # missing, cut short, or compiled by another version
+            compiled = None
+        if compiled is not None:
+            # the modification time orders the files by their last load, see prune
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            data = self._compile(text)
+            try:
+                self._write(path, data)
+                compiled = self._map(path)
+                self.prune(keep=path)
+            except (OSError, ValueError):
+                # a read-only or full disk only costs the next load a parse
+                compiled = CompiledLevel(data, self._parser_version)
+
+        with self._lock:
+            if len(self._loaded) >= LOADED_LIMIT:
+                self._loaded.clear()
+            self._loaded[digest] = compiled
+        return compiled
+
+    def prune(self, keep=None):
+        """Removes the compiled levels of other parser versions and the least recently loaded ones.
+
+        The files left, keep included, take no more than the size limit,
+        though keep itself is never removed. A removed file stays valid in
+        the processes that mapped it.
+
+        Parameters:
+            keep (str): The path of a file never removed, e.g. the one just written.
+        """
+        suffix = "-%d%s" % (self._parser_version, EXTENSION)
+        kept = []
+        try:
+            entries = os.scandir(self._directory)
+        except OSError:
+            return
+        with entries:
+            for entry in entries:
+                if not entry.name.endswith(EXTENSION) or entry.path == keep:
+                    continue
+                try:
+                    if entry.name.endswith(suffix):
+                        stat = entry.stat()
+                        kept.append((stat.st_mtime, stat.st_size, entry.path))
+                    else:
+                        os.remove(entry.path)
+                except OSError:
+                    # removed by another process meanwhile
+                    pass
+
+        total = sum(size for _, size, _ in kept)
+        if keep is not None:
+            try:
+                total += os.path.getsize(keep)
+            except OSError:
+                pass
+        for _, size, path in sorted(kept):
+            if total <= self._size_limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def _map(self, path):
+        """Maps the compiled level of a file."""
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return CompiledLevel(buffer, self._parser_version)
+
+    def _write(self, path, data):
+        """Writes a compiled level to a temporary file and renames it into place."""
+        os.makedirs(self._directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(suffix=".tmp", dir=self._directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except OSError:
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,219 @@
+"""Indexed archive holding many levels in a single file.
+
+A pack starts with a header and an index describing every level (name,
+offset, length, budget, dimensions and SHA-1 of its text), followed by the
+level texts themselves::
+
+    header: <4s magic> <u16 version> <u32 count> <u32 index size>
+    entry:  <u64 offset> <u32 length> <i32 budget> <u16 rows> <u16 cols>
+            <20s sha1> <u16 name length> <name>
+
+Opening a pack only reads the header and the index, so listing thousands of
+levels is cheap, and a level is then fetched with one seek and one read.
+
+Run ``python levelpack.py build levels.kcpack game1.txt game2.txt ...`` to
+build a pack and ``python levelpack.py list levels.kcpack`` to list one.
+"""
+import hashlib
+import os
+import struct
+import sys
+import threading
+
+
+MAGIC = b"KCPK"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHII")
+_ENTRY = struct.Struct("<QIiHH20sH")
+
+
+class PackEntry:
+    """The index entry of one level."""
+
+    __slots__ = ("name", "offset", "length", "budget", "rows", "cols", "digest")
+
+    def __init__(self, name, offset, length, budget, rows, cols, digest):
+        """
+        Parameters:
+            name (str): The ID of the level, usually its file name.
+            offset (int): Where the level text starts in the pack.
+            length (int): The size of the level text in bytes.
+            budget (int): The moves the player starts with.
+            rows (int): The height of the dungeon.
+            cols (int): The width of the dungeon.
+            digest (bytes): The SHA-1 of the level text.
+        """
+        self.name = name
+        self.offset = offset
+        self.length = length
+        self.budget = budget
+        self.rows = rows
+        self.cols = cols
+        self.digest = digest
+
+    def get_hash(self):
+        """Returns the SHA-1 of the level text as hex."""
+        return self.digest.hex()
+
+    def __repr__(self):
+        return f"PackEntry({self.name!r}, {self.rows}x{self.cols}, budget={self.budget})"
+
+
+class LevelPack:
+    """A level pack opened for reading."""
+
+    def __init__(self, path):
+        """Reads the index of a pack.
+
+        Parameters:
+            path (str): The path of the pack.
+
+        Raises:
+            ValueError: If the file is not a level pack of a known version.
+        """
+        self._path = path
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+        try:
+            magic, version, count, index_size = _HEADER.unpack(self._file.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} level pack")
+            index = self._file.read(index_size)
+        except (struct.error, ValueError):
+            self._file.close()
+            raise
+
+        self._entries = []
+        self._by_name = {}
+        self._by_hash = {}
+        position = 0
+        for _ in range(count):
+            offset, length, budget, rows, cols, digest, name_length = _ENTRY.unpack_from(index, position)
+            position += _ENTRY.size
+            name = index[position:position + name_length].decode()
+            position += name_length
+
+            entry = PackEntry(name, offset, length, budget, rows, cols, digest)
+            self._entries.append(entry)
+            self._by_name[name] = entry
+            self._by_hash.setdefault(digest.hex(), entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        """ """
+        self._file.close()
+
+    def get_path(self):
+        """ """
+        return self._path
+
+    def entries(self):
+        """Returns the index entries in pack order."""
+        return list(self._entries)
+
+    def find(self, level):
+        """Looks a level up by ID or by hex SHA-1 of its text.
+
+        Parameters:
+            level (str): The ID or hash of the level.
+
+        Returns:
+            (PackEntry): The index entry.
+
+        Raises:
+            KeyError: If the pack has no such level.
+        """
+        entry = self._by_name.get(level) or self._by_hash.get(level.lower())
+        if entry is None:
+            raise KeyError(f"{level!r} is not in {self._path}")
+        return entry
+
+    def read(self, level):
+        """Reads the text of a level.
+
+        Parameters:
+            level (str|PackEntry): The ID, hash or index entry of the level.
+
+        Returns:
+            (str): The level text, in the format of the level files.
+        """
+        entry = level if isinstance(level, PackEntry) else self.find(level)
+        with self._lock:
+            self._file.seek(entry.offset)
+            data = self._file.read(entry.length)
+        return data.decode()
+
+
+def write_pack(path, levels):
+    """Writes a level pack.
+
+    Parameters:
+        path (str): The path of the pack, replaced atomically.
+        levels (list<tuple<str, str, int, int, int>>): (name, text, budget,
+            rows, cols) of every level, in pack order.
+    """
+    blobs = [text.encode() for _, text, _, _, _ in levels]
+    names = [name.encode() for name, _, _, _, _ in levels]
+    index_size = sum(_ENTRY.size + len(name) for name in names)
+
+    offset = _HEADER.size + index_size
+    index = []
+    for (_, _, budget, rows, cols), name, blob in zip(levels, names, blobs):
+        index.append(_ENTRY.pack(offset, len(blob), budget, rows, cols, hashlib.sha1(blob).digest(), len(name)))
+        index.append(name)
+        offset += len(blob)
+
+    with open(path + ".tmp", 'wb') as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, len(levels), index_size))
+        file.write(b"".join(index))
+        for blob in blobs:
+            file.write(blob)
+    os.replace(path + ".tmp", path)
+
+
+def build_pack(path, filenames):
+    """Packs level files, taking their budgets the way GameLogic would.
+
+    Parameters:
+        path (str): The path of the pack.
+        filenames (list<str>): The level files, in pack order.
+    """
+    from KeyCaveAdventureGame import GAME_LEVELS, parse_game
+
+    levels = []
+    for filename in filenames:
+        with open(filename, 'r') as file:
+            text = file.read()
+        layout, level = parse_game(text.splitlines())
+        name = os.path.basename(filename)
+        levels.append((name, text, GAME_LEVELS.get(name, level), len(layout), len(layout[0])))
+    write_pack(path, levels)
+
+
+def main():
+    '''
+    to build or list level packs
+    :return:
+    '''
+    if len(sys.argv) >= 4 and sys.argv[1] == "build":
+        build_pack(sys.argv[2], sys.argv[3:])
+    elif len(sys.argv) == 3 and sys.argv[1] == "list":
+        with LevelPack(sys.argv[2]) as pack:
+            for entry in pack.entries():
+                print(f"{entry.name:30s} {entry.rows:4d}x{entry.cols:<4d} budget {entry.budget:4d}  {entry.get_hash()}")
+    else:
+        print(f"usage: {sys.argv[0]} build PACK LEVEL...\n       {sys.argv[0]} list PACK")
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""On-demand profiling of the running game.
+
+A ProfileCapture profiles the thread that starts it until it is stopped,
+either deterministically with cProfile or by sampling its stack every few
+milliseconds of CPU time, which costs the game far less. The samples are
+taken by a SIGPROF handler on the profiled thread itself: a sampler on
+another thread could only run when the profiled one releases the GIL, in
+system calls and Tcl calls, and would miss the pure Python functions.
+Signals are handled on the main thread, so only the main thread can be
+sampled, and only where signal.setitimer exists; elsewhere only cProfile
+is offered, see MODES. Nothing is installed until a capture starts, and
+everything is removed when it stops, so the game runs at full speed
+otherwise.
+
+A cProfile capture is saved as a .prof file that pstats, snakeviz or
+gprof2dot read. A sampling capture is saved as .folded text, one
+``outer;inner;leaf count`` line per stack, which flamegraph.pl and
+speedscope read.
+"""
+import collections
+import cProfile
+import os
+import pstats
+import signal
+import threading
+import time
+
+
+CPROFILE = "cprofile"
+SAMPLING = "sampling"
+
+# the profilers of this platform, sampling needs interval timers
+MODES = (SAMPLING, CPROFILE) if hasattr(signal, "setitimer") else (CPROFILE,)
+
+# seconds of CPU time between two samples of a sampling capture
+SAMPLE_INTERVAL = 0.005
+
+
+class ProfileCapture:
+    """A profile of one thread over a stretch of time."""
+
+    def __init__(self, mode=SAMPLING, interval=SAMPLE_INTERVAL):
+        """
+        Parameters:
+            mode (str): One of MODES.
+            interval (float): Seconds of CPU time between two samples of a
+                sampling capture.
+
+        Raises:
+            ValueError: If mode is unknown or not available on this platform.
+        """
+        if mode not in MODES:
+            raise ValueError(f"unknown profiler {mode!r}")
+        self._mode = mode
+        self._interval = interval
+        self._profile = None
+        # the SIGPROF handler replaced while sampling, None when not sampling
+        self._handler = None
+        # the samples of every stack, outermost frame first, of a sampling capture
+        self._stacks = collections.Counter()
+        self._started = None
+        self._seconds = 0.0
+
+    def get_mode(self):
+        """ """
+        return self._mode
+
+    def get_seconds(self):
+        """Returns how long the capture ran."""
+        return self._seconds
+
+    def start(self):
+        """Starts profiling the calling thread.
+
+        Raises:
+            ValueError: If a sampling capture is started off the main thread.
+        """
+        if self._mode == SAMPLING:
+            if threading.current_thread() is not threading.main_thread():
+                raise ValueError("only the main thread can be sampled")
+            self._handler = signal.signal(signal.SIGPROF, self._sample) or signal.SIG_DFL
+            signal.setitimer(signal.ITIMER_PROF, self._interval, self._interval)
+        self._started = time.perf_counter()
+        if self._mode == CPROFILE:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self):
+        """Stops profiling. It must be called on the thread that started the capture."""
+        if self._profile is not None:
+            self._profile.disable()
+        if self._handler is not None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._handler)
+            self._handler = None
+        self._seconds = time.perf_counter() - self._started
+
+    def _sample(self, signum, frame):
+        """Records the stack the profiled thread was interrupted in, the SIGPROF handler."""
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        if stack:
+            self._stacks[tuple(reversed(stack))] += 1
+
+    def save(self, directory):
+        """Writes the capture to a new file, named by the time it is written.
+
+        Parameters:
+            directory (str): Where the file is written, created if needed.
+
+        Returns:
+            (str): The path of the .prof or .folded file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = time.strftime("profile-%Y%m%d-%H%M%S")
+        if self._mode == CPROFILE:
+            path = os.path.join(directory, name + ".prof")
+            self._profile.dump_stats(path)
+            return path
+
+        path = os.path.join(directory, name + ".folded")
+        with open(path, 'w') as file:
+            for stack, count in self._stacks.most_common():
+                file.write("%s %d\n" % (";".join(label(*function) for function in stack), count))
+        return path
+
+    def hot_functions(self, count=10, prefix=None):
+        """Returns the functions the most time was spent in, including their calls.
+
+        Parameters:
+            count (int): The number of functions returned.
+            prefix (str): Only the functions of the files under this path,
+                e.g. the directory of the game, all of them if None.
+
+        Returns:
+            (list<tuple<str, float, float>>): The label of every function,
+                the seconds spent in it and the seconds spent in it and its
+                calls, by the latter.
+        """
+        totals = self._totals()
+        if prefix is not None:
+            totals = {function: times for function, times in totals.items() if function[0].startswith(prefix)}
+        hottest = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:count]
+        return [(label(*function), own, total) for function, (own, total) in hottest]
+
+    def _totals(self):
+        """Returns the seconds spent in every function and in it and its calls.
+
+        Returns:
+            (dict<tuple<str, int, str>: tuple<float, float>>): The times by
+                (file, line, name) of the function.
+        """
+        if self._mode == CPROFILE:
+            stats = pstats.Stats(self._profile).stats
+            return {function: (own, total) for function, (_, _, own, total, _) in stats.items()}
+
+        # every sample stands for an interval of CPU time
+        seconds = self._interval
+        totals = collections.defaultdict(lambda: [0.0, 0.0])
+        for stack, count in self._stacks.items():
+            totals[stack[-1]][0] += count * seconds
+            # a recursive function is counted once per stack
+            for function in set(stack):
+                totals[function][1] += count * seconds
+        return {function: tuple(times) for function, times in totals.items()}
+
+
+def label(filename, line, name):
+    """Returns how a function is shown in the reports, e.g. "transfer_board (KeyCaveAdventureGame.py:3140)"."""
+    if filename == "~":
+        # the built-in functions of cProfile
+        return name
+    return "%s (%s:%d)" % (name, os.path.basename(filename), line)
@@ -0,0 +1,356 @@
+"""Offscreen rendering of level thumbnails and replay GIFs.
+
+BoardImage draws the board of a headless GameLogic with the sprites of
+images/ onto a PIL image, without opening a window. The sprites are scaled,
+laid over the floor tile and mapped to one shared palette once per tile size
+and process. Every frame reuses the same image and only pastes the tiles
+whose sprite changed since the previous frame, so a replay costs a couple of
+pastes per move and its GIF needs no colour quantisation. Many levels are
+rendered over a process pool.
+
+Run ``python render.py thumbnails game1.txt levels.kcpack --out thumbnails``
+to write a PNG of every level of the files and packs, or
+``python render.py replay game2.txt --moves DDSSAW --out replays`` to
+animate runs; without --moves the MASTERS hints are played. It must be run
+from the directory of the game, where its images are.
+"""
+import argparse
+import concurrent.futures
+import os
+import time
+
+from PIL import Image
+
+from KeyCaveAdventureGame import GameLogic, HintEngine, CanvasBoardRenderer, SpriteCache, BOARD_SPRITES
+from levelpack import LevelPack
+
+
+THUMBNAILS = "thumbnails"
+REPLAY = "replay"
+
+# the default width of a tile of a thumbnail and of a replay, one of SPRITE_SIZES
+THUMBNAIL_TILE = 10
+REPLAY_TILE = 25
+
+# milliseconds every frame of a replay is shown, and its last frame
+FRAME_TIME = 150
+LAST_FRAME_TIME = 1500
+
+# the most moves of a replay played along the hints
+HINT_MOVES = 500
+
+# the tiles of every tile size, the empty boards of every size and the opened level packs, kept per process
+_TILES = {}
+_FLOORS = {}
+_PACKS = {}
+
+
+def board_tiles(tile_size):
+    """Returns the board sprites at a size, laid over the floor tile.
+
+    All of them share the palette of the first one, so they can be pasted
+    onto one palette image.
+
+    Parameters:
+        tile_size (int): The width of a tile in pixels.
+
+    Returns:
+        (dict<str: Image>): The palette tiles by sprite name, see BOARD_SPRITES.
+    """
+    tiles = _TILES.get(tile_size)
+    if tiles is None:
+        floor = SpriteCache.render('empty', tile_size).convert('RGBA')
+        strip = Image.new('RGB', (tile_size * len(BOARD_SPRITES), tile_size))
+        for index, name in enumerate(BOARD_SPRITES):
+            sprite = SpriteCache.render(name, tile_size).convert('RGBA')
+            strip.paste(Image.alpha_composite(floor, sprite).convert('RGB'), (index * tile_size, 0))
+        strip = strip.quantize(256)
+        tiles = _TILES[tile_size] = {name: strip.crop((index * tile_size, 0, (index + 1) * tile_size, tile_size))
+                                     for index, name in enumerate(BOARD_SPRITES)}
+    return tiles
+
+
+def floor_image(size, tile_size):
+    """Returns the image of an empty board, which must not be changed.
+
+    Parameters:
+        size (int): The width of the board in tiles.
+        tile_size (int): The width of a tile in pixels.
+
+    Returns:
+        (Image): The palette image of the floor tile on every cell.
+    """
+    floor = _FLOORS.get((size, tile_size))
+    if floor is None:
+        tile = board_tiles(tile_size)['empty']
+        row = Image.new('P', (size * tile_size, tile_size))
+        row.putpalette(tile.getpalette())
+        for col in range(size):
+            row.paste(tile, (col * tile_size, 0))
+        floor = _FLOORS[(size, tile_size)] = Image.new('P', (size * tile_size, size * tile_size))
+        floor.putpalette(tile.getpalette())
+        for line in range(size):
+            floor.paste(row, (0, line * tile_size))
+    return floor
+
+
+class BoardImage:
+    """The image of the board of a game, kept up to date frame by frame."""
+
+    def __init__(self, game, tile_size=REPLAY_TILE):
+        """
+        Parameters:
+            game (GameLogic): The game drawn.
+            tile_size (int): The width of a tile in pixels.
+        """
+        self._game = game
+        self._tile_size = tile_size
+        self._tiles = board_tiles(tile_size)
+        size = game.get_dungeon_size()
+        # the board starts out empty, so a full draw only pastes the entities and the Player
+        self._image = floor_image(size, tile_size).copy()
+        # the sprite shown on every cell, row by row
+        self._drawn = ['empty'] * (size * size)
+
+    def draw(self, cells=None):
+        """Pastes the tiles whose sprite changed since they were last drawn.
+
+        Parameters:
+            cells (iterable<tuple<int, int>>): The (row, column) of the tiles
+                that may have changed, e.g. the cells a move left and
+                entered. The tiles of the entities and the Player if None,
+                which draws a board that was never drawn.
+
+        Returns:
+            (int): The number of tiles pasted.
+        """
+        game = self._game
+        size = game.get_dungeon_size()
+        if cells is None:
+            cells = [*game.get_game_information(), game.get_player().get_position()]
+        pasted = 0
+        for row, col in cells:
+            name = CanvasBoardRenderer.sprite_name(game, (row, col))
+            cell = row * size + col
+            if self._drawn[cell] != name:
+                self._drawn[cell] = name
+                self._image.paste(self._tiles[name], (col * self._tile_size, row * self._tile_size))
+                pasted += 1
+        return pasted
+
+    def get_image(self):
+        """Returns the image, which the next draw changes."""
+        return self._image
+
+    def frame(self):
+        """Returns a copy of the image as it is now."""
+        return self._image.copy()
+
+
+def open_level(source):
+    """Loads a level from a level file or a level pack.
+
+    Parameters:
+        source (str | tuple<str, str>): The level file, or the path of a
+            level pack and the ID of a level in it.
+
+    Returns:
+        (GameLogic): The level.
+
+    Raises:
+        ValueError: If the level is malformed.
+        OSError: If the level cannot be read.
+    """
+    if isinstance(source, str):
+        return GameLogic(source)
+    path, level = source
+    pack = _PACKS.get(path)
+    if pack is None:
+        pack = _PACKS[path] = LevelPack(path)
+    return GameLogic.from_pack(pack, level)
+
+
+def hint_moves(game, limit=HINT_MOVES):
+    """Returns the moves the hints give from the state of a game, played on a copy of it.
+
+    Parameters:
+        game (GameLogic): The game.
+        limit (int): The most moves returned.
+
+    Returns:
+        (str): The directions, up to the win or the loss.
+    """
+    game = GameLogic.from_state(game.to_state())
+    engine = HintEngine(game)
+    moves = []
+    while len(moves) < limit and not game.won() and not game.check_game_over():
+        direction = engine.hint()
+        if direction is None:
+            break
+        game.play_move(direction)
+        moves.append(direction)
+    return "".join(moves)
+
+
+def replay_frames(game, moves, tile_size=REPLAY_TILE):
+    """Plays moves on a game and yields a frame before them and after each of them.
+
+    Play stops once the game is won or lost.
+
+    Parameters:
+        game (GameLogic): The game, which is played on.
+        moves (str): The directions to play.
+        tile_size (int): The width of a tile in pixels.
+
+    Yields:
+        (Image): The frames.
+    """
+    board = BoardImage(game, tile_size)
+    board.draw()
+    yield board.frame()
+    player = game.get_player()
+    for direction in moves.upper():
+        if game.won() or game.check_game_over():
+            break
+        before = player.get_position()
+        if game.play_move(direction):
+            board.draw((before, player.get_position()))
+            yield board.frame()
+
+
+def save_gif(frames, path, frame_time=FRAME_TIME):
+    """Writes frames as an animated GIF that loops, holding the last frame longer.
+
+    Parameters:
+        frames (iterable<Image>): The frames, at least one.
+        path (str): The GIF file.
+        frame_time (int): The milliseconds a frame is shown.
+    """
+    first, *rest = frames
+    durations = [frame_time] * len(rest) + [LAST_FRAME_TIME]
+    first.save(path, save_all=True, append_images=rest, duration=durations, loop=0)
+
+
+def render_thumbnail(source, path, tile_size=THUMBNAIL_TILE):
+    """Writes the PNG of a level in its starting state.
+
+    Parameters:
+        source (str | tuple<str, str>): The level, see open_level.
+        path (str): The PNG file.
+        tile_size (int): The width of a tile in pixels.
+    """
+    board = BoardImage(open_level(source), tile_size)
+    board.draw()
+    board.get_image().save(path)
+
+
+def render_replay(source, path, moves=None, tile_size=REPLAY_TILE, frame_time=FRAME_TIME):
+    """Writes the GIF of a run of a level from its starting state.
+
+    Parameters:
+        source (str | tuple<str, str>): The level, see open_level.
+        path (str): The GIF file.
+        moves (str): The directions played, the hints if None.
+        tile_size (int): The width of a tile in pixels.
+        frame_time (int): The milliseconds a move is shown.
+    """
+    game = open_level(source)
+    if moves is None:
+        moves = hint_moves(game)
+    save_gif(replay_frames(game, moves, tile_size), path, frame_time)
+
+
+def _render(job):
+    """Runs one job of render_all, returning its error instead of raising it."""
+    function, args = job
+    try:
+        function(*args)
+    except (OSError, ValueError, KeyError) as e:
+        return "%s: %s" % (type(e).__name__, e)
+    return None
+
+
+def render_all(function, jobs, workers=None):
+    """Renders many images over a pool of worker processes.
+
+    Every worker scales the sprites and opens the level packs once and then
+    renders its share of the jobs, which are handed out in chunks.
+
+    Parameters:
+        function (callable): render_thumbnail or render_replay.
+        jobs (list<tuple>): The arguments of every call of function.
+        workers (int): The number of processes, one per core if None. With
+            1 the jobs are rendered in this process.
+
+    Returns:
+        (list<str>): The error of every job, None for the ones rendered.
+    """
+    jobs = [(function, args) for args in jobs]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        return [_render(job) for job in jobs]
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_render, jobs, chunksize=max(1, len(jobs) // (workers * 8))))
+
+
+def level_sources(paths):
+    """Lists the levels of level files and packs.
+
+    Parameters:
+        paths (list<str>): Level files and level packs, which end in .kcpack.
+
+    Returns:
+        (list<tuple<str | tuple<str, str>, str>>): The source of every level,
+            see open_level, and a name for its image.
+    """
+    sources = []
+    for path in paths:
+        if path.endswith(".kcpack"):
+            with LevelPack(path) as pack:
+                prefix = os.path.splitext(os.path.basename(path))[0]
+                sources += [((path, entry.name), prefix + "-" + os.path.splitext(entry.name)[0])
+                            for entry in pack.entries()]
+        else:
+            sources.append((path, os.path.splitext(os.path.basename(path))[0]))
+    return sources
+
+
+def main():
+    '''
+    to render thumbnails or replays of levels into a directory
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description="Offscreen level thumbnails and replay GIFs.")
+    parser.add_argument("command", choices=[THUMBNAILS, REPLAY])
+    parser.add_argument("levels", nargs="+", help="level files and level packs (.kcpack)")
+    parser.add_argument("--out", default=".", help="the directory the images are written to")
+    parser.add_argument("--tile", type=int, default=None, help="pixels per tile")
+    parser.add_argument("--moves", default=None, help="the directions of the replays, the hints by default")
+    parser.add_argument("--frame", type=int, default=FRAME_TIME, help="milliseconds per move of the replays")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    sources = level_sources(args.levels)
+    if args.command == THUMBNAILS:
+        function = render_thumbnail
+        jobs = [(source, os.path.join(args.out, name + ".png"), args.tile or THUMBNAIL_TILE)
+                for source, name in sources]
+    else:
+        function = render_replay
+        jobs = [(source, os.path.join(args.out, name + ".gif"), args.moves, args.tile or REPLAY_TILE, args.frame)
+                for source, name in sources]
+
+    start = time.perf_counter()
+    errors = render_all(function, jobs, args.workers)
+    seconds = time.perf_counter() - start
+    for (source, name), error in zip(sources, errors):
+        if error is not None:
+            print("%s: %s" % (name, error))
+    rendered = errors.count(None)
+    print("%d of %d images in %.2f s, %.1f ms each" % (rendered, len(jobs), seconds,
+                                                      1000 * seconds / max(1, rendered)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,446 @@
+"""Leaderboard analytics over any number of score logs.
+
+Score logs hold one ``name:seconds:level`` record per line, the format the
+game appends to high_scores.txt (older records have no level). The logs are
+streamed line by line, plain or gzip compressed, and every player and level
+gets its count, best and worst time and a quantile sketch of its times.
+
+The sketch keeps counts in logarithmic buckets, so its size only depends on
+the range of the times and not on how many were seen, every percentile it
+reports is within 1% of the true time, and two sketches are merged by adding
+their buckets. Summaries written by this module keep their sketches, so the
+summaries of many machines can be merged without the logs they came from.
+
+The game reads the summary for its High Scores dialog and adds every new
+record to it, see update_summary.
+
+Run ``python score_analytics.py high_scores.txt scores-*.txt.gz -o high_scores_summary.json``;
+summaries (``.json``) given as inputs are merged in.
+"""
+import argparse
+import gzip
+import heapq
+import json
+import math
+import os
+
+
+SUMMARY_VERSION = 1
+SUMMARY_FILE = "high_scores_summary.json"
+
+# the level of the records written before the level was logged
+UNKNOWN_LEVEL = ""
+
+PERCENTILES = (50, 90, 99)
+RELATIVE_ACCURACY = 0.01
+TOP_SCORES = 10
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class QuantileSketch:
+    """A mergeable sketch of the quantiles of non-negative numbers.
+
+    A number x > 0 is counted in bucket ceil(log(x) / log(gamma)), so every
+    bucket spans a relative range of gamma and the middle of a bucket is
+    within the relative accuracy of every number in it.
+    """
+
+    def __init__(self, relative_accuracy=RELATIVE_ACCURACY):
+        """
+        Parameters:
+            relative_accuracy (float): The largest relative error of a quantile.
+        """
+        self._accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets = {}
+        self._zeros = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, value, count=1):
+        """Counts a number.
+
+        Parameters:
+            value (float): The number, at least 0.
+            count (int): How many times it is counted.
+        """
+        if value <= 0:
+            self._zeros += count
+        else:
+            bucket = math.ceil(math.log(value) / self._log_gamma)
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + count
+        self._count += count
+
+    def merge(self, other):
+        """Adds the numbers counted by another sketch of the same accuracy.
+
+        Parameters:
+            other (QuantileSketch): The other sketch.
+
+        Raises:
+            ValueError: If the sketches have different accuracies.
+        """
+        if other._accuracy != self._accuracy:
+            raise ValueError("sketches of different accuracies cannot be merged")
+        for bucket, count in other._buckets.items():
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + count
+        self._zeros += other._zeros
+        self._count += other._count
+
+    def quantile(self, q):
+        """Returns a number whose rank is q among the counted numbers.
+
+        Parameters:
+            q (float): The rank, between 0 and 1.
+
+        Returns:
+            (float): The number, or None if nothing was counted.
+        """
+        if not self._count:
+            return None
+        rank = q * (self._count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if rank < seen:
+                return 2 * self._gamma ** bucket / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._buckets) / (self._gamma + 1)
+
+    def to_dict(self):
+        """ """
+        return {"accuracy": self._accuracy, "zeros": self._zeros,
+                "buckets": {str(bucket): count for bucket, count in self._buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restores a sketch serialised by to_dict."""
+        sketch = cls(data["accuracy"])
+        sketch._zeros = data["zeros"]
+        sketch._buckets = {int(bucket): count for bucket, count in data["buckets"].items()}
+        sketch._count = sketch._zeros + sum(sketch._buckets.values())
+        return sketch
+
+
+class ScoreStats:
+    """The count, best and worst time and quantile sketch of a player or level."""
+
+    def __init__(self):
+        """ """
+        self.count = 0
+        self.best = None
+        self.worst = None
+        self.total = 0
+        self.sketch = QuantileSketch()
+
+    def add(self, seconds):
+        """Counts a time.
+
+        Parameters:
+            seconds (int): The time of a won game.
+        """
+        self.count += 1
+        self.total += seconds
+        self.best = seconds if self.best is None else min(self.best, seconds)
+        self.worst = seconds if self.worst is None else max(self.worst, seconds)
+        self.sketch.add(seconds)
+
+    def merge(self, other):
+        """Adds the times counted by other.
+
+        Parameters:
+            other (ScoreStats): The other stats.
+        """
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.best = other.best if self.best is None else min(self.best, other.best)
+        self.worst = other.worst if self.worst is None else max(self.worst, other.worst)
+        self.sketch.merge(other.sketch)
+
+    def percentile(self, percent):
+        """Returns the time a percentage of the games were won within, to 1%.
+
+        The exact best and worst times bound the estimate.
+
+        Parameters:
+            percent (float): The percentage, between 0 and 100.
+
+        Returns:
+            (float): The time, or None if nothing was counted.
+        """
+        value = self.sketch.quantile(percent / 100)
+        return None if value is None else min(max(value, self.best), self.worst)
+
+    def to_dict(self):
+        """Serialises the stats with their percentiles, which from_dict ignores."""
+        data = {"count": self.count, "best": self.best, "worst": self.worst, "total": self.total,
+                "sketch": self.sketch.to_dict()}
+        for percent in PERCENTILES:
+            value = self.percentile(percent)
+            data["p%d" % percent] = None if value is None else round(value, 1)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restores stats serialised by to_dict."""
+        stats = cls()
+        stats.count = data["count"]
+        stats.best = data["best"]
+        stats.worst = data["worst"]
+        stats.total = data["total"]
+        stats.sketch = QuantileSketch.from_dict(data["sketch"])
+        return stats
+
+
+class ScoreSummary:
+    """The stats of every player and level and the best records overall."""
+
+    def __init__(self, top=TOP_SCORES):
+        """
+        Parameters:
+            top (int): How many of the best records are kept.
+        """
+        self._top = top
+        # the best records as (-seconds, name, level), the worst of them first
+        self._best = []
+        self.players = {}
+        self.levels = {}
+        self.skipped = 0
+
+    def __len__(self):
+        return sum(stats.count for stats in self.levels.values())
+
+    def add(self, name, seconds, level=UNKNOWN_LEVEL):
+        """Counts a record.
+
+        Parameters:
+            name (str): The name of the winner.
+            seconds (int): The time of the won game.
+            level (str): The level that was won.
+        """
+        for stats_by_key, key in ((self.players, name), (self.levels, level)):
+            stats = stats_by_key.get(key)
+            if stats is None:
+                stats = stats_by_key[key] = ScoreStats()
+            stats.add(seconds)
+        record = (-seconds, name, level)
+        if len(self._best) < self._top:
+            heapq.heappush(self._best, record)
+        elif record > self._best[0]:
+            heapq.heapreplace(self._best, record)
+
+    def add_line(self, line):
+        """Counts a line of a score log, lines that are not records are skipped.
+
+        Parameters:
+            line (str): A ``name:seconds`` or ``name:seconds:level`` line.
+        """
+        record = parse_record(line)
+        if record is None:
+            if line.strip():
+                self.skipped += 1
+        else:
+            self.add(*record)
+
+    def merge(self, other):
+        """Adds the records counted by another summary.
+
+        Parameters:
+            other (ScoreSummary): The other summary.
+        """
+        for name, stats in other.players.items():
+            self.players.setdefault(name, ScoreStats()).merge(stats)
+        for level, stats in other.levels.items():
+            self.levels.setdefault(level, ScoreStats()).merge(stats)
+        for record in other._best:
+            if len(self._best) < self._top:
+                heapq.heappush(self._best, record)
+            elif record > self._best[0]:
+                heapq.heapreplace(self._best, record)
+        self.skipped += other.skipped
+
+    def best(self, count=None):
+        """Returns the best records, fastest first.
+
+        Parameters:
+            count (int): How many records, all of the kept ones by default.
+
+        Returns:
+            (list<tuple<str, int, str>>): (name, seconds, level) of the records.
+        """
+        records = sorted(self._best, key=lambda record: (-record[0], record[1], record[2]))
+        return [(name, -seconds, level) for seconds, name, level in records[:count]]
+
+    def to_dict(self):
+        """ """
+        return {
+            "version": SUMMARY_VERSION,
+            "records": len(self),
+            "skipped": self.skipped,
+            "best": [[name, seconds, level] for name, seconds, level in self.best()],
+            "levels": {level: stats.to_dict() for level, stats in sorted(self.levels.items())},
+            "players": {name: stats.to_dict() for name, stats in sorted(self.players.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Restores a summary serialised by to_dict.
+
+        Raises:
+            ValueError: If the summary was written by another version.
+        """
+        if data.get("version") != SUMMARY_VERSION:
+            raise ValueError("not a version %d score summary" % SUMMARY_VERSION)
+        summary = cls()
+        summary.skipped = data["skipped"]
+        summary.players = {name: ScoreStats.from_dict(stats) for name, stats in data["players"].items()}
+        summary.levels = {level: ScoreStats.from_dict(stats) for level, stats in data["levels"].items()}
+        for name, seconds, level in data["best"]:
+            summary._best.append((-seconds, name, level))
+        heapq.heapify(summary._best)
+        return summary
+
+
+def parse_record(line):
+    """Parses a line of a score log.
+
+    Names may contain colons, so a line is only read as a record without a
+    level if its second to last field is not a number.
+
+    Parameters:
+        line (str): A ``name:seconds`` or ``name:seconds:level`` line.
+
+    Returns:
+        (tuple<str, int, str>): The name, seconds and level, or None if the
+            line is not a record.
+    """
+    fields = line.rstrip("\r\n").split(":")
+    if len(fields) >= 3 and fields[-2].strip().isdigit():
+        name, seconds, level = ":".join(fields[:-2]), fields[-2], fields[-1]
+    elif len(fields) >= 2 and fields[-1].strip().isdigit():
+        name, seconds, level = ":".join(fields[:-1]), fields[-1], UNKNOWN_LEVEL
+    else:
+        return None
+    return name, int(seconds), level
+
+
+def open_log(path):
+    """Opens a score log for reading text, decompressing it if it is gzipped."""
+    with open(path, 'rb') as file:
+        compressed = file.read(2) == _GZIP_MAGIC
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def read_summary(path):
+    """Reads a summary written by write_summary.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not a score summary.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        return ScoreSummary.from_dict(json.load(file))
+
+
+def summarize(paths):
+    """Streams score logs and summaries into one summary.
+
+    Parameters:
+        paths (list<str>): Score logs, plain or gzipped, and summaries, by
+            their .json extension.
+
+    Returns:
+        (ScoreSummary): The summary of every record.
+    """
+    summary = ScoreSummary()
+    for path in paths:
+        if path.endswith(".json"):
+            summary.merge(read_summary(path))
+            continue
+        with open_log(path) as file:
+            for line in file:
+                summary.add_line(line)
+    return summary
+
+
+def write_summary(summary, path):
+    """Writes a summary, replacing the file atomically.
+
+    Parameters:
+        summary (ScoreSummary): The summary.
+        path (str): The file.
+    """
+    with open(path + ".tmp", 'w', encoding='utf-8') as file:
+        json.dump(summary.to_dict(), file, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+
+def update_summary(path, log, records):
+    """Adds new records to a summary, building it from its log if it is missing.
+
+    Parameters:
+        path (str): The summary.
+        log (str): The score log the records were appended to.
+        records (list<tuple<str, int, str>>): The new (name, seconds, level) records.
+    """
+    try:
+        summary = read_summary(path)
+    except (OSError, ValueError, KeyError):
+        # the log already holds the new records
+        summary = summarize([log]) if os.path.exists(log) else ScoreSummary()
+    else:
+        for record in records:
+            summary.add(*record)
+    write_summary(summary, path)
+
+
+def format_time(seconds):
+    """Formats seconds as minutes and seconds."""
+    if seconds is None:
+        return "-"
+    seconds = int(round(seconds))
+    return "%d m %02d s" % (seconds // 60, seconds % 60)
+
+
+def print_table(title, stats_by_key, limit):
+    """Prints the stats of the players or levels with the most records."""
+    print("\n%-24s %7s %9s %9s %9s %9s" % (title, "count", "best", "p50", "p90", "p99"))
+    ranked = sorted(stats_by_key.items(), key=lambda item: (-item[1].count, item[0]))
+    for key, stats in ranked[:limit]:
+        print("%-24s %7d %9s %9s %9s %9s" % (key or "(unknown)", stats.count, format_time(stats.best),
+                                              *(format_time(stats.percentile(percent)) for percent in PERCENTILES)))
+
+
+def main():
+    '''
+    to summarize score logs into a summary file and print it
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description="Leaderboard analytics over score logs.")
+    parser.add_argument("paths", nargs="+", help="score logs, plain or gzipped, and summaries (.json) to merge")
+    parser.add_argument("-o", "--output", default=SUMMARY_FILE, help="the summary to write")
+    parser.add_argument("--limit", type=int, default=20, help="rows of the printed tables")
+    args = parser.parse_args()
+
+    summary = summarize(args.paths)
+    write_summary(summary, args.output)
+
+    print("%d records, %d lines skipped, summary written to %s" % (len(summary), summary.skipped, args.output))
+    print("\nBest times:")
+    for place, (name, seconds, level) in enumerate(summary.best(), 1):
+        print("%3d. %-24s %9s  %s" % (place, name, format_time(seconds), level))
+    print_table("Level", summary.levels, args.limit)
+    print_table("Player", summary.players, args.limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,477 @@
+"""Sharded session host for running many headless games on one machine.
+
+Game sessions are spread over a pool of worker processes (shards) by their
+session ID. A single front door owns the pipes to the shards, groups the
+requests of every shard into one batch per round trip and routes replies
+back, so the shards run in parallel while the front door only routes
+messages. Sessions can be moved between shards by shipping their serialised
+GameLogic state.
+
+Run ``python session_host.py --bench`` for a throughput benchmark over one
+to all cores, or ``python session_host.py --serve PATH`` to accept JSON line
+requests from local clients on a Unix socket.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import time
+import zlib
+
+from KeyCaveAdventureGame import GameLogic, DIRECTIONS
+
+
+OPEN = "open"
+MOVE = "move"
+STATE = "state"
+EXPORT = "export"
+IMPORT = "import"
+CLOSE = "close"
+
+
+class SessionError(Exception):
+    """Raised by the front door when a shard rejects a request."""
+
+
+def _handle(sessions, op, session_id, arg):
+    """Executes one request against the sessions of a shard.
+
+    Parameters:
+        sessions (dict<str: GameLogic>): The sessions owned by the shard.
+        op (str): The name of the operation.
+        session_id (str): The session the request is for.
+        arg: The argument of the operation.
+
+    Returns:
+        The result of the operation.
+    """
+    if op == OPEN:
+        sessions[session_id] = GameLogic(arg)
+        return _summary(sessions[session_id])
+    if op == IMPORT:
+        sessions[session_id] = GameLogic.from_state(arg)
+        return _summary(sessions[session_id])
+
+    game = sessions[session_id]
+    if op == MOVE:
+        # in either case, a character that is not a direction fails the request
+        game.apply_moves(arg)
+        return _summary(game)
+    if op == STATE:
+        return game.to_state()
+    if op == EXPORT:
+        return sessions.pop(session_id).to_state()
+    if op == CLOSE:
+        del sessions[session_id]
+        return None
+
+    raise ValueError(f"Unknown operation {op!r}")
+
+
+def _summary(game):
+    """Returns the (position, moves left, won, over, state hash) summary of a game.
+
+    Clients that predict moves locally compare the hash, as hex, with
+    GameLogic.get_hash of their copy to detect that it diverged.
+    """
+    player = game.get_player()
+    return (player.get_position(), player.moves_remaining(), game.won(),
+            game.won() or game.check_game_over(), "%016x" % game.get_hash())
+
+
+def _serve_shard(conn):
+    """Main loop of a shard process.
+
+    Every message is a batch of (op, session_id, arg) requests and is
+    answered by a list of (ok, result) pairs in the same order. None shuts
+    the shard down.
+
+    Parameters:
+        conn (multiprocessing.connection.Connection): The pipe to the front door.
+    """
+    sessions = {}
+    while True:
+        batch = conn.recv()
+        if batch is None:
+            break
+
+        replies = []
+        for op, session_id, arg in batch:
+            try:
+                replies.append((True, _handle(sessions, op, session_id, arg)))
+            except Exception as e:
+                replies.append((False, f"{e.__class__.__name__}: {e}"))
+        conn.send(replies)
+    conn.close()
+
+
+class SessionHost:
+    """Front door of a pool of shard processes."""
+
+    def __init__(self, workers=None):
+        """Starts the shard processes.
+
+        Parameters:
+            workers (int): The number of shards, one per core by default.
+        """
+        self._workers = workers or os.cpu_count() or 1
+        self._conns = []
+        self._processes = []
+        self._placement = {}
+
+        for _ in range(self._workers):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_shard, args=(child,), daemon=True)
+            process.start()
+            child.close()
+            self._conns.append(parent)
+            self._processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_workers(self):
+        """ """
+        return self._workers
+
+    def shard_of(self, session_id):
+        """Returns the shard owning a session.
+
+        New sessions are placed by a stable hash of their ID, so every
+        front door started with the same number of shards agrees on it.
+
+        Parameters:
+            session_id (str): The ID of the session.
+
+        Returns:
+            (int): The index of the shard.
+        """
+        shard = self._placement.get(session_id)
+        if shard is None:
+            shard = zlib.crc32(session_id.encode()) % self._workers
+        return shard
+
+    def call_many(self, requests):
+        """Executes a list of requests, one batch per shard.
+
+        All batches are sent before any reply is read, so the shards work
+        on them in parallel.
+
+        Parameters:
+            requests (list<tuple<str, str, object>>): (op, session_id, arg)
+                triples.
+
+        Returns:
+            (list): The results, in the order of the requests.
+
+        Raises:
+            SessionError: If any request failed in its shard.
+        """
+        batches = [[] for _ in range(self._workers)]
+        slots = [[] for _ in range(self._workers)]
+        for index, (op, session_id, arg) in enumerate(requests):
+            shard = self.shard_of(session_id)
+            batches[shard].append((op, session_id, arg))
+            slots[shard].append(index)
+
+        for shard, batch in enumerate(batches):
+            if batch:
+                self.send_batch(shard, batch)
+
+        results = [None] * len(requests)
+        errors = []
+        for shard, batch in enumerate(batches):
+            if not batch:
+                continue
+            done = []
+            for request, index, (ok, result) in zip(batch, slots[shard], self.receive_replies(shard)):
+                if ok:
+                    results[index] = result
+                    done.append(request)
+                else:
+                    errors.append(f"{requests[index][1]}: {result}")
+            self.record(done)
+
+        if errors:
+            raise SessionError("; ".join(errors))
+        return results
+
+    def call(self, op, session_id, arg=None):
+        """Executes a single request. See call_many."""
+        return self.call_many([(op, session_id, arg)])[0]
+
+    def send_batch(self, shard, batch):
+        """Sends a batch of requests to a shard without waiting for its replies.
+
+        Parameters:
+            shard (int): The index of the shard.
+            batch (list<tuple<str, str, object>>): (op, session_id, arg)
+                triples, all for sessions of the shard.
+        """
+        self._conns[shard].send(batch)
+
+    def receive_replies(self, shard):
+        """Waits for the replies to the oldest batch a shard has not answered yet.
+
+        Parameters:
+            shard (int): The index of the shard.
+
+        Returns:
+            (list<tuple<bool, object>>): (ok, result) pairs, in the order
+                of the requests of the batch.
+        """
+        return self._conns[shard].recv()
+
+    def fileno(self, shard):
+        """Returns the file descriptor that is readable when a shard has replies."""
+        return self._conns[shard].fileno()
+
+    def record(self, requests):
+        """Records where sessions live after requests succeeded.
+
+        Parameters:
+            requests (list<tuple<str, str, object>>): The (op, session_id,
+                arg) triples that were answered ok.
+        """
+        for op, session_id, _ in requests:
+            if op in (OPEN, IMPORT):
+                self._placement[session_id] = self.shard_of(session_id)
+            elif op in (EXPORT, CLOSE):
+                self._placement.pop(session_id, None)
+
+    def sessions(self):
+        """Returns the number of sessions owned by each shard."""
+        counts = [0] * self._workers
+        for shard in self._placement.values():
+            counts[shard] += 1
+        return counts
+
+    def migrate(self, session_id, shard):
+        """Moves a session to another shard by shipping its state.
+
+        Parameters:
+            session_id (str): The session to move.
+            shard (int): The index of the destination shard.
+
+        Raises:
+            SessionError: If the session could not be exported or imported.
+                A session that failed to import is put back into its shard.
+        """
+        source = self.shard_of(session_id)
+        if source == shard:
+            return
+        state = self.call(EXPORT, session_id)
+        self._placement[session_id] = shard
+        try:
+            self.call(IMPORT, session_id, state)
+        except Exception:
+            self._placement[session_id] = source
+            self.call(IMPORT, session_id, state)
+            raise
+
+    def rebalance(self):
+        """Migrates sessions until every shard owns about as many as the others.
+
+        Returns:
+            (int): The number of sessions migrated.
+        """
+        owned = [[] for _ in range(self._workers)]
+        for session_id, shard in self._placement.items():
+            owned[shard].append(session_id)
+
+        moved = 0
+        while True:
+            busiest = max(range(self._workers), key=lambda i: len(owned[i]))
+            idlest = min(range(self._workers), key=lambda i: len(owned[i]))
+            if len(owned[busiest]) - len(owned[idlest]) <= 1:
+                return moved
+            session_id = owned[busiest].pop()
+            self.migrate(session_id, idlest)
+            owned[idlest].append(session_id)
+            moved += 1
+
+    def close(self):
+        """Stops the shard processes."""
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(1)
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._processes = [], []
+
+
+class FrontDoor:
+    """Asyncio front door serving JSON line requests on a Unix socket.
+
+    Requests from every client that arrive in the same loop iteration are
+    sent to their shard as one batch. Replies are read as soon as a shard's
+    pipe becomes readable, so a slow shard never holds up the others.
+    """
+
+    def __init__(self, host):
+        """
+        Parameters:
+            host (SessionHost): The shards to route requests to.
+        """
+        self._host = host
+        self._pending = [[] for _ in range(host.get_workers())]
+        self._waiting = [[] for _ in range(host.get_workers())]
+        self._flush_scheduled = False
+        self._loop = None
+
+    async def serve(self, path):
+        """Serves clients on the Unix socket at path until cancelled.
+
+        Parameters:
+            path (str): The filesystem path of the socket.
+        """
+        self._loop = asyncio.get_running_loop()
+        for shard in range(self._host.get_workers()):
+            self._loop.add_reader(self._host.fileno(shard), self._read_shard, shard)
+
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self._client, path)
+        async with server:
+            await server.serve_forever()
+
+    def submit(self, op, session_id, arg=None):
+        """Queues a request for the next batch of its shard.
+
+        Returns:
+            (asyncio.Future): Resolved with the result of the request.
+        """
+        future = self._loop.create_future()
+        shard = self._host.shard_of(session_id)
+        self._pending[shard].append(((op, session_id, arg), future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        """Sends every queued request to its shard, one batch per shard."""
+        self._flush_scheduled = False
+        for shard, pending in enumerate(self._pending):
+            if pending:
+                self._host.send_batch(shard, [request for request, _ in pending])
+                self._waiting[shard].append(pending)
+                self._pending[shard] = []
+
+    def _read_shard(self, shard):
+        """Resolves the futures of the oldest batch a shard has answered."""
+        replies = self._host.receive_replies(shard)
+        pending = self._waiting[shard].pop(0)
+        self._host.record([request for (request, _), (ok, _) in zip(pending, replies) if ok])
+        for ((_, session_id, _), future), (ok, result) in zip(pending, replies):
+            if future.cancelled():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(SessionError(f"{session_id}: {result}"))
+
+    async def _client(self, reader, writer):
+        """Answers the JSON line requests of one client in order."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    result = await self.submit(request["op"], str(request["session"]), request.get("arg"))
+                    reply = {"ok": True, "result": result}
+                except (SessionError, ValueError, KeyError) as e:
+                    reply = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def benchmark(sessions=2000, rounds=50, moves_per_request=4, level="game3.txt", max_workers=None):
+    """Measures move throughput for one shard up to one shard per core.
+
+    Every round sends one request with a few random moves for each session.
+    Finished games are reopened so the amount of work stays constant.
+
+    Parameters:
+        sessions (int): The number of concurrent sessions.
+        rounds (int): The number of rounds of requests.
+        moves_per_request (int): The number of moves in each request.
+        level (str): The level every session plays.
+        max_workers (int): The most shards measured, one per core if None.
+
+    Returns:
+        (list<tuple<int, float>>): (workers, moves per second) pairs.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    rng = random.Random(0)
+    directions = list(DIRECTIONS)
+    ids = [f"session-{i}" for i in range(sessions)]
+    scripts = ["".join(rng.choice(directions) for _ in range(moves_per_request))
+               for _ in range(64)]
+
+    results = []
+    workers = 1
+    while True:
+        with SessionHost(workers) as host:
+            host.call_many([(OPEN, session_id, level) for session_id in ids])
+            start = time.perf_counter()
+            for round_ in range(rounds):
+                requests = [(MOVE, session_id, scripts[(i + round_) % len(scripts)])
+                            for i, session_id in enumerate(ids)]
+                summaries = host.call_many(requests)
+                reopen = [(OPEN, session_id, level)
+                          for session_id, summary in zip(ids, summaries) if summary[3]]
+                if reopen:
+                    host.call_many(reopen)
+            elapsed = time.perf_counter() - start
+
+        rate = sessions * rounds * moves_per_request / elapsed
+        results.append((workers, rate))
+        print(f"{workers:3d} worker(s): {rate:12,.0f} moves/s "
+              f"({rate / results[0][1]:.2f}x)")
+
+        if workers >= max_workers:
+            return results
+        workers = min(workers * 2, max_workers)
+
+
+def main():
+    '''
+    to run the benchmark or serve the session host on a local socket
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--bench", action="store_true", help="run the throughput benchmark")
+    mode.add_argument("--serve", metavar="PATH", help="serve JSON line requests on a Unix socket")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of shard processes, the most measured with --bench")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.serve:
+        with SessionHost(args.workers) as host:
+            try:
+                asyncio.run(FrontDoor(host).serve(args.serve))
+            except KeyboardInterrupt:
+                pass
+    else:
+        benchmark(args.sessions, args.rounds, max_workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+"""Spectator channel streaming a live game to many local watchers.
+
+A SpectatorHub listens on a Unix socket. Each subscriber first gets the
+latest keyframe (the whole board) followed by the deltas published since,
+then every new delta as it happens. A delta only carries the cells that
+changed plus the moves left, the timer and the game status, so a move costs
+a few dozen bytes no matter how large the board is. Every frame is encoded
+once and the same bytes are queued for all subscribers. A subscriber that
+falls too far behind is resynchronised from the latest keyframe, but only
+at a frame boundary: the frame it is halfway through is always finished.
+
+Frames are length prefixed::
+
+    <u32 length> <kind: b'K' | b'D'> <u32 seq> <i32 moves> <u32 timer> <u8 status>
+    keyframe: <u16 size> <size * size board characters>
+    delta:    <u16 count> <count * (u16 row, u16 col, char)>
+
+Run ``python spectator.py PATH`` to watch a game broadcast on PATH.
+"""
+import collections
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+
+
+KEYFRAME = b"K"
+DELTA = b"D"
+
+WON = 1
+OVER = 2
+
+_LENGTH = struct.Struct("<I")
+_HEADER = struct.Struct("<cIiIB")
+_COUNT = struct.Struct("<H")
+_CELL = struct.Struct("<HHc")
+
+# the most frames handed to one sendmsg call
+_SEND_FRAMES = 64
+
+
+def encode_frame(kind, seq, moves, timer, status, payload):
+    """Packs a frame with its length prefix.
+
+    Parameters:
+        kind (bytes): KEYFRAME or DELTA.
+        seq (int): The sequence number of the frame.
+        moves (int): The moves the player has left.
+        timer (int): The seconds elapsed.
+        status (int): A combination of WON and OVER.
+        payload (bytes): The packed board or changed cells.
+
+    Returns:
+        (bytes): The encoded frame.
+    """
+    body = _HEADER.pack(kind, seq, moves, timer, status) + payload
+    return _LENGTH.pack(len(body)) + body
+
+
+def decode_frame(body):
+    """Unpacks a frame without its length prefix.
+
+    Parameters:
+        body (bytes): The frame.
+
+    Returns:
+        (tuple): (kind, seq, moves, timer, status, data) where data is the
+            list of board rows of a keyframe or the list of
+            (row, col, char) cells of a delta.
+    """
+    kind, seq, moves, timer, status = _HEADER.unpack_from(body)
+    offset = _HEADER.size
+    (count,) = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+
+    if kind == KEYFRAME:
+        board = body[offset:offset + count * count].decode()
+        data = [board[row * count:(row + 1) * count] for row in range(count)]
+    else:
+        data = [(row, col, char.decode())
+                for row, col, char in _CELL.iter_unpack(body[offset:offset + count * _CELL.size])]
+    return kind, seq, moves, timer, status, data
+
+
+class _Outbox:
+    """The frames queued for one subscriber, the first of them maybe partly sent."""
+
+    __slots__ = ("frames", "offset", "size")
+
+    def __init__(self, frames):
+        """
+        Parameters:
+            frames (list<bytes>): The frames queued first.
+        """
+        self.frames = collections.deque(frames)
+        # the bytes of the first frame already sent, and the bytes left to send
+        self.offset = 0
+        self.size = sum(map(len, frames))
+
+    def __len__(self):
+        return self.size
+
+    def append(self, frame):
+        """Queues a frame."""
+        self.frames.append(frame)
+        self.size += len(frame)
+
+    def resync(self, frames):
+        """Replaces the whole frames queued by others, finishing a partly sent one first."""
+        partial = self.frames[0] if self.offset else None
+        self.frames.clear()
+        self.size = 0
+        if partial is not None:
+            self.frames.append(partial)
+            self.size = len(partial) - self.offset
+        for frame in frames:
+            self.append(frame)
+
+    def buffers(self):
+        """Returns the next bytes to send, as a list of buffers for sendmsg."""
+        buffers = [memoryview(self.frames[0])[self.offset:]]
+        for index in range(1, min(len(self.frames), _SEND_FRAMES)):
+            buffers.append(self.frames[index])
+        return buffers
+
+    def sent(self, count):
+        """Drops the bytes that were sent."""
+        self.size -= count
+        count += self.offset
+        while self.frames and count >= len(self.frames[0]):
+            count -= len(self.frames.popleft())
+        self.offset = count
+
+
+class SpectatorHub:
+    """Broadcasts the board of one game to the subscribers of a Unix socket.
+
+    publish_keyframe and publish_delta are meant to be called from the game
+    loop; all socket work happens on a background thread.
+    """
+
+    def __init__(self, path, keyframe_interval=64, max_backlog=1 << 20):
+        """
+        Parameters:
+            path (str): The filesystem path of the socket.
+            keyframe_interval (int): Deltas published between two keyframes.
+                This bounds what a late joiner has to replay.
+            max_backlog (int): Bytes a subscriber may lag behind before it
+                is resynchronised from the latest keyframe.
+        """
+        self._path = path
+        self._keyframe_interval = keyframe_interval
+        self._max_backlog = max_backlog
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._size = 0
+        self._board = bytearray()
+        self._keyframe = None
+        self._deltas = []
+        self._outbox = {}
+
+        self._selector = selectors.DefaultSelector()
+        self._server = None
+        self._wakeup = None
+        self._thread = None
+        self._running = False
+
+    def get_path(self):
+        """ """
+        return self._path
+
+    def subscribers(self):
+        """Returns the number of connected subscribers."""
+        with self._lock:
+            return len(self._outbox)
+
+    def start(self):
+        """Opens the socket and starts the broadcasting thread."""
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self._path)
+        self._server.listen(128)
+        self._server.setblocking(False)
+        self._selector.register(self._server, selectors.EVENT_READ)
+
+        self._wakeup = socket.socketpair()
+        for end in self._wakeup:
+            end.setblocking(False)
+        self._selector.register(self._wakeup[0], selectors.EVENT_READ)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="spectator-hub", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Disconnects every subscriber and removes the socket."""
+        if not self._running:
+            return
+        self._running = False
+        self._wake()
+        self._thread.join(1)
+        for sock in list(self._outbox):
+            sock.close()
+        self._outbox.clear()
+        self._server.close()
+        for end in self._wakeup:
+            end.close()
+        self._selector.close()
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def publish_keyframe(self, board, moves, timer, status=0):
+        """Publishes the whole board.
+
+        Parameters:
+            board (list<list<str|int>>): The board matrix, 0 for empty cells.
+            moves (int): The moves the player has left.
+            timer (int): The seconds elapsed.
+            status (int): A combination of WON and OVER.
+        """
+        with self._lock:
+            self._size = len(board)
+            self._board = bytearray("".join(tile or " " for row in board for tile in row).encode())
+            self._emit_keyframe(moves, timer, status)
+
+    def publish_delta(self, cells, moves, timer, status=0):
+        """Publishes the cells changed by a move.
+
+        Parameters:
+            cells (list<tuple<int, int, str|int>>): The (row, col, tile) of
+                every changed cell, 0 for empty cells.
+            moves (int): The moves the player has left.
+            timer (int): The seconds elapsed.
+            status (int): A combination of WON and OVER.
+        """
+        with self._lock:
+            if self._keyframe is None:
+                return
+            payload = [_COUNT.pack(len(cells))]
+            for row, col, tile in cells:
+                char = (tile or " ").encode()
+                self._board[row * self._size + col] = char[0]
+                payload.append(_CELL.pack(row, col, char))
+
+            self._seq += 1
+            frame = encode_frame(DELTA, self._seq, moves, timer, status, b"".join(payload))
+            self._deltas.append(frame)
+            self._broadcast(frame)
+            if len(self._deltas) >= self._keyframe_interval:
+                self._emit_keyframe(moves, timer, status, broadcast=False)
+        self._wake()
+
+    def _emit_keyframe(self, moves, timer, status, broadcast=True):
+        """Snapshots the board as the starting point for late joiners.
+
+        Subscribers that are already connected only need a keyframe when the
+        board was replaced, not on the periodic refresh, which therefore
+        reuses the sequence number of the delta it follows.
+        """
+        if broadcast:
+            self._seq += 1
+        payload = _COUNT.pack(self._size) + bytes(self._board)
+        self._keyframe = encode_frame(KEYFRAME, self._seq, moves, timer, status, payload)
+        self._deltas = []
+        if broadcast:
+            self._broadcast(self._keyframe)
+            self._wake()
+
+    def _broadcast(self, frame):
+        """Queues a frame for every subscriber, resynchronising laggards."""
+        for sock, outbox in self._outbox.items():
+            if len(outbox) > self._max_backlog:
+                outbox.resync(self._catch_up())
+            else:
+                outbox.append(frame)
+
+    def _catch_up(self):
+        """Returns the latest keyframe followed by the deltas since."""
+        return [self._keyframe, *self._deltas] if self._keyframe is not None else []
+
+    def _wake(self):
+        """Interrupts the select call of the broadcasting thread."""
+        try:
+            self._wakeup[1].send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _run(self):
+        """Main loop of the broadcasting thread."""
+        while self._running:
+            with self._lock:
+                for sock, outbox in self._outbox.items():
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if outbox else 0)
+                    self._selector.modify(sock, events)
+
+            for key, events in self._selector.select():
+                sock = key.fileobj
+                if sock.fileno() < 0:
+                    continue
+                if sock is self._server:
+                    self._accept()
+                elif sock is self._wakeup[0]:
+                    try:
+                        sock.recv(4096)
+                    except BlockingIOError:
+                        pass
+                elif events & selectors.EVENT_READ and not self._readable(sock):
+                    self._drop(sock)
+                elif events & selectors.EVENT_WRITE:
+                    self._flush(sock)
+
+    def _accept(self):
+        """Accepts a subscriber and queues the catch up frames for it."""
+        try:
+            sock, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        with self._lock:
+            self._outbox[sock] = _Outbox(self._catch_up())
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _readable(self, sock):
+        """Discards anything a subscriber sends; False once it hung up."""
+        try:
+            return bool(sock.recv(4096))
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def _flush(self, sock):
+        """Sends as much of a subscriber's queued frames as it accepts."""
+        with self._lock:
+            outbox = self._outbox.get(sock)
+            if not outbox:
+                return
+            try:
+                sent = sock.sendmsg(outbox.buffers())
+            except BlockingIOError:
+                return
+            except OSError:
+                sent = -1
+            if sent >= 0:
+                outbox.sent(sent)
+                return
+        self._drop(sock)
+
+    def _drop(self, sock):
+        """Disconnects a subscriber."""
+        with self._lock:
+            self._outbox.pop(sock, None)
+        self._selector.unregister(sock)
+        sock.close()
+
+
+class SpectatorClient:
+    """Rebuilds the board of a broadcast game from its frames."""
+
+    def __init__(self, path):
+        """
+        Parameters:
+            path (str): The filesystem path of the hub's socket.
+        """
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._file = self._sock.makefile("rb")
+        self.board = []
+        self.moves = 0
+        self.timer = 0
+        self.status = 0
+        self.seq = 0
+
+    def close(self):
+        """ """
+        self._file.close()
+        self._sock.close()
+
+    def frames(self):
+        """Applies and yields every frame until the hub hangs up.
+
+        Yields:
+            (tuple): The decoded frames, see decode_frame.
+        """
+        while True:
+            head = self._file.read(_LENGTH.size)
+            if len(head) < _LENGTH.size:
+                return
+            (length,) = _LENGTH.unpack(head)
+            frame = decode_frame(self._file.read(length))
+            self.apply(frame)
+            yield frame
+
+    def apply(self, frame):
+        """Updates the local board with a decoded frame."""
+        kind, self.seq, self.moves, self.timer, self.status, data = frame
+        if kind == KEYFRAME:
+            self.board = [list(row) for row in data]
+        else:
+            for row, col, char in data:
+                self.board[row][col] = char
+
+    def render(self):
+        """Returns the board and status as text."""
+        rows = ["".join(row) for row in self.board]
+        state = "won" if self.status & WON else "over" if self.status & OVER else "playing"
+        rows.append(f"Moves left: {self.moves}  Time: {self.timer // 60}m {self.timer % 60}s  ({state})")
+        return "\n".join(rows)
+
+
+def main():
+    '''
+    to watch a broadcast game in the terminal
+    :return:
+    '''
+    if len(sys.argv) != 2:
+        print(f"usage: {sys.argv[0]} SOCKET_PATH")
+        sys.exit(2)
+
+    client = SpectatorClient(sys.argv[1])
+    try:
+        for _ in client.frames():
+            print("\033[H\033[J" + client.render(), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import AutosaveJournal, CHECKPOINT_FILE, FORMAT_VERSION, JOURNAL_FILE
+
+
+class RecoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = AutosaveJournal(self.directory)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.directory)
+
+    def test_moves_are_replayed(self):
+        self.journal.checkpoint({"moves": 7}, 3)
+        self.journal.record("D", 4, 1)
+        self.journal.record("S", 5, 2)
+        self.assertEqual(AutosaveJournal(self.directory).recover(), ({"moves": 7}, 5, [("D", 1), ("S", 2)]))
+
+    def test_checkpoint_of_wrong_types(self):
+        for generation, state, timer in (("1", {}, 0), (1, [], 0), (1, {}, None)):
+            with open(os.path.join(self.directory, CHECKPOINT_FILE), "w") as file:
+                json.dump({"version": FORMAT_VERSION, "generation": generation, "state": state, "timer": timer}, file)
+            self.assertIsNone(AutosaveJournal(self.directory).recover())
+
+    def test_corrupt_record_ends_the_journal(self):
+        self.journal.checkpoint({}, 3)
+        self.journal.record("D", 4, 1)
+        self.journal.record("S", 5, 2)
+        self.journal.close()
+        path = os.path.join(self.directory, JOURNAL_FILE % 1)
+        with open(path, "r+b") as file:
+            # the direction of the second record
+            file.seek(13)
+            file.write(b"\xff")
+        self.assertEqual(AutosaveJournal(self.directory).recover(), ({}, 4, [("D", 1)]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from KeyCaveAdventureGame import compile_level, PARSER_VERSION
+from levelcache import LevelCache, EXTENSION
+
+
+def level(moves):
+    """Returns the text of a small level, a different one for every budget."""
+    return "#####\n#KO #\n#   #\n# D #\n#####\n%d\n" % moves
+
+
+class PruneTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        # room for two compiled levels
+        self.size_limit = 2 * len(compile_level(level(1)))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self, moves):
+        """Loads a level in a fresh process, as far as the cache can tell."""
+        cache = LevelCache(self.directory, compile_level, PARSER_VERSION, size_limit=self.size_limit)
+        cache.load(level(moves))
+        # the modification times are what orders the files
+        time.sleep(0.02)
+
+    def files(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_other_parser_versions_are_removed(self):
+        os.mkdir(os.path.join(self.directory, "unrelated"))
+        stale = os.path.join(self.directory, "stale-%d%s" % (PARSER_VERSION + 1, EXTENSION))
+        with open(stale, "w") as file:
+            file.write("x")
+        self.load(1)
+        self.assertEqual(len(self.files()), 2)
+        self.assertFalse(os.path.exists(stale))
+
+    def test_least_recently_loaded_are_removed(self):
+        self.load(1)
+        self.load(2)
+        first, second = sorted(self.files(), key=lambda name: os.path.getmtime(os.path.join(self.directory, name)))
+        # loading the first level again makes the second the least recent
+        self.load(1)
+        self.load(3)
+        files = self.files()
+        self.assertEqual(len(files), 2)
+        self.assertIn(first, files)
+        self.assertNotIn(second, files)
+
+
+if __name__ == "__main__":
+    unittest.main()
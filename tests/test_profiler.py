@@ -0,0 +1,67 @@
+import os
+import signal
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiler import ProfileCapture, CPROFILE, SAMPLING, MODES
+
+
+def heavy(until):
+    total = 0
+    while time.perf_counter() < until:
+        for number in range(2000):
+            total += number * number
+    return total
+
+
+def light_io(count):
+    for _ in range(count):
+        os.stat(__file__)
+
+
+def play(seconds):
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        heavy(time.perf_counter() + 0.05)
+        light_io(20)
+
+
+class ProfileCaptureTest(unittest.TestCase):
+
+    def own_seconds(self, mode):
+        """Profiles play and returns the seconds spent in each function of this file."""
+        capture = ProfileCapture(mode)
+        capture.start()
+        try:
+            play(0.6)
+        finally:
+            capture.stop()
+        functions = capture.hot_functions(10, os.path.abspath(__file__))
+        return {name.split()[0]: own for name, own, _ in functions}
+
+    @unittest.skipUnless(SAMPLING in MODES, "no interval timers")
+    def test_sampling_finds_cpu_bound_function(self):
+        own = self.own_seconds(SAMPLING)
+        self.assertIn("heavy", own)
+        self.assertEqual(max(own, key=own.get), "heavy")
+        self.assertGreater(own["heavy"], 10 * own.get("light_io", 0.0))
+
+    def test_cprofile_finds_cpu_bound_function(self):
+        own = self.own_seconds(CPROFILE)
+        self.assertEqual(max(own, key=own.get), "heavy")
+
+    @unittest.skipUnless(SAMPLING in MODES, "no interval timers")
+    def test_stop_removes_the_handler(self):
+        before = signal.getsignal(signal.SIGPROF)
+        capture = ProfileCapture(SAMPLING)
+        capture.start()
+        capture.stop()
+        self.assertEqual(signal.getsignal(signal.SIGPROF), before)
+        self.assertEqual(signal.getitimer(signal.ITIMER_PROF), (0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
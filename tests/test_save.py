@@ -0,0 +1,57 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from KeyCaveAdventureGame import GameLogic, KEY, split_game
+
+
+TWO_KEYS = "#####\n#KOK#\n#   #\n# D #\n#####\n20\n"
+
+
+class SaveGameTest(unittest.TestCase):
+
+    def reload(self, game, timer=0):
+        return GameLogic.from_text("saved.txt", game.to_text(timer))
+
+    def test_key_held_is_saved(self):
+        game = GameLogic.from_text("saved.txt", TWO_KEYS)
+        game.apply_moves("A")
+        self.assertEqual(game.get_player().get_inventory()[KEY], 1)
+        self.assertEqual(game.get_game_information().count(KEY), 1)
+
+        loaded = self.reload(game, timer=42)
+        self.assertEqual(loaded.get_player().get_inventory()[KEY], 1)
+        self.assertEqual(loaded.get_player().get_position(), game.get_player().get_position())
+        self.assertEqual(loaded.get_player().moves_remaining(), game.get_player().moves_remaining())
+        self.assertEqual(loaded.get_hash(), game.get_hash())
+
+    def test_every_key_held_is_saved(self):
+        # no key is left on the board, yet the Player holds two and not one
+        game = GameLogic.from_text("saved.txt", TWO_KEYS)
+        game.apply_moves("ADD")
+        self.assertEqual(game.get_game_information().count(KEY), 0)
+        self.assertEqual(game.get_player().get_inventory()[KEY], 2)
+
+        loaded = self.reload(game)
+        self.assertEqual(loaded.get_player().get_inventory()[KEY], 2)
+        self.assertEqual(loaded.get_hash(), game.get_hash())
+
+    def test_footer(self):
+        game = GameLogic.from_text("saved.txt", TWO_KEYS)
+        game.apply_moves("A")
+        footer = split_game(game.to_text(42).splitlines())[1]
+        self.assertEqual(footer, ["19", "42", "%016x" % game.get_hash(), "1"])
+
+    def test_save_without_keys_line(self):
+        # a save made before the keys were stored still loads
+        game = GameLogic.from_text("saved.txt", TWO_KEYS)
+        old_save = game.to_text(0).rsplit("\n", 1)[0]
+        loaded = GameLogic.from_text("saved.txt", old_save)
+        self.assertEqual(loaded.get_player().get_inventory()[KEY], 0)
+        self.assertEqual(loaded.get_hash(), game.get_hash())
+
+
+if __name__ == "__main__":
+    unittest.main()
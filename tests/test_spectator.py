@@ -0,0 +1,89 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spectator import SpectatorHub, SpectatorClient, KEYFRAME, DELTA, WON
+
+
+SIZE = 150
+
+
+class SmallBufferHub(SpectatorHub):
+    """A hub with tiny socket buffers, so it sends most frames in pieces."""
+
+    def _accept(self):
+        super()._accept()
+        with self._lock:
+            for sock in self._outbox:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+
+class SlowSubscriberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "hub.sock")
+        # a backlog of a few keyframes, so the slow subscriber is resynchronised many times
+        self.hub = SmallBufferHub(self.path, keyframe_interval=16, max_backlog=200000)
+        self.hub.start()
+
+    def tearDown(self):
+        self.hub.close()
+        os.rmdir(self.directory)
+
+    def test_slow_subscriber_decodes_every_frame(self):
+        board = [["#" if (row + col) % 7 == 0 else 0 for col in range(SIZE)] for row in range(SIZE)]
+        self.hub.publish_keyframe(board, 100, 0)
+        client = SpectatorClient(self.path)
+        client._sock.settimeout(10)
+        while self.hub.subscribers() < 1:
+            time.sleep(0.001)
+
+        frames = []
+        errors = []
+
+        def watch():
+            try:
+                for frame in client.frames():
+                    frames.append(frame)
+                    time.sleep(0.001)
+                    if frame[4] & WON:
+                        return
+            except Exception as e:
+                errors.append(e)
+
+        watcher = threading.Thread(target=watch)
+        watcher.start()
+        for step in range(3000):
+            row, col = divmod(step % (SIZE * SIZE), SIZE)
+            tile = "K" if step % 2 else 0
+            board[row][col] = tile
+            status = WON if step == 2999 else 0
+            if step % 20 == 19:
+                self.hub.publish_keyframe(board, 100 - step % 100, step, status)
+            else:
+                self.hub.publish_delta([(row, col, tile)], 100 - step % 100, step, status)
+            if step % 10 == 0:
+                # let the hub send between the frames, so it leaves frames half sent
+                time.sleep(0.0002)
+        watcher.join(30)
+        client.close()
+
+        self.assertEqual(errors, [])
+        self.assertFalse(watcher.is_alive())
+        self.assertTrue(all(frame[0] in (KEYFRAME, DELTA) for frame in frames))
+        # a resynchronised stream skips frames but never goes back in time
+        sequence = [frame[1] for frame in frames]
+        self.assertEqual(sequence, sorted(sequence))
+        self.assertLess(len(frames), 3001)
+        self.assertEqual(client.board, [[tile or " " for tile in row] for row in board])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+"""Tournament view showing many bot races on one level side by side.
+
+Every board is a headless GameLogic played by a bot. The boards do not use
+GameApp: one CanvasBoardRenderer draws all of them on a single canvas from
+the shared sprite cache, and one scheduler tick moves every bot once and
+redraws only the tiles the moves changed, so a window of 64 boards keeps a
+steady frame rate. The view binds no keys and leaves the root window and its
+menus alone.
+
+Run ``python tournament.py game2.txt --boards 64 --bots hint,sloppy,random``.
+"""
+import argparse
+import math
+import random
+import time
+import tkinter as tk
+from tkinter import messagebox
+
+from KeyCaveAdventureGame import (GameLogic, HintEngine, CanvasBoardRenderer, SPRITES, DIRECTIONS,
+                                  load_game, fit_sprite_size)
+
+
+HINT = "hint"
+SLOPPY = "sloppy"
+RANDOM = "random"
+BOTS = (HINT, SLOPPY, RANDOM)
+
+# how often a sloppy bot ignores its hint
+SLOPPY_MISTAKES = 0.2
+
+# milliseconds between two ticks, every bot makes one move per tick
+TICK = 100
+
+# pixels between the boards and of the line of text under each board
+GAP = 10
+LABEL_HEIGHT = 16
+
+
+def make_bot(kind, game, rng):
+    '''
+    to make a bot playing a game
+    :param kind: HINT follows the shortest way out, SLOPPY does so with random mistakes, RANDOM walks randomly
+    :param game: the GameLogic the bot plays
+    :param rng: the random.Random of the bot
+    :return: a function returning the direction of the next move
+    '''
+    directions = list(DIRECTIONS)
+    if kind == RANDOM:
+        return lambda: rng.choice(directions)
+
+    engine = HintEngine(game)
+    mistakes = SLOPPY_MISTAKES if kind == SLOPPY else 0
+
+    def bot():
+        hint = engine.hint()
+        if hint is None or rng.random() < mistakes:
+            return rng.choice(directions)
+        return hint
+    return bot
+
+
+class Entrant:
+    '''
+    one board of the tournament
+    '''
+    def __init__(self, name, game, bot, board):
+        '''
+
+        :param name: the name shown under the board
+        :param game: the GameLogic played on the board
+        :param bot: the function returning the next move
+        :param board: the index of the board in the renderer
+        '''
+        self.name = name
+        self.game = game
+        self.bot = bot
+        self.board = board
+        self.label = None
+        self.text = None
+        self.steps = 0
+        # the tick the game ended on, None while it runs
+        self.finished = None
+
+
+class TournamentView:
+    '''
+    a window of boards advanced by a single scheduler tick
+    '''
+    def __init__(self, master, level, bots=BOTS, boards=16, seed=0, tick=TICK, width=1200, height=860):
+        '''
+
+        :param master: the window the tournament is drawn on
+        :param level: the level file every board plays
+        :param bots: the kinds of bot, assigned to the boards in turn
+        :param boards: the number of boards
+        :param seed: the seed of the random choices of the bots
+        :param tick: the milliseconds between two ticks
+        :param width: the width of the canvas
+        :param height: the height of the canvas
+        '''
+        self.master = master
+        self.level = level
+        self.tick_interval = tick
+        self.ticks = 0
+        self.running = False
+
+        columns = math.ceil(math.sqrt(boards))
+        rows = math.ceil(boards / columns)
+        layout, budget = load_game(level)
+        size = len(layout)
+        tile_size = fit_sprite_size(min((width - GAP) / columns - GAP,
+                                        (height - GAP) / rows - GAP - LABEL_HEIGHT) / size)
+
+        self.canvas = tk.Canvas(master, width=width, height=height, bg='black', highlightthickness=0)
+        self.canvas.pack()
+        self.renderer = CanvasBoardRenderer(self.canvas, tile_size)
+
+        self.entrants = []
+        for index in range(boards):
+            row, col = divmod(index, columns)
+            x = GAP + col * (size * tile_size + GAP)
+            y = GAP + row * (size * tile_size + GAP + LABEL_HEIGHT)
+            kind = bots[index % len(bots)]
+            game = GameLogic(level, (layout, budget))
+            entrant = Entrant('%s %d' % (kind, index + 1), game, make_bot(kind, game, random.Random(seed + index)),
+                              self.renderer.add_board(game, x, y))
+            entrant.label = self.canvas.create_text(x, y + size * tile_size + 2, anchor=tk.NW, fill='white',
+                                                    font=('Helvetica', 9))
+            self.entrants.append(entrant)
+            self.update_label(entrant)
+
+        # the frames drawn and the time spent on them since the title was last updated
+        self.frames = 0
+        self.busy = 0.0
+        self.next_tick = None
+        self.title_time = None
+
+    def start(self):
+        '''
+        to start the tick
+        :return:
+        '''
+        self.running = True
+        self.next_tick = self.title_time = time.perf_counter()
+        self.master.after(self.tick_interval, self.tick)
+
+    def stop(self):
+        '''
+        to stop the tick, the boards keep their state
+        :return:
+        '''
+        self.running = False
+
+    def tick(self):
+        '''
+        to move every bot once and redraw the tiles that changed
+        :return:
+        '''
+        if not self.running:
+            return
+        start = time.perf_counter()
+        self.ticks += 1
+
+        playing = 0
+        for entrant in self.entrants:
+            if entrant.finished is not None:
+                continue
+            game = entrant.game
+            old_position = game.get_player().get_position()
+            if game.play_move(entrant.bot()):
+                entrant.steps += 1
+                self.renderer.draw_cells(entrant.board, (old_position, game.get_player().get_position()))
+            if game.won() or game.check_game_over():
+                entrant.finished = self.ticks
+            else:
+                playing += 1
+            self.update_label(entrant)
+
+        now = time.perf_counter()
+        self.frames += 1
+        self.busy += now - start
+        if now - self.title_time >= 1:
+            self.master.title('Tournament - %s - %d boards - %.0f fps, %.1f ms per frame'
+                              % (self.level, len(self.entrants), self.frames / (now - self.title_time),
+                                 1000 * self.busy / self.frames))
+            self.frames = 0
+            self.busy = 0.0
+            self.title_time = now
+
+        if not playing:
+            self.running = False
+            self.show_standings()
+            return
+
+        # the ticks are kept on a fixed schedule instead of waiting a full interval after a slow one
+        self.next_tick = max(self.next_tick + self.tick_interval / 1000, now)
+        self.master.after(max(1, int((self.next_tick - now) * 1000)), self.tick)
+
+    def update_label(self, entrant):
+        '''
+        to show the moves left or the result of a board under it, when it changed
+        :param entrant: the board
+        :return:
+        '''
+        game = entrant.game
+        if game.won():
+            text = '%s: won in %d' % (entrant.name, entrant.steps)
+        elif entrant.finished is not None:
+            text = '%s: lost' % entrant.name
+        else:
+            text = '%s: %d left' % (entrant.name, game.get_player().moves_remaining())
+        if text != entrant.text:
+            entrant.text = text
+            self.canvas.itemconfigure(entrant.label, text=text, fill='yellow' if game.won() else 'white')
+
+    def standings(self):
+        '''
+        to rank the boards, the winners by the tick they won on and then by their steps
+        :return: the entrants, best first
+        '''
+        return sorted(self.entrants, key=lambda entrant: (not entrant.game.won(), entrant.finished or 0,
+                                                          entrant.steps))
+
+    def show_standings(self):
+        '''
+        to show the first places once every game ended
+        :return:
+        '''
+        winners = [entrant for entrant in self.standings() if entrant.game.won()]
+        if winners:
+            lines = ['%d. %s, %d steps' % (place, entrant.name, entrant.steps)
+                     for place, entrant in enumerate(winners[:10], 1)]
+            messagebox.showinfo('Tournament', 'Every game has ended.\n\n' + '\n'.join(lines))
+        else:
+            messagebox.showinfo('Tournament', 'Every game has ended without a winner.')
+
+
+def main():
+    '''
+    to run a tournament in a window
+    :return:
+    '''
+    parser = argparse.ArgumentParser(description="Bot races on one level, side by side.")
+    parser.add_argument("level", nargs="?", default="game2.txt", help="the level file every board plays")
+    parser.add_argument("--boards", type=int, default=16, help="number of boards")
+    parser.add_argument("--bots", default=",".join(BOTS),
+                        help="comma separated kinds of bot (%s), assigned in turn" % ", ".join(BOTS))
+    parser.add_argument("--tick", type=int, default=TICK, help="milliseconds between two moves")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    bots = args.bots.split(",")
+    unknown = [bot for bot in bots if bot not in BOTS]
+    if unknown:
+        parser.error("unknown bots: %s" % ", ".join(unknown))
+
+    root = tk.Tk()
+    root.title('Tournament')
+    try:
+        SPRITES.prepare()
+    except OSError:
+        messagebox.showinfo('Error', 'You may miss some images')
+        root.destroy()
+        return
+    view = TournamentView(root, args.level, bots, args.boards, args.seed, args.tick)
+    view.start()
+    root.mainloop()
+
+
+if __name__ == '__main__':
+    main()